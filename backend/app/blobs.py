@@ -0,0 +1,244 @@
+import hashlib
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Callable, Iterable, Iterator, List, Optional, Tuple
+
+BLOB_DIR = os.getenv("BLOB_DIR", "blobs")
+# Serialized payloads larger than this are stored as blobs, not in the row.
+PAYLOAD_INLINE_MAX = int(os.getenv("PAYLOAD_INLINE_MAX", str(64 * 1024)))
+# "zstd" compresses offloaded payloads (needs the optional zstandard package).
+PAYLOAD_COMPRESSION = os.getenv("PAYLOAD_COMPRESSION", "identity")
+# "msgpack" stores offloaded payloads as MessagePack rather than JSON text
+# (needs the optional msgpack package). They are still served as JSON, but
+# decoded in full to do so; JSON blobs are streamed as stored.
+PAYLOAD_FORMAT = os.getenv("PAYLOAD_FORMAT", "json")
+BLOB_MAX_BYTES = int(os.getenv("BLOB_MAX_BYTES", str(256 * 1024 * 1024)))
+CHUNK_SIZE = 64 * 1024
+
+REF_PREFIX = "sha256:"
+
+
+def parse_ref(ref: str) -> str:
+    digest = ref[len(REF_PREFIX):] if ref.startswith(REF_PREFIX) else ""
+    if len(digest) != 64 or any(c not in "0123456789abcdef" for c in digest):
+        raise ValueError(f"Invalid blob ref {ref!r}")
+    return digest
+
+
+def encoding_name(fmt: str, compression: str) -> str:
+    # a blob's payload_encoding: identity | zstd | msgpack | msgpack+zstd
+    if fmt == "json":
+        return compression
+    return fmt if compression == "identity" else f"{fmt}+{compression}"
+
+
+def split_encoding(encoding: str) -> Tuple[str, str]:
+    fmt, _, compression = encoding.partition("+") if encoding.startswith("msgpack") else ("json", "", encoding)
+    return fmt, compression or "identity"
+
+
+PAYLOAD_ENCODING = encoding_name(PAYLOAD_FORMAT, PAYLOAD_COMPRESSION)
+
+
+def encode(data: bytes, encoding: str = PAYLOAD_ENCODING, value: Any = None) -> bytes:
+    """The blob bytes for a payload serialized as JSON `data`; msgpack packs `value` if given, else data parsed."""
+    fmt, compression = split_encoding(encoding)
+    if fmt == "msgpack":
+        import msgpack
+        data = msgpack.packb(json.loads(data) if value is None else value)
+    elif fmt != "json":
+        raise ValueError(f"Unknown payload format {fmt!r}")
+    if compression == "identity":
+        return data
+    if compression == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    raise ValueError(f"Unknown payload encoding {encoding!r}")
+
+
+class BlobWriter:
+    """Streams one blob to a temp file while hashing it; commit() names it by its digest."""
+
+    def __init__(self, store: "BlobStore", max_bytes: int = BLOB_MAX_BYTES):
+        self.store = store
+        self.max_bytes = max_bytes
+        self.size = 0
+        self.created = False    # after commit(): False if the same bytes were already stored
+        self._hash = hashlib.sha256()
+        os.makedirs(os.path.join(store.root, "tmp"), exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(dir=os.path.join(store.root, "tmp"))
+        self._file = os.fdopen(fd, "wb")
+
+    def write(self, chunk: bytes):
+        self.size += len(chunk)
+        if self.size > self.max_bytes:
+            raise ValueError(f"Blob larger than {self.max_bytes} bytes")
+        self._hash.update(chunk)
+        self._file.write(chunk)
+
+    def commit(self) -> str:
+        self._file.close()
+        ref = REF_PREFIX + self._hash.hexdigest()
+        path = self.store.path(ref)
+        if os.path.exists(path):
+            # same bytes already stored: keep the existing copy, and mark it
+            # used now so the GC sweep's grace period covers the new reference
+            os.remove(self._tmp_path)
+            self.store.touch(ref)
+        else:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(self._tmp_path, path)
+            self.created = True
+        return ref
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except OSError:
+            pass
+
+
+class BlobStore:
+    """
+    Content-addressed blobs on the local filesystem (or any mounted bucket):
+    a blob is named by the sha256 of its bytes, so identical payloads are
+    stored once. Blobs are written to a temp file and renamed into place,
+    so readers never see a partial blob.
+    """
+
+    def __init__(self, root: str = BLOB_DIR):
+        self.root = root
+
+    def path(self, ref: str) -> str:
+        digest = parse_ref(ref)
+        return os.path.join(self.root, digest[:2], digest[2:4], digest)
+
+    def exists(self, ref: str) -> bool:
+        return os.path.exists(self.path(ref))
+
+    def size(self, ref: str) -> Optional[int]:
+        try:
+            return os.path.getsize(self.path(ref))
+        except OSError:
+            return None
+
+    def touch(self, ref: str) -> Optional[int]:
+        """Mark the blob as just used (see collect_blobs in app.retention); its size, or None if missing."""
+        try:
+            os.utime(self.path(ref))
+        except OSError:
+            return None
+        return self.size(ref)
+
+    def writer(self) -> BlobWriter:
+        return BlobWriter(self)
+
+    def put(self, data: bytes, created: Optional[List[str]] = None) -> str:
+        """Store `data`; the ref is appended to `created` if it was not stored before."""
+        writer = self.writer()
+        try:
+            writer.write(data)
+        except Exception:
+            writer.abort()
+            raise
+        ref = writer.commit()
+        if writer.created and created is not None:
+            created.append(ref)
+        return ref
+
+    def remove(self, refs: Iterable[str]):
+        for ref in refs:
+            try:
+                os.remove(self.path(ref))
+            except OSError:
+                pass
+
+    def remove_unused(self, ref: str, before: float) -> bool:
+        """Remove the blob unless it was written or touched at `before` (epoch seconds) or later."""
+        try:
+            if os.path.getmtime(self.path(ref)) >= before:
+                return False
+            os.remove(self.path(ref))
+        except OSError:
+            return False
+        return True
+
+    def iter_refs(self, after: str = "") -> Iterator[Tuple[str, float]]:
+        """(ref, mtime) of every stored blob, in digest order, starting past `after`."""
+        start = parse_ref(after) if after else ""
+        for top in sorted(d for d in os.listdir(self.root) if len(d) == 2) if os.path.isdir(self.root) else []:
+            if top < start[:2]:
+                continue
+            for mid in sorted(os.listdir(os.path.join(self.root, top))):
+                if top + mid < start[:4]:
+                    continue
+                folder = os.path.join(self.root, top, mid)
+                for digest in sorted(os.listdir(folder)):
+                    if digest <= start:
+                        continue
+                    try:
+                        yield REF_PREFIX + digest, os.path.getmtime(os.path.join(folder, digest))
+                    except OSError:
+                        pass
+
+    def remove_stale_tmp(self, before: float) -> int:
+        """Remove temp files of writes that never finished (a crashed process), older than `before`."""
+        removed = 0
+        folder = os.path.join(self.root, "tmp")
+        for name in os.listdir(folder) if os.path.isdir(folder) else []:
+            path = os.path.join(folder, name)
+            try:
+                if os.path.getmtime(path) < before:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    @contextmanager
+    def removed_on_error(self, unreferenced: Optional[Callable[[List[str]], Iterable[str]]] = None):
+        """
+        Yields a list for put(created=...). If the block raises, the blobs it
+        stored for the first time are removed again, so a failed insert of
+        the rows that reference them leaves nothing behind. `unreferenced`
+        narrows them to those no job row points at: another request may have
+        stored the same bytes meanwhile and committed its row.
+        """
+        created: List[str] = []
+        try:
+            yield created
+        except BaseException:
+            if created:
+                self.remove(unreferenced(created) if unreferenced else created)
+            raise
+
+    def open(self, ref: str) -> BinaryIO:
+        return open(self.path(ref), "rb")
+
+    def iter_decoded(self, ref: str, encoding: str = "identity", chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+        """The payload's JSON bytes, chunk by chunk, decompressing on the fly."""
+        fmt, compression = split_encoding(encoding)
+        with self.open(ref) as f:
+            if fmt == "msgpack":
+                import msgpack
+                data = f.read()
+                if compression == "zstd":
+                    import zstandard
+                    data = zstandard.ZstdDecompressor().decompress(data)
+                yield json.dumps(msgpack.unpackb(data)).encode()
+                return
+            if compression == "zstd":
+                import zstandard
+                yield from zstandard.ZstdDecompressor().read_to_iter(f, read_size=chunk_size)
+                return
+            while True:
+                chunk = f.read(chunk_size)
+                if not chunk:
+                    return
+                yield chunk
+
+
+BLOBS = BlobStore()
@@ -0,0 +1,84 @@
+import os
+import time
+from typing import Dict
+
+from redis.commands.core import AsyncScript
+
+# Circuit breaker per job type. Outcomes of the last BREAKER_WINDOW_SECONDS
+# are counted in Redis; when at least BREAKER_MIN_CALLS of them ended and
+# BREAKER_FAILURE_RATE of those failed, the type is paused for
+# BREAKER_OPEN_SECONDS: claims skip it and leases defer it, through the same
+# script that enforces type limits (app.type_limits). The window is cleared
+# when the breaker opens, so once the pause is over a fresh
+# BREAKER_MIN_CALLS outcomes decide whether it opens again.
+OPEN_KEY = "smartflow:breakers"                # zset: type -> open until (ms)
+WINDOW_KEY = "smartflow:breakers:{}:window"    # hash: "ok:<bucket>" / "fail:<bucket>" -> count
+
+BREAKER = os.getenv("CIRCUIT_BREAKER", "on") != "off"
+BREAKER_FAILURE_RATE = float(os.getenv("BREAKER_FAILURE_RATE", "0.5"))
+BREAKER_MIN_CALLS = int(os.getenv("BREAKER_MIN_CALLS", "20"))
+BREAKER_WINDOW_SECONDS = float(os.getenv("BREAKER_WINDOW_SECONDS", "60"))
+BREAKER_OPEN_SECONDS = float(os.getenv("BREAKER_OPEN_SECONDS", "30"))
+BUCKETS = 6
+
+# KEYS: window hash, open zset
+# ARGV: type, "ok" | "fail", now (ms), bucket (ms), buckets, min calls, failure rate, open (ms)
+# Returns 1 when this outcome opened the breaker.
+RECORD_SCRIPT = """
+local now, width, buckets = tonumber(ARGV[3]), tonumber(ARGV[4]), tonumber(ARGV[5])
+local bucket = math.floor(now / width)
+redis.call('hincrby', KEYS[1], ARGV[2] .. ':' .. bucket, 1)
+redis.call('pexpire', KEYS[1], width * (buckets + 1))
+if ARGV[2] == 'ok' then
+    return 0
+end
+local ok, fail = 0, 0
+local counts = redis.call('hgetall', KEYS[1])
+for i = 1, #counts, 2 do
+    local kind, b = string.match(counts[i], '(%a+):(%d+)')
+    if tonumber(b) <= bucket - buckets then
+        redis.call('hdel', KEYS[1], counts[i])
+    elseif kind == 'ok' then
+        ok = ok + tonumber(counts[i + 1])
+    else
+        fail = fail + tonumber(counts[i + 1])
+    end
+end
+if ok + fail < tonumber(ARGV[6]) or fail < tonumber(ARGV[7]) * (ok + fail) then
+    return 0
+end
+redis.call('zadd', KEYS[2], now + tonumber(ARGV[8]), ARGV[1])
+redis.call('del', KEYS[1])
+return 1
+"""
+
+# registered once; each call names the client it runs on
+_record = AsyncScript(None, RECORD_SCRIPT.encode())
+
+
+def now_ms() -> int:
+    return int(time.time() * 1000)
+
+
+async def record_async(ardb, job_type: str, ok: bool) -> bool:
+    """Count one finished attempt of `job_type`. Returns True if it opened the breaker."""
+    if not BREAKER:
+        return False
+    opened = await _record(keys=[WINDOW_KEY.format(job_type), OPEN_KEY], args=[
+        job_type, "ok" if ok else "fail", now_ms(), int(BREAKER_WINDOW_SECONDS * 1000 / BUCKETS), BUCKETS,
+        BREAKER_MIN_CALLS, BREAKER_FAILURE_RATE, int(BREAKER_OPEN_SECONDS * 1000),
+    ], client=ardb)
+    return bool(opened)
+
+
+def open_breakers(rdb) -> Dict[str, float]:
+    """Types paused right now, with the seconds left."""
+    now = now_ms()
+    return {t: (until - now) / 1000 for t, until in rdb.zrangebyscore(OPEN_KEY, now, "+inf", withscores=True)}
+
+
+def close(rdb, job_type: str):
+    pipe = rdb.pipeline()
+    pipe.zrem(OPEN_KEY, job_type)
+    pipe.delete(WINDOW_KEY.format(job_type))
+    pipe.execute()
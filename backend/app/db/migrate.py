@@ -0,0 +1,73 @@
+"""
+Brings the database schema up to date. Run it once per deploy, before the API
+processes start; they no longer touch the schema themselves.
+
+    cd backend && python -m app.db.migrate
+
+Creates missing tables, then adds the columns and indexes that newer models
+have but existing tables lack, and drops the indexes they replaced. It never
+drops tables or columns and is safe to run repeatedly.
+"""
+from datetime import datetime
+
+from sqlalchemy import inspect, literal, text
+
+from app.db.database import Base, engine
+from app.db import models  # noqa: F401 - register models with Base
+
+# Indexes superseded by a differently defined one under a new name.
+REPLACED_INDEXES = {
+    "jobs": ["ix_jobs_queued_priority_created", "ix_jobs_queued_queue_priority_created"],
+}
+
+
+def default_sql(column, dialect) -> str | None:
+    # what existing rows get for a new column; a NOT NULL column needs one
+    default = column.default
+    if default is None:
+        return None
+    if default.is_scalar:
+        return str(literal(default.arg, column.type).compile(dialect=dialect, compile_kwargs={"literal_binds": True}))
+    if column.type.python_type is datetime:
+        return "CURRENT_TIMESTAMP"
+    return None
+
+
+def add_column_sql(table, column, dialect) -> str:
+    ddl = f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column.type.compile(dialect=dialect)}"
+    default = default_sql(column, dialect)
+    if default is not None:
+        ddl += f" DEFAULT {default}"
+        if not column.nullable:
+            ddl += " NOT NULL"
+    return ddl
+
+
+def migrate(bind=engine) -> list[str]:
+    """Apply what is missing; returns a line per change made."""
+    Base.metadata.create_all(bind=bind)
+    changes = []
+    with bind.begin() as conn:
+        inspector = inspect(conn)
+        for table in Base.metadata.sorted_tables:
+            existing = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in existing:
+                    conn.execute(text(add_column_sql(table, column, conn.dialect)))
+                    changes.append(f"added column {table.name}.{column.name}")
+            indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name not in indexes:
+                    index.create(conn)
+                    changes.append(f"added index {index.name}")
+            for name in REPLACED_INDEXES.get(table.name, []):
+                if name in indexes:
+                    conn.execute(text(f"DROP INDEX {name}"))
+                    changes.append(f"dropped index {name}")
+    return changes
+
+
+if __name__ == "__main__":
+    for change in migrate():
+        print(change)
+    print("schema up to date")
@@ -1,20 +1,34 @@
-from sqlalchemy import Column, String, DateTime, Integer, Text
+from sqlalchemy import BigInteger, Boolean, Column, String, DateTime, Float, Integer, Text, Index, text
 from datetime import datetime
 from .database import Base
 
-class Job(Base):
-    __tablename__ = "jobs"
+class JobColumns:
+    """Columns shared by the live jobs table and jobs_archive."""
 
     id = Column(String, primary_key=True, index=True)
     type = Column(String, nullable=False)
+    queue = Column(String, nullable=False, default="default")   # ready set it is dispatched from
 
-    payload = Column(Text, nullable=True)          # JSON string
+    payload = Column(Text, nullable=True)          # JSON string, when small enough to keep inline
+    payload_ref = Column(String, nullable=True)    # "sha256:<hex>" in app.blobs when offloaded
+    payload_size = Column(Integer, nullable=True)  # bytes of serialized JSON, inline or not
+    payload_encoding = Column(String, nullable=True)   # how the blob is stored: identity | zstd | msgpack | msgpack+zstd
     priority = Column(Integer, nullable=False, default=5)
 
+    # repeat submissions return the existing job (app.dedup)
+    idempotency_key = Column(String, nullable=True)
+    dedup_key = Column(String, nullable=True)      # sha256 of type, payload and depends_on
+
     status = Column(String, nullable=False, default="queued")
 
+    # DAG workflows: a "blocked" job becomes "queued" when this reaches 0
+    workflow_id = Column(String, nullable=True)
+    pending_parents = Column(Integer, nullable=False, default=0)
+    has_dependents = Column(Boolean, nullable=False, default=False)   # skip the edge lookup when false
+
     attempts = Column(Integer, nullable=False, default=0)
     max_attempts = Column(Integer, nullable=False, default=3)
+    retry_policy = Column(Text, nullable=True)     # JSON app.retry.RetryPolicy; None: the type's
 
     last_error = Column(Text, nullable=True)
 
@@ -32,4 +46,129 @@ class Job(Base):
     lock_expires_at = Column(DateTime, nullable=True)
 
     def touch(self):
-        self.updated_at = datetime.utcnow()
\ No newline at end of file
+        self.updated_at = datetime.utcnow()
+
+def only(*statuses: str):
+    # partial index predicate: the hot queries only ever look at one or a few statuses
+    if len(statuses) == 1:
+        predicate = f"status = '{statuses[0]}'"
+    else:
+        predicate = "status IN (" + ", ".join(f"'{s}'" for s in statuses) + ")"
+    return {"postgresql_where": text(predicate), "sqlite_where": text(predicate)}
+
+class Job(JobColumns, Base):
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # keyset pagination for GET /jobs, unfiltered and by status / type
+        Index("ix_jobs_created_id", "created_at", "id"),
+        Index("ix_jobs_status_created_id", "status", "created_at", "id"),
+        Index("ix_jobs_type_created_id", "type", "created_at", "id"),
+        # claim / requeue ordering over ready jobs: priority DESC, created_at ASC,
+        # in the index's own order so claims read it without a sort
+        Index("ix_jobs_queued_prio_desc_created", text("priority DESC"), "created_at", **only("queued")),
+        Index("ix_jobs_queued_queue_prio_desc_created", "queue", text("priority DESC"), "created_at",
+              **only("queued")),
+        # scheduler deadlines: retries coming due and leases expiring
+        Index("ix_jobs_queued_next_run", "next_run_at", **only("queued")),
+        Index("ix_jobs_running_lock_expires", "lock_expires_at", **only("running")),
+        # retention sweep over terminal jobs
+        Index("ix_jobs_status_updated", "status", "updated_at"),
+        Index("ix_jobs_workflow", "workflow_id"),
+        # blob GC: is a blob still referenced
+        Index("ix_jobs_payload_ref", "payload_ref"),
+        # one job per idempotency key; one in-flight job per dedup key
+        Index("ux_jobs_idempotency_key", "idempotency_key", unique=True),
+        Index("ux_jobs_dedup_live", "dedup_key", unique=True, **only("blocked", "queued", "running")),
+        Index("ix_jobs_dedup_completed", "dedup_key", "completed_at", **only("completed")),
+    )
+
+class ArchivedJob(JobColumns, Base):
+    """
+    Completed and dead jobs moved out of `jobs` by app.retention once they are
+    older than JOB_RETENTION_DAYS. Same columns, plus when the row was moved.
+    """
+    __tablename__ = "jobs_archive"
+    __table_args__ = (
+        Index("ix_jobs_archive_created_id", "created_at", "id"),
+        Index("ix_jobs_archive_status_created_id", "status", "created_at", "id"),
+        Index("ix_jobs_archive_type_created_id", "type", "created_at", "id"),
+        Index("ix_jobs_archive_completed", "completed_at"),
+        Index("ix_jobs_archive_payload_ref", "payload_ref"),
+        # idempotency keys stay taken after archival (app.dedup)
+        Index("ix_jobs_archive_idempotency_key", "idempotency_key"),
+    )
+
+    archived_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+class JobDependency(Base):
+    """Edge parent -> child: the child runs only after the parent completed."""
+    __tablename__ = "job_dependencies"
+    __table_args__ = (
+        Index("ix_job_dependencies_child", "child_id"),
+    )
+
+    parent_id = Column(String, primary_key=True)    # PK prefix: a parent's children in one range scan
+    child_id = Column(String, primary_key=True)
+
+class ModelVersion(Base):
+    __tablename__ = "model_versions"
+
+    id = Column(String, primary_key=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+
+    mode = Column(String, nullable=False)           # "full" | "incremental"
+    path = Column(String, nullable=False)
+    rows_trained = Column(Integer, nullable=False)
+    holdout_rows = Column(Integer, nullable=False)
+
+    holdout_mae = Column(Float, nullable=True)
+    baseline_mae = Column(Float, nullable=True)     # promoted model on the same holdout
+
+    # completed_at of the newest row seen; incremental runs start after it
+    watermark = Column(DateTime, nullable=True)
+
+    promoted = Column(Boolean, nullable=False, default=False)
+
+
+class RuntimeRollup(Base):
+    """
+    Runtime histogram of completed jobs per (type, hour, bucket), maintained on
+    write so /metrics/runtime never has to scan jobs.
+    """
+    __tablename__ = "runtime_rollups"
+
+    type = Column(String, primary_key=True)
+    window_start = Column(DateTime, primary_key=True)   # truncated to the hour
+    bucket = Column(Integer, primary_key=True)          # see app.runtime_stats.bucket_index
+
+    count = Column(BigInteger, nullable=False, default=0)
+    sum_runtime_ms = Column(BigInteger, nullable=False, default=0)
+
+    # runtime_ms - predicted_runtime_ms, over rows that had a prediction
+    error_count = Column(BigInteger, nullable=False, default=0)
+    sum_error_ms = Column(BigInteger, nullable=False, default=0)
+    sum_abs_error_ms = Column(BigInteger, nullable=False, default=0)
+
+
+class JobEvent(Base):
+    """
+    Append-only history of job transitions, one row per lease, claim, start,
+    complete, fail, lease recovery and telemetry report. Written in batches by
+    app.events; on Postgres the table is range-partitioned by month on ts.
+    """
+    __tablename__ = "job_events"
+    __table_args__ = (
+        Index("ix_job_events_job_ts", "job_id", "ts"),
+        {"postgresql_partition_by": "RANGE (ts)"},
+    )
+
+    ts = Column(DateTime, primary_key=True)     # partition key, so part of the key
+    id = Column(String, primary_key=True)
+
+    job_id = Column(String, nullable=False)
+    event = Column(String, nullable=False)      # lease | claim | start | complete | fail | recover | telemetry
+    status = Column(String, nullable=True)      # job status after the transition
+    worker_id = Column(String, nullable=True)
+    attempt = Column(Integer, nullable=True)    # 1-based run the event belongs to
+    runtime_ms = Column(Integer, nullable=True)
+    error = Column(Text, nullable=True)
@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+from datetime import datetime, timedelta
+from typing import Any, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+from app.db.models import ArchivedJob, Job
+
+# Repeat submissions are answered with the job the first one created:
+# - idempotency_key: the producer names the submission. One job per key,
+#   enforced by a unique index; Redis caches key -> job id for this long.
+#   A key stays taken once its job is archived (app.retention): jobs_archive
+#   is checked too, so a late retry never runs the work again.
+# - dedup: the key is a hash of (type, payload, depends_on). An identical job
+#   that is still in flight is returned instead of a new one, and so is one
+#   that completed within DEDUP_RESULT_TTL_SECONDS.
+IDEMPOTENCY_TTL_SECONDS = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", str(24 * 3600)))
+DEDUP_RESULT_TTL_SECONDS = int(os.getenv("DEDUP_RESULT_TTL_SECONDS", "3600"))
+
+IDEMPOTENCY_CACHE_KEY = "smartflow:idempotency:{}"
+DEDUP_CACHE_KEY = "smartflow:dedup:{}"
+
+LIVE_STATUSES = ("blocked", "queued", "running")
+
+Keys = Tuple[Optional[str], Optional[str]]   # (idempotency_key, dedup_key)
+
+
+def content_key(job_type: str, payload: Any, payload_ref: Optional[str], depends_on: Sequence[str]) -> str:
+    body = json.dumps([job_type, payload, payload_ref, sorted(depends_on)], sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(body.encode()).hexdigest()
+
+
+def reusable(row, now: datetime) -> bool:
+    # stands in for a new job: still in flight, or completed recently enough
+    if row.status in LIVE_STATUSES:
+        return True
+    return (row.status == "completed" and row.completed_at is not None
+            and row.completed_at >= now - timedelta(seconds=DEDUP_RESULT_TTL_SECONDS))
+
+
+def matches(row, keys: Keys, now: datetime) -> bool:
+    idempotency_key, dedup_key = keys
+    if idempotency_key is not None and row.idempotency_key == idempotency_key:
+        return True
+    return dedup_key is not None and row.dedup_key == dedup_key and reusable(row, now)
+
+
+def find_existing(db: Session, rdb, keys: List[Keys], now: datetime, columns) -> List[Optional[Any]]:
+    """
+    The existing job for each submission's keys, or None. Redis is asked
+    first, so a retried submission costs one MGET and one primary-key read;
+    keys Redis does not know are looked up through the indexes. `columns`
+    are Job attributes and must include id, status, completed_at,
+    idempotency_key and dedup_key; archived jobs are read through the same
+    columns of ArchivedJob.
+    """
+    found: List[Optional[Any]] = [None] * len(keys)
+    slots = []
+    for i, (idempotency_key, dedup_key) in enumerate(keys):
+        if idempotency_key is not None:
+            slots.append((i, IDEMPOTENCY_CACHE_KEY.format(idempotency_key)))
+        if dedup_key is not None:
+            slots.append((i, DEDUP_CACHE_KEY.format(dedup_key)))
+    if not slots:
+        return found
+    archived_columns = [getattr(ArchivedJob, c.key) for c in columns]
+
+    cached = rdb.mget([key for _, key in slots])
+    candidate_ids = {job_id for job_id in cached if job_id}
+    if candidate_ids:
+        by_id = {r.id: r for r in db.execute(select(*columns).where(Job.id.in_(candidate_ids))).all()}
+        archived = candidate_ids - set(by_id)
+        if archived:
+            rows = db.execute(select(*archived_columns).where(ArchivedJob.id.in_(archived))).all()
+            by_id.update((r.id, r) for r in rows)
+        for (i, _), job_id in zip(slots, cached):
+            row = by_id.get(job_id)
+            if found[i] is None and row is not None and matches(row, keys[i], now):
+                found[i] = row
+
+    missing = sorted({i for i, _ in slots if found[i] is None})
+    idempotency_keys = {keys[i][0] for i in missing if keys[i][0] is not None}
+    dedup_keys = {keys[i][1] for i in missing if keys[i][1] is not None}
+    by_idempotency_key = {}
+    if idempotency_keys:
+        rows = db.execute(select(*columns).where(Job.idempotency_key.in_(idempotency_keys))).all()
+        by_idempotency_key = {r.idempotency_key: r for r in rows}
+        archived = idempotency_keys - set(by_idempotency_key)
+        if archived:
+            rows = db.execute(select(*archived_columns).where(ArchivedJob.idempotency_key.in_(archived))).all()
+            by_idempotency_key.update((r.idempotency_key, r) for r in rows)
+    by_dedup_key = {}
+    if dedup_keys:
+        rows = db.execute(
+            select(*columns)
+            .where(Job.dedup_key.in_(dedup_keys))
+            .where(Job.status.in_(LIVE_STATUSES + ("completed",)))
+            .order_by(Job.created_at.asc())
+        ).all()
+        # newest reusable job per key wins
+        by_dedup_key = {r.dedup_key: r for r in rows if reusable(r, now)}
+    for i in missing:
+        idempotency_key, dedup_key = keys[i]
+        found[i] = by_idempotency_key.get(idempotency_key) or by_dedup_key.get(dedup_key)
+
+    remember(rdb, [(keys[i], found[i].id) for i in missing if found[i] is not None])
+    return found
+
+
+def remember(rdb, entries: List[Tuple[Keys, str]]):
+    """Cache (keys, job id) pairs so the next repeat skips the index lookups."""
+    if not entries:
+        return
+    pipe = rdb.pipeline(transaction=False)
+    for (idempotency_key, dedup_key), job_id in entries:
+        if idempotency_key is not None:
+            pipe.set(IDEMPOTENCY_CACHE_KEY.format(idempotency_key), job_id, ex=IDEMPOTENCY_TTL_SECONDS)
+        if dedup_key is not None:
+            pipe.set(DEDUP_CACHE_KEY.format(dedup_key), job_id, ex=max(1, DEDUP_RESULT_TTL_SECONDS))
+    pipe.execute()
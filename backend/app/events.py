@@ -0,0 +1,165 @@
+import atexit
+import os
+import sys
+import threading
+from datetime import datetime, timedelta
+from typing import Optional
+from uuid import uuid4
+
+from sqlalchemy import insert, text
+
+from app.db.database import engine
+from app.db.models import JobEvent
+
+EVENT_FLUSH_SECONDS = float(os.getenv("EVENT_FLUSH_SECONDS", "1"))
+EVENT_BATCH_SIZE = int(os.getenv("EVENT_BATCH_SIZE", "1000"))
+# events held while the database is unreachable; past this the oldest are dropped
+EVENT_BUFFER_MAX = int(os.getenv("EVENT_BUFFER_MAX", "100000"))
+EVENT_RETENTION_DAYS = int(os.getenv("EVENT_RETENTION_DAYS", "30"))
+
+
+def month_start(ts: datetime) -> datetime:
+    return ts.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+def next_month(month: datetime) -> datetime:
+    return (month + timedelta(days=32)).replace(day=1)
+
+def partition_name(month: datetime) -> str:
+    return f"job_events_{month:%Y_%m}"
+
+def run_number(status: str, attempts: int) -> int:
+    # attempts counts failed runs; a running or completed job is on the next one
+    return attempts + 1 if status in ("running", "completed") else attempts
+
+def ensure_partitions(conn, months) -> None:
+    """Create the monthly partitions of job_events covering `months` (Postgres only)."""
+    for month in sorted(months):
+        conn.execute(text(
+            f"CREATE TABLE IF NOT EXISTS {partition_name(month)} PARTITION OF job_events "
+            f"FOR VALUES FROM ('{month:%Y-%m-%d}') TO ('{next_month(month):%Y-%m-%d}')"
+        ))
+
+def drop_events_before(conn, cutoff: datetime) -> int:
+    """
+    Drop history older than `cutoff`. On Postgres whole monthly partitions are
+    dropped once they end before the cutoff, so this never scans rows; other
+    backends fall back to a DELETE. Returns partitions dropped / rows deleted.
+    """
+    if conn.dialect.name != "postgresql":
+        return conn.execute(JobEvent.__table__.delete().where(JobEvent.ts < cutoff)).rowcount
+
+    names = conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "JOIN pg_class p ON p.oid = i.inhparent "
+        "WHERE p.relname = 'job_events'"
+    )).scalars().all()
+    dropped = 0
+    for name in names:
+        try:
+            month = datetime.strptime(name, "job_events_%Y_%m")
+        except ValueError:
+            continue
+        if next_month(month) <= cutoff:
+            conn.execute(text(f"DROP TABLE {name}"))
+            dropped += 1
+    return dropped
+
+
+class EventLog:
+    """
+    In-process buffer for job_events. record() only appends to a list; a
+    background thread writes the buffer as one multi-row INSERT every
+    `flush_seconds`, or sooner once `batch_size` events are waiting. Events
+    still buffered when the process is killed are lost, which is the price
+    of keeping the write off the request path.
+    """
+
+    def __init__(self, bind=engine, flush_seconds: float = EVENT_FLUSH_SECONDS,
+                 batch_size: int = EVENT_BATCH_SIZE, max_buffered: int = EVENT_BUFFER_MAX):
+        self.bind = bind
+        self.flush_seconds = flush_seconds
+        self.batch_size = batch_size
+        self.max_buffered = max_buffered
+
+        self.dropped = 0
+        self._buffer: list[dict] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._months: set[datetime] = set()    # partitions known to exist
+
+    def record(self, job_id: str, event: str, status: Optional[str] = None, worker_id: Optional[str] = None,
+               attempt: Optional[int] = None, runtime_ms: Optional[int] = None, error: Optional[str] = None,
+               ts: Optional[datetime] = None):
+        row = {
+            "ts": ts or datetime.utcnow(),
+            "id": uuid4().hex,
+            "job_id": job_id,
+            "event": event,
+            "status": status,
+            "worker_id": worker_id,
+            "attempt": attempt,
+            "runtime_ms": runtime_ms,
+            "error": error,
+        }
+        with self._lock:
+            self._buffer.append(row)
+            self._trim()
+            full = len(self._buffer) >= self.batch_size
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True)
+                self._thread.start()
+                atexit.register(self.close)
+        if full:
+            self._wake.set()
+
+    def _trim(self):
+        overflow = len(self._buffer) - self.max_buffered
+        if overflow > 0:
+            del self._buffer[:overflow]
+            self.dropped += overflow
+
+    def pending(self) -> int:
+        with self._lock:
+            return len(self._buffer)
+
+    def flush(self) -> int:
+        with self._lock:
+            rows, self._buffer = self._buffer, []
+        if not rows:
+            return 0
+        try:
+            if self.bind.dialect.name == "postgresql":
+                missing = {month_start(r["ts"]) for r in rows} - self._months
+                if missing:
+                    with self.bind.begin() as conn:
+                        ensure_partitions(conn, missing)
+                    self._months |= missing
+            with self.bind.begin() as conn:
+                conn.execute(insert(JobEvent.__table__), rows)
+        except Exception:
+            # keep them for the next flush, ahead of anything recorded since
+            with self._lock:
+                self._buffer[:0] = rows
+                self._trim()
+            raise
+        return len(rows)
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_seconds)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as exc:
+                print(f"[events] flush failed, will retry: {exc}", file=sys.stderr, flush=True)
+
+    def close(self):
+        try:
+            self.flush()
+        except Exception as exc:
+            print(f"[events] final flush failed, {self.pending()} events lost: {exc}", file=sys.stderr, flush=True)
+
+
+EVENTS = EventLog()
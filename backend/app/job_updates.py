@@ -0,0 +1,138 @@
+import asyncio
+import json
+import os
+import sys
+from typing import Any, Dict, Iterable, Optional
+
+from redis.exceptions import RedisError
+
+# Job state deltas go to a capped Redis stream. Stream ids double as resume
+# cursors: a client that reconnects with the last id it saw gets everything
+# after it, as long as it is still within the last STREAM_MAXLEN entries.
+STREAM_KEY = "smartflow:job-updates"
+STREAM_MAXLEN = int(os.getenv("JOB_STREAM_MAXLEN", "10000"))
+# deltas a slow SSE client may fall behind by before it is cut off to resume
+SUBSCRIBER_QUEUE_SIZE = 1000
+KEEPALIVE_SECONDS = 15
+
+
+def delta(job_id: str, status: str, **fields: Any) -> Dict[str, str]:
+    return {"data": json.dumps({"id": job_id, "status": status, **fields}, default=str)}
+
+# Publishing is best-effort: a Redis hiccup must not fail a transition that
+# already committed. A client that misses a delta catches up on its next reload.
+
+def publish_many(rdb, deltas: Iterable[Dict[str, str]]):
+    try:
+        pipe = rdb.pipeline(transaction=False)
+        for d in deltas:
+            pipe.xadd(STREAM_KEY, d, maxlen=STREAM_MAXLEN, approximate=True)
+        pipe.execute()
+    except RedisError as exc:
+        print(f"[job-updates] publish failed: {exc}", file=sys.stderr, flush=True)
+
+def publish(rdb, job_id: str, status: str, **fields: Any):
+    publish_many(rdb, [delta(job_id, status, **fields)])
+
+async def publish_many_async(ardb, deltas: Iterable[Dict[str, str]]):
+    try:
+        pipe = ardb.pipeline(transaction=False)
+        for d in deltas:
+            pipe.xadd(STREAM_KEY, d, maxlen=STREAM_MAXLEN, approximate=True)
+        await pipe.execute()
+    except RedisError as exc:
+        print(f"[job-updates] publish failed: {exc}", file=sys.stderr, flush=True)
+
+async def publish_async(ardb, job_id: str, status: str, **fields: Any):
+    await publish_many_async(ardb, [delta(job_id, status, **fields)])
+
+async def latest_id(ardb) -> str:
+    newest = await ardb.xrevrange(STREAM_KEY, count=1)
+    return newest[0][0] if newest else "0-0"
+
+def id_key(entry_id: str) -> tuple[int, int]:
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq or 0)
+
+def sse(entry_id: str, event: str, data: str) -> str:
+    return f"id: {entry_id}\nevent: {event}\ndata: {data}\n\n"
+
+
+class Subscriber:
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue(SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+
+class JobUpdateHub:
+    """
+    Fans the update stream out to this process's SSE connections. One XREAD
+    loop per process, however many clients are connected; it runs while
+    there is at least one subscriber.
+    """
+
+    def __init__(self):
+        self.subscribers: set[Subscriber] = set()
+        self._task: Optional[asyncio.Task] = None
+
+    async def subscribe(self, ardb) -> Subscriber:
+        sub = Subscriber()
+        self.subscribers.add(sub)
+        if self._task is None or self._task.done():
+            # start from the current tail so nothing published from here on is missed
+            self._task = asyncio.create_task(self._run(ardb, await latest_id(ardb)))
+        return sub
+
+    def unsubscribe(self, sub: Subscriber):
+        self.subscribers.discard(sub)
+
+    async def _run(self, ardb, last_id: str):
+        while self.subscribers:
+            try:
+                result = await ardb.xread({STREAM_KEY: last_id}, block=5000, count=500)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                await asyncio.sleep(1)
+                continue
+            for _key, entries in result or []:
+                for entry_id, fields in entries:
+                    last_id = entry_id
+                    for sub in list(self.subscribers):
+                        try:
+                            sub.queue.put_nowait((entry_id, fields["data"]))
+                        except asyncio.QueueFull:
+                            # cut it off; the client resumes from its cursor on reconnect
+                            sub.overflowed = True
+                            self.subscribers.discard(sub)
+
+    async def stream(self, ardb, cursor: Optional[str]):
+        """
+        Yield SSE frames: first everything after `cursor` still in the stream,
+        then live deltas. If entries after the cursor may have been trimmed
+        away, a `reset` event tells the client to reload the job list instead.
+        """
+        sub = await self.subscribe(ardb)
+        try:
+            last = cursor if cursor and cursor != "$" else await latest_id(ardb)
+            if cursor and cursor != "$":
+                oldest = await ardb.xrange(STREAM_KEY, count=1)
+                if oldest and id_key(cursor) < id_key(oldest[0][0]) and await ardb.xlen(STREAM_KEY) >= STREAM_MAXLEN:
+                    yield sse(oldest[0][0], "reset", "{}")
+                    return
+                for entry_id, fields in await ardb.xrange(STREAM_KEY, min=f"({cursor}", count=STREAM_MAXLEN):
+                    last = entry_id
+                    yield sse(entry_id, "job", fields["data"])
+
+            while not sub.overflowed:
+                try:
+                    entry_id, data = await asyncio.wait_for(sub.queue.get(), KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                if id_key(entry_id) <= id_key(last):
+                    continue    # already sent from the backlog
+                last = entry_id
+                yield sse(entry_id, "job", data)
+        finally:
+            self.unsubscribe(sub)
@@ -1,33 +1,43 @@
 import os
 import redis
+import redis.asyncio as aioredis
 import json
-from typing import Any, Optional, Dict
-from fastapi import FastAPI, HTTPException
+import base64
+from contextlib import asynccontextmanager
+from typing import Any, Literal, Optional, Dict, List
+from fastapi import FastAPI, Header, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
 from uuid import uuid4
 from datetime import datetime
 from fastapi import HTTPException
 from sqlalchemy.orm import Session
-from sqlalchemy import asc, desc
+from sqlalchemy import asc, case, desc, func, insert, select, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.sql import nullslast
 from fastapi import Depends, HTTPException
-from sqlalchemy.exc import OperationalError
-from app.db.database import Base, SessionLocal, engine
-from app.db.models import Job as JobModel  # noqa: E402 - register model with Base
+from sqlalchemy.exc import IntegrityError
+from app.db.database import AsyncSessionLocal, Base, SessionLocal, async_engine, engine
+from app.db.models import ArchivedJob, Job as JobModel, JobDependency, JobEvent, ModelVersion  # noqa: E402 - register models with Base
 from datetime import timedelta
-from app.ml.predict import load_model, predict_runtime_ms
+from app.ml.predict import ModelService
+from app.ml.train import TrainingRunner
+from app import blobs, breaker, dedup, job_updates, metrics, redis_queue, retry, runtime_stats, shards, type_limits, workflows
+from app.blobs import BLOBS, PAYLOAD_ENCODING, PAYLOAD_INLINE_MAX
+from app.events import EVENTS, run_number
+from app.metrics import BREAKER_OPENS, LEASE_CONFLICTS, THROTTLED_CLAIMS, Gauge, MetricsMiddleware
+from app.retention import archive_terminal_jobs, referenced_blobs
+from app.scheduler.policies import CURRENT_POLICY
+from app.scheduler.reconcile import enqueue_ready, recover_expired_leases
 from fastapi.middleware.cors import CORSMiddleware
 
-try:
-    ML_MODEL = load_model()
-except Exception:
-    ML_MODEL = None
-
-try:
-    Base.metadata.create_all(bind=engine)
-except OperationalError as e:
-    import sys
-    print(f"Warning: Could not connect to database (tables not created). Start Postgres and restart the app. {e}", file=sys.stderr)
+# The schema is created and upgraded by `python -m app.db.migrate`, not here.
+# The model loads in the background after startup (or on first prediction
+# with MODEL_WARMUP=0); until then jobs are simply queued without a prediction.
+MODEL_WARMUP = os.getenv("MODEL_WARMUP", "1") == "1"
+RUNTIME_MODEL = ModelService()
+TRAINING = TrainingRunner()
 
 def get_db():
     db = SessionLocal()
@@ -36,34 +46,64 @@ def get_db():
     finally:
         db.close()
 
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+MAX_ATTEMPTS = 10
+
+class RetryPolicyRequest(BaseModel):
+    kind: Literal["exponential", "fixed", "schedule"] = "exponential"
+    delays: Optional[List[float]] = Field(None, min_length=1, max_length=MAX_ATTEMPTS)  # seconds per attempt
+    base: Optional[float] = Field(None, gt=0)
+    factor: Optional[float] = Field(None, ge=1)
+    max_delay: Optional[float] = Field(None, gt=0)
+    jitter: Optional[float] = Field(None, ge=0, le=1)   # default: 1 for exponential, else RETRY_JITTER
+
+    def policy(self) -> retry.RetryPolicy:
+        return retry.make_policy(**self.model_dump())
+
+QUEUE_NAME = r"^[A-Za-z0-9_.:-]{1,64}$"
+
 class CreateJobRequest(BaseModel):
     type: str = Field(..., min_length=1)
+    queue: str = Field(redis_queue.DEFAULT_QUEUE, pattern=QUEUE_NAME)   # dispatched from its own ready set
     payload: Optional[Dict[str, Any]] = None
     priority: int = Field(5, ge=1, le=10)
-    max_attempts: int = Field(3, ge=1, le=10)
-
-def backoff_seconds(attempt: int) -> int:
-    # attempt is 1-based after the failure has been counted
-    if attempt == 1:
-        return 10
-    if attempt == 2:
-        return 30
-    if attempt == 3:
-        return 90
-    return 300
-
-app = FastAPI(title="SmartFlow Scheduler")
+    max_attempts: int = Field(3, ge=1, le=MAX_ATTEMPTS)
+    depends_on: List[str] = Field(default_factory=list)   # parent job ids; runs after all completed
+    payload_ref: Optional[str] = None   # a blob from PUT /blobs, instead of an inline payload
+    # A repeat with the same key returns the first job instead of creating one.
+    idempotency_key: Optional[str] = Field(None, min_length=1, max_length=255)
+    # Return an identical (type, payload, depends_on) job that is in flight or recently completed.
+    dedup: bool = False
+    retry_policy: Optional[RetryPolicyRequest] = None   # overrides the type's policy
+
+def submission_keys(req: CreateJobRequest) -> dedup.Keys:
+    content = dedup.content_key(req.type, req.payload, req.payload_ref, req.depends_on) if req.dedup else None
+    return req.idempotency_key, content
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if MODEL_WARMUP:
+        RUNTIME_MODEL.warm_up()
+    yield
+
+app = FastAPI(title="SmartFlow Scheduler", lifespan=lifespan)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:5173"],
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "X-Stream-Cursor", "Idempotent-Replayed"],
 )
+app.add_middleware(MetricsMiddleware)
 
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 rdb = redis.from_url(REDIS_URL, decode_responses=True)
-QUEUE_KEY = "smartflow:queue"
+ardb = aioredis.from_url(REDIS_URL, decode_responses=True)
+UPDATES = job_updates.JobUpdateHub()
 
 class Job(BaseModel):
     id: str
@@ -77,186 +117,666 @@ jobs = []
 def health():
     return {"status": "ok"}
 
-@app.post("/jobs")
-def create_job(req: CreateJobRequest, db: Session = Depends(get_db)):
-    job_id = str(uuid4())
-
-    payload_str = json.dumps(req.payload) if req.payload is not None else None
+@app.get("/ready")
+def ready(response: Response, db: Session = Depends(get_db)):
+    """
+    Whether this process should get traffic: the schema is migrated, Redis
+    answers and the model warm-up is over. `/` only says the process is up.
+    """
+    checks = {}
+    try:
+        # selecting every mapped column fails if a table or column is missing
+        for table in Base.metadata.sorted_tables:
+            db.execute(select(table).limit(0))
+        checks["database"] = "ok"
+    except Exception as exc:
+        checks["database"] = f"not ready: {type(exc).__name__} (run python -m app.db.migrate)"
+    try:
+        rdb.ping()
+        checks["redis"] = "ok"
+    except Exception as exc:
+        checks["redis"] = f"not ready: {type(exc).__name__}"
+    checks["model"] = "ok" if RUNTIME_MODEL.warmed.is_set() or not MODEL_WARMUP else "warming up"
+    ok = all(v == "ok" for v in checks.values())
+    if not ok:
+        response.status_code = 503
+    return {"status": "ok" if ok else "not ready", "checks": checks}
+
+def store_payload(req: CreateJobRequest, new_blobs: Optional[List[str]] = None) -> Dict[str, Any]:
+    # Small payloads stay in the row. Larger ones, and blobs uploaded through
+    # PUT /blobs, are kept in the blob store and the row only references them.
+    if req.payload_ref is not None:
+        if req.payload is not None:
+            raise ValueError("Give either payload or payload_ref, not both")
+        size = BLOBS.touch(req.payload_ref)
+        if size is None:
+            raise ValueError(f"Unknown blob {req.payload_ref}")
+        return {"payload": None, "payload_ref": req.payload_ref, "payload_size": size, "payload_encoding": "identity"}
+
+    if req.payload is None:
+        return {"payload": None, "payload_ref": None, "payload_size": None, "payload_encoding": None}
+    payload_str = json.dumps(req.payload)
+    data = payload_str.encode()
+    if len(data) <= PAYLOAD_INLINE_MAX:
+        return {"payload": payload_str, "payload_ref": None, "payload_size": len(data), "payload_encoding": None}
+    ref = BLOBS.put(blobs.encode(data, PAYLOAD_ENCODING, req.payload), created=new_blobs)
+    return {"payload": None, "payload_ref": ref, "payload_size": len(data), "payload_encoding": PAYLOAD_ENCODING}
+
+def unreferenced_blobs(refs: List[str]) -> set:
+    # for BLOBS.removed_on_error: the failed request's session may be unusable
+    with SessionLocal() as db:
+        return set(refs) - referenced_blobs(db, refs)
+
+def insert_jobs(db: Session, reqs: List[CreateJobRequest], keys: List[str], job_ids: List[str],
+                now: datetime, workflow_id: Optional[str] = None,
+                dedup_keys: Optional[List[dedup.Keys]] = None,
+                new_blobs: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+    """
+    Insert new jobs and their dependency edges in the caller's transaction,
+    with multi-row INSERTs. depends_on may name another job's key in this
+    call or an existing job id. Raises ValueError for unknown parents and
+    cycles. Returns the inserted rows; refs of payloads offloaded to new
+    blobs are appended to `new_blobs`.
+    """
+    id_of = dict(zip(keys, job_ids))
+    existing = {d for r in reqs for d in r.depends_on if d not in id_of}
+    plans = workflows.plan(
+        {key: r.depends_on for key, r in zip(keys, reqs)},
+        workflows.parent_statuses(db, existing) if existing else {},
+    )
+    local_parents = {d for r in reqs for d in r.depends_on if d in id_of}
 
-    pred_ms = None
+    payloads = [store_payload(r, new_blobs) for r in reqs]
+    preds = [None] * len(reqs)
     try:
-        pred_ms = predict_runtime_ms(
-            ML_MODEL,
-            req.type,
-            req.priority,
-            0,  # new job, no attempts yet
-            payload_str,
+        preds = RUNTIME_MODEL.predict_many(
+            ((r.type, r.priority, 0, p["payload_size"] or 0) for r, p in zip(reqs, payloads)),
         )
     except Exception:
         pass
 
-    job_row = JobModel(
-        id=job_id,
-        type=req.type,
-        payload=payload_str,
-        priority=req.priority,
-        status="queued",
-        attempts=0,
-        max_attempts=req.max_attempts,
-        last_error=None,
-    )
-    if pred_ms is not None:
-        job_row.predicted_runtime_ms = pred_ms
-
-    db.add(job_row)
-    db.commit()
-    db.refresh(job_row)
-
-    # Push job id to Redis queue
-    rdb.rpush(QUEUE_KEY, job_id)
+    dedup_keys = dedup_keys or [(None, None)] * len(reqs)
 
-    return {
-        "id": job_row.id,
-        "type": job_row.type,
-        "payload": req.payload,
-        "priority": job_row.priority,
-        "status": job_row.status,
-        "attempts": job_row.attempts,
-        "max_attempts": job_row.max_attempts,
-        "last_error": job_row.last_error,
-        "created_at": job_row.created_at,
-        "updated_at": job_row.updated_at,
-        "started_at": job_row.started_at,
-        "completed_at": job_row.completed_at,
-        "runtime_ms": getattr(job_row, "runtime_ms", None),
-        "predicted_runtime_ms": getattr(job_row, "predicted_runtime_ms", None),
-    }
-
-@app.get("/jobs")
-def list_jobs(db: Session = Depends(get_db)):
-    rows = db.query(JobModel).order_by(JobModel.created_at.desc()).all()
-
-    result = []
-    for r in rows:
-        payload_obj = None
-        if r.payload:
-            try:
-                payload_obj = json.loads(r.payload)
-            except Exception:
-                payload_obj = {"_raw": r.payload}
-
-        result.append({
-            "id": r.id,
+    rows = []
+    edges = []
+    for key, job_id, r, payload, pred, (idempotency_key, dedup_key) in zip(
+            keys, job_ids, reqs, payloads, preds, dedup_keys):
+        status, pending, last_error, waiting = plans[key]
+        rows.append({
+            "id": job_id,
             "type": r.type,
-            "payload": payload_obj,
+            "queue": r.queue,
+            **payload,
             "priority": r.priority,
-            "status": r.status,
-            "attempts": r.attempts,
+            "idempotency_key": idempotency_key,
+            "dedup_key": dedup_key,
+            "status": status,
+            "workflow_id": workflow_id,
+            "pending_parents": pending,
+            "has_dependents": key in local_parents,
+            "attempts": 0,
             "max_attempts": r.max_attempts,
-            "last_error": r.last_error,
-            "created_at": r.created_at,
-            "updated_at": r.updated_at,
-            "started_at": r.started_at,
-            "completed_at": r.completed_at,
-            "runtime_ms": getattr(r, "runtime_ms", None),
-            "predicted_runtime_ms": getattr(r, "predicted_runtime_ms", None),
+            "retry_policy": r.retry_policy.policy().to_json() if r.retry_policy else None,
+            "last_error": last_error,
+            "created_at": now,
+            "updated_at": now,
+            "predicted_runtime_ms": pred,
         })
+        edges.extend({"parent_id": id_of.get(p, p), "child_id": job_id} for p in waiting)
+
+    if rows:
+        # one multi-row INSERT each for jobs and edges
+        db.execute(insert(JobModel.__table__), rows)
+    if edges:
+        db.execute(insert(JobDependency.__table__), edges)
+    return rows
+
+def publish_new_jobs(rows: List[Dict[str, Any]], now: datetime):
+    # only jobs with nothing left to wait for go to the ready set
+    redis_queue.enqueue_many(rdb, (
+        redis_queue.ready_job(row["id"], row["type"], row["priority"], now, row["predicted_runtime_ms"], row["queue"])
+        for row in rows if row["status"] == "queued"
+    ))
+    job_updates.publish_many(rdb, (
+        job_updates.delta(row["id"], row["status"], type=row["type"], priority=row["priority"], attempts=0,
+                          pending_parents=row["pending_parents"], workflow_id=row["workflow_id"],
+                          predicted_runtime_ms=row["predicted_runtime_ms"], created_at=now)
+        for row in rows
+    ))
+
+@app.put("/blobs", status_code=201)
+async def upload_blob(request: Request):
+    """
+    Upload a large payload ahead of time; pass the returned ref as
+    payload_ref when creating jobs. The body is streamed to disk, never
+    held in memory, and identical uploads are stored once.
+    """
+    # disk I/O goes to the threadpool so a large upload never stalls the event loop
+    writer = await run_in_threadpool(BLOBS.writer)
+    try:
+        async for chunk in request.stream():
+            await run_in_threadpool(writer.write, chunk)
+        ref = await run_in_threadpool(writer.commit)
+    except ValueError as e:
+        writer.abort()
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception:
+        writer.abort()
+        raise
+    return {"ref": ref, "size": writer.size}
 
-    return result
+DEDUP_FIELDS = ("idempotency_key", "dedup_key")
 
-@app.post("/jobs/{job_id}/start")
-def start_job(job_id: str, db: Session = Depends(get_db)):
-    job = db.query(JobModel).filter(JobModel.id == job_id).first()
-    if not job:
-        raise HTTPException(status_code=404, detail="Job not found")
+def existing_jobs(db: Session, keys: List[dedup.Keys], now: datetime):
+    columns = [getattr(JobModel, f) for f in dict.fromkeys(JOB_FIELDS + DEDUP_FIELDS)]
+    return dedup.find_existing(db, rdb, keys, now, columns)
 
-    if job.status != "queued":
-        raise HTTPException(status_code=400, detail=f"Job is not queued (status={job.status})")
+@app.post("/jobs")
+def create_job(req: CreateJobRequest, response: Response, db: Session = Depends(get_db)):
+    now = datetime.utcnow()
+    keys = submission_keys(req)
+    # a concurrent submission with the same keys may insert first; then the
+    # unique index rejects ours and the second lookup finds theirs
+    for _ in range(2):
+        existing = existing_jobs(db, [keys], now)[0]
+        if existing is not None:
+            response.headers["Idempotent-Replayed"] = "true"
+            return job_to_dict(existing)
+
+        job_id = str(uuid4())
+        try:
+            with BLOBS.removed_on_error(unreferenced_blobs) as new_blobs:
+                row = insert_jobs(db, [req], [job_id], [job_id], now, dedup_keys=[keys], new_blobs=new_blobs)[0]
+                db.commit()
+            break
+        except ValueError as exc:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=str(exc))
+        except IntegrityError:
+            db.rollback()
+    else:
+        raise HTTPException(status_code=409, detail="Conflicting concurrent submission, retry")
+
+    dedup.remember(rdb, [(keys, job_id)] if keys != (None, None) else [])
+    # Push job id to the Redis ready set (unless it waits on parents)
+    publish_new_jobs([row], now)
+
+    return {
+        "id": row["id"],
+        "type": row["type"],
+        "queue": row["queue"],
+        "payload": req.payload if row["payload_ref"] is None else None,
+        "priority": row["priority"],
+        "payload_ref": row["payload_ref"],
+        "payload_size": row["payload_size"],
+        "idempotency_key": row["idempotency_key"],
+        "status": row["status"],
+        "pending_parents": row["pending_parents"],
+        "attempts": row["attempts"],
+        "max_attempts": row["max_attempts"],
+        "last_error": row["last_error"],
+        "created_at": row["created_at"],
+        "updated_at": row["updated_at"],
+        "started_at": None,
+        "completed_at": None,
+        "runtime_ms": None,
+        "predicted_runtime_ms": row["predicted_runtime_ms"],
+    }
+
+MAX_BATCH_SIZE = 10000
+
+@app.post("/jobs/batch")
+def create_jobs_batch(reqs: List[CreateJobRequest], db: Session = Depends(get_db)):
+    if len(reqs) > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=400, detail=f"Batch too large (max {MAX_BATCH_SIZE} jobs)")
 
     now = datetime.utcnow()
-    if job.next_run_at is not None and job.next_run_at > now:
-        raise HTTPException(status_code=409, detail="Job not ready to run yet")
+    keys = [submission_keys(r) for r in reqs]
+    for _ in range(2):
+        job_ids = [row.id if row is not None else None for row in existing_jobs(db, keys, now)]
+        # repeats within the batch share the first one's new job
+        first: Dict[tuple, int] = {}
+        new = []
+        for i, (idempotency_key, dedup_key) in enumerate(keys):
+            if job_ids[i] is not None:
+                continue
+            names = [n for n in (("i", idempotency_key), ("d", dedup_key)) if n[1] is not None]
+            earlier = next((first[n] for n in names if n in first), None)
+            if earlier is not None:
+                job_ids[i] = job_ids[earlier]
+                continue
+            job_ids[i] = str(uuid4())
+            new.append(i)
+            first.update((n, i) for n in names)
+
+        new_ids = [job_ids[i] for i in new]
+        try:
+            with BLOBS.removed_on_error(unreferenced_blobs) as new_blobs:
+                rows = insert_jobs(db, [reqs[i] for i in new], new_ids, new_ids, now,
+                                   dedup_keys=[keys[i] for i in new], new_blobs=new_blobs)
+                db.commit()
+            break
+        except ValueError as exc:
+            db.rollback()
+            raise HTTPException(status_code=400, detail=str(exc))
+        except IntegrityError:
+            db.rollback()
+    else:
+        raise HTTPException(status_code=409, detail="Conflicting concurrent submission, retry")
+
+    dedup.remember(rdb, [(keys[i], job_ids[i]) for i in new if keys[i] != (None, None)])
+    # a single ZADD covers every ready id in the batch
+    publish_new_jobs(rows, now)
+
+    return {"ids": job_ids}
+
+MAX_WORKFLOW_SIZE = 100_000
+
+class WorkflowJobRequest(CreateJobRequest):
+    key: str = Field(..., min_length=1)     # what other jobs in the workflow list in depends_on
+
+class CreateWorkflowRequest(BaseModel):
+    jobs: List[WorkflowJobRequest] = Field(..., min_length=1, max_length=MAX_WORKFLOW_SIZE)
+
+@app.post("/workflows")
+def create_workflow(req: CreateWorkflowRequest, db: Session = Depends(get_db)):
+    # The whole DAG is inserted in one transaction: either every job and edge
+    # exists or none does. Roots are ready at once; the rest wait in "blocked".
+    keys = [j.key for j in req.jobs]
+    if len(set(keys)) != len(keys):
+        raise HTTPException(status_code=400, detail="Duplicate job keys")
+    if any(j.idempotency_key is not None or j.dedup for j in req.jobs):
+        raise HTTPException(status_code=400, detail="idempotency_key and dedup are not supported inside workflows")
 
-    if not job.locked_by or not job.lock_expires_at or job.lock_expires_at <= now:
-        raise HTTPException(status_code=409, detail="Job has no valid lease")
+    now = datetime.utcnow()
+    workflow_id = str(uuid4())
+    job_ids = [str(uuid4()) for _ in keys]
+    try:
+        with BLOBS.removed_on_error(unreferenced_blobs) as new_blobs:
+            rows = insert_jobs(db, req.jobs, keys, job_ids, now, workflow_id, new_blobs=new_blobs)
+            db.commit()
+    except ValueError as exc:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(exc))
+
+    publish_new_jobs(rows, now)
+
+    return {"workflow_id": workflow_id, "ids": dict(zip(keys, job_ids))}
+
+@app.get("/workflows/{workflow_id}")
+async def get_workflow(workflow_id: str, db: AsyncSession = Depends(get_async_db)):
+    by_status: Dict[str, int] = {}
+    for table in (JobModel, ArchivedJob):
+        rows = (await db.execute(
+            select(table.status, func.count())
+            .where(table.workflow_id == workflow_id)
+            .group_by(table.status)
+        )).all()
+        for status, n in rows:
+            by_status[status] = by_status.get(status, 0) + n
+    if not by_status:
+        raise HTTPException(status_code=404, detail="Workflow not found")
+    return {"workflow_id": workflow_id, "jobs": sum(by_status.values()), "by_status": by_status}
+
+JOB_FIELDS = (
+    "id", "type", "queue", "payload", "payload_ref", "payload_size", "idempotency_key", "priority", "status", "workflow_id", "pending_parents", "attempts", "max_attempts",
+    "last_error", "created_at", "updated_at", "started_at", "completed_at",
+    "runtime_ms", "predicted_runtime_ms",
+)
 
-    job.status = "running"
-    job.started_at = datetime.utcnow()
-    job.next_run_at = None
-    job.touch()
-    db.commit()
+def decode_payload(payload_str: Optional[str]):
+    if not payload_str:
+        return None
+    try:
+        return json.loads(payload_str)
+    except Exception:
+        return {"_raw": payload_str}
 
-    return {"id": job.id, "status": job.status}
+def job_to_dict(r, fields=JOB_FIELDS) -> Dict[str, Any]:
+    out = {f: getattr(r, f, None) for f in fields}
+    if "payload" in out:
+        out["payload"] = decode_payload(out["payload"])
+    return out
 
+def encode_cursor(created_at: datetime, job_id: str) -> str:
+    raw = f"{created_at.isoformat()}|{job_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode()
 
-@app.post("/jobs/{job_id}/complete")
-def complete_job(job_id: str, db: Session = Depends(get_db)):
-    job = db.query(JobModel).filter(JobModel.id == job_id).first()
-    if not job:
+def decode_cursor(cursor: str) -> tuple[datetime, str]:
+    try:
+        created_at, job_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|", 1)
+        return datetime.fromisoformat(created_at), job_id
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+@app.get("/jobs")
+async def list_jobs(
+    response: Response,
+    status: Optional[str] = None,
+    type: Optional[str] = None,
+    priority: Optional[int] = None,
+    fields: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(100, ge=1, le=1000),
+    archived: bool = False,
+    db: AsyncSession = Depends(get_async_db),
+):
+    # Newest first, paged on (created_at, id). The cursor for the next page is
+    # returned in the X-Next-Cursor header so the body stays a plain list.
+    # archived=true pages through jobs_archive instead of the live table.
+    table = ArchivedJob if archived else JobModel
+    selected = JOB_FIELDS
+    if fields:
+        selected = tuple(f.strip() for f in fields.split(",") if f.strip())
+        unknown = [f for f in selected if f not in JOB_FIELDS]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+
+    # only load the requested columns, plus the keyset columns
+    load = list(dict.fromkeys(selected + ("created_at", "id")))
+    stmt = select(*[getattr(table, f) for f in load])
+
+    if status is not None:
+        stmt = stmt.where(table.status == status)
+    if type is not None:
+        stmt = stmt.where(table.type == type)
+    if priority is not None:
+        stmt = stmt.where(table.priority == priority)
+    if cursor is not None:
+        stmt = stmt.where(tuple_(table.created_at, table.id) < decode_cursor(cursor))
+
+    stmt = stmt.order_by(table.created_at.desc(), table.id.desc()).limit(limit + 1)
+    if cursor is None and not archived:
+        # taken before the read, so /jobs/stream?cursor=... replays anything
+        # that changes after this snapshot
+        response.headers["X-Stream-Cursor"] = await job_updates.latest_id(ardb)
+    rows = (await db.execute(stmt)).all()
+
+    if len(rows) > limit:
+        rows = rows[:limit]
+        response.headers["X-Next-Cursor"] = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+    return [job_to_dict(r, selected) for r in rows]
+
+@app.get("/jobs/stream")
+async def stream_jobs(cursor: Optional[str] = None, last_event_id: Optional[str] = Header(None)):
+    # Server-sent job deltas ({"id", "status", ...changed fields}). Load the
+    # list once with GET /jobs, then stream from its X-Stream-Cursor header.
+    # EventSource sends Last-Event-ID when it reconnects, which wins over the
+    # cursor in the URL.
+    cursor = last_event_id or cursor
+    if cursor is not None and cursor != "$":
+        try:
+            job_updates.id_key(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+    return StreamingResponse(
+        UPDATES.stream(ardb, cursor),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+class ClaimJobRequest(BaseModel):
+    worker_id: str = Field(..., min_length=1)
+    lease_seconds: int = Field(30, ge=5, le=300)
+    job_id: Optional[str] = None  # claim a specific job popped from Redis
+    queues: Optional[List[str]] = Field(None, min_length=1)   # without job_id: only from these queues
+
+@app.post("/jobs/claim")
+async def claim_job(req: ClaimJobRequest, db: AsyncSession = Depends(get_async_db)):
+    # Pick the next ready job, lease it and mark it running in one transaction.
+    # SKIP LOCKED lets concurrent claimers walk past rows another claimer holds;
+    # the guarded UPDATE below keeps this correct on backends without row locks.
+    # Types at their concurrency or rate limit are skipped, not waited on:
+    # each one found is left out of the next pick, until no candidate is left.
+    throttled = set()
+    while True:
+        now = datetime.utcnow()
+        stmt = select(JobModel)
+        if req.job_id is not None:
+            stmt = stmt.where(JobModel.id == req.job_id)
+        elif req.queues:
+            stmt = stmt.where(JobModel.queue.in_(req.queues))
+        if throttled:
+            stmt = stmt.where(JobModel.type.notin_(throttled))
+        stmt = (
+            stmt
+            .where(JobModel.status == "queued")
+            .where((JobModel.next_run_at == None) | (JobModel.next_run_at <= now))
+            .where((JobModel.lock_expires_at == None) | (JobModel.lock_expires_at <= now))
+            .order_by(*CURRENT_POLICY.order_by(JobModel))
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job = (await db.execute(stmt)).scalars().first()
+        if job is None:
+            await db.rollback()
+            if req.job_id is not None:
+                raise lease_conflict("claim", "Job not claimable")
+            return Response(status_code=204)
+
+        lock_expires_at = now + timedelta(seconds=req.lease_seconds)
+        result = await db.execute(
+            update(JobModel)
+            .where(JobModel.id == job.id)
+            .where(JobModel.status == "queued")
+            .values(
+                status="running",
+                locked_by=req.worker_id,
+                lock_expires_at=lock_expires_at,
+                started_at=now,
+                next_run_at=None,
+                updated_at=now,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            # lost the race to another claimer; no slot was taken for it
+            await db.rollback()
+            if req.job_id is not None:
+                raise lease_conflict("claim", "Job not claimable")
+            continue
+
+        # The slot is only taken once the UPDATE holds the row, so a claimer
+        # that loses the race never holds one; a throttled claim rolls back.
+        job_id, job_type, queue = job.id, job.type, job.queue     # a rollback expires `job`
+        wait = await type_limits.acquire_async(ardb, job_type, job_id, req.lease_seconds)
+        if wait is not None:
+            await db.rollback()
+            THROTTLED_CLAIMS.labels(job_type).inc()
+            if req.job_id is not None:
+                # popped from the ready set: put it back for when the type has room
+                await defer_throttled(db, job_id, queue, now + timedelta(seconds=wait))
+                raise HTTPException(status_code=409, detail=f"Job type {job_type} is at its limit or paused")
+            throttled.add(job_type)
+            continue
+        try:
+            await db.commit()
+        except Exception:
+            await type_limits.release_async(ardb, job_type, job_id)
+            raise
+        EVENTS.record(job.id, "claim", status="running", worker_id=req.worker_id, attempt=job.attempts + 1, ts=now)
+        await redis_queue.discard_async(ardb, job.id, job.queue)
+        await job_updates.publish_async(ardb, job.id, "running", attempts=job.attempts)
+        await db.refresh(job)
+        return job_to_dict(job)
+
+async def defer_throttled(db: AsyncSession, job_id: str, queue: str, run_at: datetime):
+    # The scheduler re-enqueues it once due, like a retry. The attempt is not counted.
+    await db.execute(
+        update(JobModel)
+        .where(JobModel.id == job_id)
+        .where(JobModel.status == "queued")
+        .values(next_run_at=run_at)
+        .execution_options(synchronize_session=False)
+    )
+    await db.commit()
+    await redis_queue.discard_async(ardb, job_id, queue)
+
+def lease_conflict(op: str, detail: str) -> HTTPException:
+    LEASE_CONFLICTS.labels(op).inc()
+    return HTTPException(status_code=409, detail=detail)
+
+async def job_state(db: AsyncSession, job_id: str):
+    # Only read when a guarded UPDATE matched nothing, to pick the right error.
+    row = (await db.execute(
+        select(JobModel.status, JobModel.next_run_at, JobModel.locked_by, JobModel.lock_expires_at)
+        .where(JobModel.id == job_id)
+    )).first()
+    if row is None:
         raise HTTPException(status_code=404, detail="Job not found")
+    return row
 
-    if job.status != "running":
-        raise HTTPException(status_code=400, detail=f"Job is not running (status={job.status})")
+def held_by(worker_id: Optional[str]):
+    # Workers that pass their id may only move jobs they hold the lease on.
+    if worker_id is None:
+        return []
+    return [JobModel.locked_by == worker_id]
 
-    job.status = "completed"
-    job.completed_at = datetime.utcnow()
-    job.locked_by = None
-    job.lock_expires_at = None
-    job.touch()
-    db.commit()
+class StartJobRequest(BaseModel):
+    worker_id: Optional[str] = None
 
-    return {"id": job.id, "status": job.status}
+@app.post("/jobs/{job_id}/start")
+async def start_job(job_id: str, req: Optional[StartJobRequest] = None, db: AsyncSession = Depends(get_async_db)):
+    req = req or StartJobRequest()
+    now = datetime.utcnow()
+    row = (await db.execute(
+        update(JobModel)
+        .where(JobModel.id == job_id)
+        .where(JobModel.status == "queued")
+        .where((JobModel.next_run_at == None) | (JobModel.next_run_at <= now))
+        .where(JobModel.locked_by != None)
+        .where(JobModel.lock_expires_at > now)
+        .where(*held_by(req.worker_id))
+        .values(status="running", started_at=now, next_run_at=None, updated_at=now)
+        .returning(JobModel.id, JobModel.status, JobModel.locked_by, JobModel.attempts)
+    )).first()
+    await db.commit()
+    if row is not None:
+        EVENTS.record(row.id, "start", status=row.status, worker_id=row.locked_by, attempt=row.attempts + 1, ts=now)
+        await job_updates.publish_async(ardb, row.id, row.status, attempts=row.attempts)
+        return {"id": row.id, "status": row.status}
+
+    job = await job_state(db, job_id)
+    if job.status != "queued":
+        raise HTTPException(status_code=400, detail=f"Job is not queued (status={job.status})")
+    if job.next_run_at is not None and job.next_run_at > now:
+        raise lease_conflict("start", "Job not ready to run yet")
+    if req.worker_id is not None and job.locked_by != req.worker_id:
+        raise lease_conflict("start", f"Lease not held by {req.worker_id}")
+    raise lease_conflict("start", "Job has no valid lease")
+
+class CompleteJobRequest(BaseModel):
+    worker_id: Optional[str] = None
+    runtime_ms: Optional[int] = Field(None, ge=0)  # telemetry folded into the same call
+
+@app.post("/jobs/{job_id}/complete")
+async def complete_job(job_id: str, req: Optional[CompleteJobRequest] = None, db: AsyncSession = Depends(get_async_db)):
+    req = req or CompleteJobRequest()
+    now = datetime.utcnow()
+    values = dict(status="completed", completed_at=now, locked_by=None, lock_expires_at=None, updated_at=now)
+    if req.runtime_ms is not None:
+        values["runtime_ms"] = req.runtime_ms
+    row = (await db.execute(
+        update(JobModel)
+        .where(JobModel.id == job_id)
+        .where(JobModel.status == "running")
+        .where(*held_by(req.worker_id))
+        .values(**values)
+        .returning(JobModel.id, JobModel.status, JobModel.type, JobModel.attempts,
+                   JobModel.runtime_ms, JobModel.predicted_runtime_ms, JobModel.has_dependents)
+    )).first()
+    if row is None:
+        await db.rollback()
+        job = await job_state(db, job_id)
+        if job.status != "running":
+            raise HTTPException(status_code=400, detail=f"Job is not running (status={job.status})")
+        raise lease_conflict("complete", f"Lease not held by {req.worker_id}")
+
+    if row.runtime_ms is not None:
+        await runtime_stats.record_completion_async(db, row.type, row.runtime_ms, row.predicted_runtime_ms, now)
+    # children whose last pending parent this was become ready, in the same transaction
+    released = await workflows.release_children_async(db, row.id, now) if row.has_dependents else []
+    await db.commit()
+    await type_limits.release_async(ardb, row.type, row.id)
+    await breaker.record_async(ardb, row.type, ok=True)
+    EVENTS.record(row.id, "complete", status=row.status, worker_id=req.worker_id,
+                  attempt=row.attempts + 1, runtime_ms=req.runtime_ms, ts=now)
+
+    ready = [c for c in released if c.status == "queued"]
+    await redis_queue.enqueue_many_async(ardb, (
+        redis_queue.ready_job(c.id, c.type, c.priority, now, c.predicted_runtime_ms, c.queue) for c in ready
+    ))
+    await job_updates.publish_many_async(ardb, [
+        job_updates.delta(row.id, row.status, attempts=row.attempts, runtime_ms=row.runtime_ms),
+        *(job_updates.delta(c.id, c.status, pending_parents=0) for c in ready),
+    ])
+
+    return {"id": row.id, "status": row.status}
 
 class FailJobRequest(BaseModel):
     error: str = Field(..., min_length=1)
+    worker_id: Optional[str] = None
+    runtime_ms: Optional[int] = Field(None, ge=0)
 
 @app.post("/jobs/{job_id}/fail")
-def fail_job(job_id: str, req: FailJobRequest, db: Session = Depends(get_db)):
-    job = db.query(JobModel).filter(JobModel.id == job_id).first()
-    if not job:
-        raise HTTPException(status_code=404, detail="Job not found")
+async def fail_job(job_id: str, req: FailJobRequest, db: AsyncSession = Depends(get_async_db)):
+    now = datetime.utcnow()
+    values = dict(
+        attempts=JobModel.attempts + 1,
+        last_error=req.error,
+        status=case((JobModel.attempts + 1 >= JobModel.max_attempts, "dead"), else_="queued"),
+        next_run_at=None,
+        locked_by=None,
+        lock_expires_at=None,
+        updated_at=now,
+    )
+    if req.runtime_ms is not None:
+        values["runtime_ms"] = req.runtime_ms
 
     # only running jobs should fail
-    if job.status != "running":
-        raise HTTPException(status_code=400, detail=f"Job is not running (status={job.status})")
-
-    job.attempts += 1
-    job.last_error = req.error
-
-    if job.attempts >= job.max_attempts:
-        job.status = "dead"
-        job.touch()
-        db.commit()
-        return {"id": job.id, "status": job.status, "attempts": job.attempts, "next_run_at": job.next_run_at}
-
-    delay = backoff_seconds(job.attempts)
-    job.status = "queued"
-    job.next_run_at = datetime.utcnow() + timedelta(seconds=delay)
-    job.locked_by = None
-    job.lock_expires_at = None
-    job.touch()
-    db.commit()
-
-    return {"id": job.id, "status": job.status, "attempts": job.attempts, "next_run_at": job.next_run_at}
+    row = (await db.execute(
+        update(JobModel)
+        .where(JobModel.id == job_id)
+        .where(JobModel.status == "running")
+        .where(*held_by(req.worker_id))
+        .values(**values)
+        .returning(JobModel.id, JobModel.status, JobModel.type, JobModel.attempts, JobModel.retry_policy,
+                   JobModel.runtime_ms, JobModel.has_dependents)
+    )).first()
+    next_run_at = None
+    if row is not None and row.status == "queued":
+        # The delay depends on the new attempt count and the job's (or its
+        # type's) policy. The row is this transaction's until the commit, so
+        # nobody sees it queued without its retry time.
+        by_type = {} if row.retry_policy else await retry.cached_type_policies_async(ardb)
+        next_run_at = now + timedelta(seconds=retry.policy_for(row.type, row.retry_policy, by_type).delay(row.attempts))
+        await db.execute(update(JobModel).where(JobModel.id == row.id).values(next_run_at=next_run_at))
+    cancelled = []
+    if row is not None and row.status == "dead" and row.has_dependents:
+        # nothing downstream of a dead job can run
+        cancelled = await workflows.cancel_descendants_async(db, row.id, now)
+    await db.commit()
+    if row is None:
+        job = await job_state(db, job_id)
+        if job.status != "running":
+            raise HTTPException(status_code=400, detail=f"Job is not running (status={job.status})")
+        raise lease_conflict("fail", f"Lease not held by {req.worker_id}")
+
+    await type_limits.release_async(ardb, row.type, row.id)
+    if await breaker.record_async(ardb, row.type, ok=False):
+        BREAKER_OPENS.labels(row.type).inc()
+    EVENTS.record(row.id, "fail", status=row.status, worker_id=req.worker_id, attempt=row.attempts,
+                  runtime_ms=req.runtime_ms, error=req.error, ts=now)
+    await job_updates.publish_many_async(ardb, [
+        job_updates.delta(row.id, row.status, attempts=row.attempts, runtime_ms=row.runtime_ms),
+        *(job_updates.delta(c, "dead") for c in cancelled),
+    ])
+    return {"id": row.id, "status": row.status, "attempts": row.attempts, "next_run_at": next_run_at}
 
 @app.post("/jobs/requeue-ready")
 def requeue_ready_jobs(limit: int = 50, db: Session = Depends(get_db)):
-    now = datetime.utcnow()
-    rows = (
-        db.query(JobModel)
-        .filter(JobModel.status == "queued")
-        .filter((JobModel.next_run_at == None) | (JobModel.next_run_at <= now))
-        .order_by(JobModel.priority.desc(), JobModel.created_at.asc())
-        .limit(limit)
-        .all()
-    )
-
-    pushed = 0
-    for job in rows:
-        # Push to Redis. (Duplicate pushes are possible; we’ll guard in /start)
-        rdb.rpush(QUEUE_KEY, job.id)
-        pushed += 1
-
+    pushed = enqueue_ready(db, rdb, datetime.utcnow(), limit)
     return {"requeued": pushed}
 
 class LeaseJobRequest(BaseModel):
@@ -264,87 +784,90 @@ class LeaseJobRequest(BaseModel):
     lease_seconds: int = Field(30, ge=5, le=300)  # lease between 5s and 5min
 
 @app.post("/jobs/{job_id}/lease")
-def lease_job(job_id: str, req: LeaseJobRequest, db: Session = Depends(get_db)):
-    job = db.query(JobModel).filter(JobModel.id == job_id).first()
-    if not job:
-        raise HTTPException(status_code=404, detail="Job not found")
-
-    # Only allow leasing queued jobs that are ready
+async def lease_job(job_id: str, req: LeaseJobRequest, db: AsyncSession = Depends(get_async_db)):
+    # Only queued jobs that are ready and not leased by someone else
     now = datetime.utcnow()
+    row = (await db.execute(
+        update(JobModel)
+        .where(JobModel.id == job_id)
+        .where(JobModel.status == "queued")
+        .where((JobModel.next_run_at == None) | (JobModel.next_run_at <= now))
+        .where((JobModel.locked_by == None) | (JobModel.lock_expires_at == None) | (JobModel.lock_expires_at <= now))
+        .values(locked_by=req.worker_id, lock_expires_at=now + timedelta(seconds=req.lease_seconds), updated_at=now)
+        .returning(JobModel.id, JobModel.type, JobModel.queue, JobModel.locked_by, JobModel.lock_expires_at,
+                   JobModel.attempts)
+    )).first()
+    if row is not None:
+        wait = await type_limits.acquire_async(ardb, row.type, row.id, req.lease_seconds)
+        if wait is not None:
+            # a manual lease leaves the job's schedule and ready set entry alone
+            await db.rollback()
+            THROTTLED_CLAIMS.labels(row.type).inc()
+            raise HTTPException(status_code=409, detail=f"Job type {row.type} is at its limit or paused")
+    await db.commit()
+    if row is not None:
+        EVENTS.record(row.id, "lease", status="queued", worker_id=row.locked_by, attempt=row.attempts + 1, ts=now)
+        return {"id": row.id, "locked_by": row.locked_by, "lock_expires_at": row.lock_expires_at}
+
+    job = await job_state(db, job_id)
     if job.status != "queued":
-        raise HTTPException(status_code=409, detail=f"Job not leaseable (status={job.status})")
-
+        raise lease_conflict("lease", f"Job not leaseable (status={job.status})")
     if job.next_run_at is not None and job.next_run_at > now:
-        raise HTTPException(status_code=409, detail="Job not ready yet")
+        raise lease_conflict("lease", "Job not ready yet")
+    raise lease_conflict("lease", f"Job already leased by {job.locked_by}")
 
-    # If locked and not expired, deny
-    if job.lock_expires_at is not None and job.lock_expires_at > now and job.locked_by:
-        raise HTTPException(status_code=409, detail=f"Job already leased by {job.locked_by}")
+class HeartbeatRequest(BaseModel):
+    worker_id: str = Field(..., min_length=1)
+    lease_seconds: int = Field(30, ge=5, le=300)
 
-    # Grant lease
-    job.locked_by = req.worker_id
-    job.lock_expires_at = now + timedelta(seconds=req.lease_seconds)
-    job.touch()
-    db.commit()
+class BatchHeartbeatRequest(HeartbeatRequest):
+    job_ids: List[str] = Field(..., min_length=1, max_length=1000)
 
-    return {
-        "id": job.id,
-        "locked_by": job.locked_by,
-        "lock_expires_at": job.lock_expires_at
-    }
+async def extend_leases(db: AsyncSession, job_ids: List[str], worker_id: str, lease_seconds: int) -> List[str]:
+    # Only the current holder can extend; reconcile clears locked_by when it
+    # takes a job back, so a late heartbeat from a presumed-dead worker is a no-op.
+    now = datetime.utcnow()
+    extended = (await db.execute(
+        update(JobModel)
+        .where(JobModel.id.in_(job_ids))
+        .where(JobModel.locked_by == worker_id)
+        .values(lock_expires_at=now + timedelta(seconds=lease_seconds), updated_at=now)
+        .returning(JobModel.id, JobModel.type)
+    )).all()
+    await db.commit()
+    await type_limits.extend_async(ardb, ((r.type, r.id) for r in extended), lease_seconds)
+    return [r.id for r in extended]
+
+@app.post("/jobs/heartbeat")
+async def heartbeat_jobs(req: BatchHeartbeatRequest, db: AsyncSession = Depends(get_async_db)):
+    extended = await extend_leases(db, req.job_ids, req.worker_id, req.lease_seconds)
+    kept = set(extended)
+    lost = [j for j in req.job_ids if j not in kept]
+    if lost:
+        LEASE_CONFLICTS.labels("heartbeat").inc(len(lost))
+    return {"extended": extended, "lost": lost}
+
+@app.post("/jobs/{job_id}/heartbeat")
+async def heartbeat_job(job_id: str, req: HeartbeatRequest, db: AsyncSession = Depends(get_async_db)):
+    if await extend_leases(db, [job_id], req.worker_id, req.lease_seconds):
+        return {"id": job_id, "locked_by": req.worker_id}
+
+    job = (await db.execute(select(JobModel.locked_by).where(JobModel.id == job_id))).first()
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    raise lease_conflict("heartbeat", f"Lease not held by {req.worker_id}")
 
 @app.post("/system/reconcile")
 def reconcile(limit: int = 50, db: Session = Depends(get_db)):
+    # Manual / ops trigger. In normal operation the scheduler daemon
+    # (python -m app.scheduler) does this exactly when deadlines come due.
     now = datetime.utcnow()
-    recovered = 0
-    requeued = 0
-    deaded = 0
 
     # 1) Recover jobs that are "running" but lease expired (worker died)
-    stuck = (
-        db.query(JobModel)
-        .filter(JobModel.status == "running")
-        .filter(JobModel.lock_expires_at != None)
-        .filter(JobModel.lock_expires_at <= now)
-        .limit(limit)
-        .all()
-    )
-
-    for job in stuck:
-        # count this as a failure attempt because worker died mid-run
-        job.attempts += 1
-        job.last_error = "Worker lease expired (worker likely crashed)"
-
-        # clear lock
-        job.locked_by = None
-        job.lock_expires_at = None
-
-        if job.attempts >= job.max_attempts:
-            job.status = "dead"
-            deaded += 1
-        else:
-            delay = backoff_seconds(job.attempts)
-            job.status = "queued"
-            job.next_run_at = now + timedelta(seconds=delay)
-            recovered += 1
-
-        job.touch()
-
-    db.commit()
+    recovered, deaded = recover_expired_leases(db, now, limit, rdb)
 
     # 2) Requeue ready queued jobs into Redis
-    ready = (
-        db.query(JobModel)
-        .filter(JobModel.status == "queued")
-        .filter((JobModel.next_run_at == None) | (JobModel.next_run_at <= now))
-        .order_by(JobModel.priority.desc(), JobModel.created_at.asc())
-        .limit(limit)
-        .all()
-    )
-
-    for job in ready:
-        rdb.rpush(QUEUE_KEY, job.id)
-        requeued += 1
+    requeued = enqueue_ready(db, rdb, now, limit)
 
     return {
         "recovered_running": recovered,
@@ -352,6 +875,65 @@ def reconcile(limit: int = 50, db: Session = Depends(get_db)):
         "requeued": requeued
     }
 
+@app.post("/system/archive")
+def archive_jobs(days: Optional[float] = Query(None, gt=0), db: Session = Depends(get_db)):
+    # Manual trigger; the scheduler daemon archives a few batches every resync pass.
+    kwargs = {} if days is None else {"retention_days": days}
+    return {"archived": archive_terminal_jobs(db, datetime.utcnow(), **kwargs)}
+
+class TypeLimitRequest(BaseModel):
+    concurrency: Optional[int] = Field(None, ge=1)    # jobs of this type running at once
+    rate: Optional[float] = Field(None, gt=0)         # claims per second, on average
+    burst: Optional[int] = Field(None, ge=1)          # claims allowed back to back (default: rate)
+
+@app.get("/limits")
+def list_type_limits():
+    return type_limits.get_limits(rdb)
+
+@app.put("/limits/{job_type}")
+def set_type_limit(job_type: str, req: TypeLimitRequest):
+    type_limits.set_limit(rdb, job_type, req.concurrency, req.rate, req.burst)
+    return {"type": job_type, **req.model_dump()}
+
+@app.delete("/limits/{job_type}", status_code=204)
+def clear_type_limit(job_type: str):
+    type_limits.set_limit(rdb, job_type)
+    return Response(status_code=204)
+
+@app.get("/queues")
+def list_queues():
+    # every queue that has had ready jobs, with where its ready set lives
+    return {q: {"ready": n, "shard": shards.shard_url(q)} for q, n in sorted(redis_queue.depths(rdb).items())}
+
+@app.get("/retry-policies")
+def list_retry_policies():
+    return {"default": retry.DEFAULT_POLICY._asdict(),
+            "types": {t: p._asdict() for t, p in sorted(retry.type_policies(rdb).items())}}
+
+@app.put("/retry-policies/{job_type}")
+def set_retry_policy(job_type: str, req: RetryPolicyRequest):
+    try:
+        policy = req.policy()
+    except ValueError as exc:
+        raise HTTPException(status_code=400, detail=str(exc))
+    retry.set_type_policy(rdb, job_type, policy)
+    return {"type": job_type, **policy._asdict()}
+
+@app.delete("/retry-policies/{job_type}", status_code=204)
+def clear_retry_policy(job_type: str):
+    retry.set_type_policy(rdb, job_type, None)
+    return Response(status_code=204)
+
+@app.get("/breakers")
+def list_open_breakers():
+    # types whose dispatch is paused, with the seconds until it resumes
+    return breaker.open_breakers(rdb)
+
+@app.delete("/breakers/{job_type}", status_code=204)
+def close_breaker(job_type: str):
+    breaker.close(rdb, job_type)
+    return Response(status_code=204)
+
 @app.post("/jobs/{job_id}/crash")
 def crash_job(job_id: str, db: Session = Depends(get_db)):
     job = db.query(JobModel).filter(JobModel.id == job_id).first()
@@ -363,6 +945,7 @@ def crash_job(job_id: str, db: Session = Depends(get_db)):
     job.started_at = datetime.utcnow()
     job.touch()
     db.commit()
+    job_updates.publish(rdb, job.id, job.status, attempts=job.attempts)
     return {"id": job.id, "status": job.status}
 
 class TelemetryRequest(BaseModel):
@@ -370,45 +953,129 @@ class TelemetryRequest(BaseModel):
     note: Optional[str] = None
 
 @app.post("/jobs/{job_id}/telemetry")
-def job_telemetry(job_id: str, req: TelemetryRequest, db: Session = Depends(get_db)):
-    job = db.query(JobModel).filter(JobModel.id == job_id).first()
-    if not job:
+async def job_telemetry(job_id: str, req: TelemetryRequest, db: AsyncSession = Depends(get_async_db)):
+    # A completed job's runtime is already in the rollups, so it cannot be
+    # overwritten; the guard lets exactly one late report through.
+    now = datetime.utcnow()
+    row = (await db.execute(
+        update(JobModel)
+        .where(JobModel.id == job_id)
+        .where((JobModel.status != "completed") | (JobModel.runtime_ms == None))
+        .values(runtime_ms=req.runtime_ms, updated_at=now)
+        .returning(JobModel.id, JobModel.status, JobModel.type, JobModel.attempts, JobModel.locked_by,
+                   JobModel.predicted_runtime_ms, JobModel.completed_at)
+    )).first()
+    if row is None:
+        await db.rollback()
+        await job_state(db, job_id)
+        raise HTTPException(status_code=409, detail="Runtime already recorded for completed job")
+
+    # telemetry that arrives after completion still has to reach the rollups
+    if row.status == "completed":
+        await runtime_stats.record_completion_async(db, row.type, req.runtime_ms, row.predicted_runtime_ms, row.completed_at)
+    await db.commit()
+    EVENTS.record(row.id, "telemetry", status=row.status, worker_id=row.locked_by,
+                  attempt=run_number(row.status, row.attempts), runtime_ms=req.runtime_ms, ts=now)
+    await job_updates.publish_async(ardb, row.id, row.status, attempts=row.attempts, runtime_ms=req.runtime_ms)
+
+    return {"id": row.id, "runtime_ms": req.runtime_ms}
+
+EVENT_FIELDS = ("ts", "event", "status", "worker_id", "attempt", "runtime_ms", "error")
+
+@app.get("/jobs/{job_id}/events")
+async def job_events(job_id: str, limit: int = Query(200, ge=1, le=1000), db: AsyncSession = Depends(get_async_db)):
+    # Events reach the table in batches, so the newest may lag by a flush interval.
+    rows = (await db.execute(
+        select(*[getattr(JobEvent, f) for f in EVENT_FIELDS])
+        .where(JobEvent.job_id == job_id)
+        .order_by(JobEvent.ts.asc())
+        .limit(limit)
+    )).all()
+    return [dict(zip(EVENT_FIELDS, r)) for r in rows]
+
+@app.get("/jobs/{job_id}/payload")
+async def job_payload(job_id: str, db: AsyncSession = Depends(get_async_db)):
+    """The job's payload as JSON bytes; offloaded payloads are streamed from the blob store."""
+    for table in (JobModel, ArchivedJob):
+        row = (await db.execute(
+            select(table.payload, table.payload_ref, table.payload_encoding).where(table.id == job_id)
+        )).first()
+        if row:
+            break
+    else:
         raise HTTPException(status_code=404, detail="Job not found")
 
-    job.runtime_ms = req.runtime_ms
-    job.touch()
-    db.commit()
-
-    return {"id": job.id, "runtime_ms": job.runtime_ms}
-
-@app.post("/ml/train")
-def train_model():
-    from app.ml.train import train
-    train()
-    global ML_MODEL
-    ML_MODEL = load_model()
-    return {"status": "trained"}
+    if row.payload_ref is None:
+        return Response(row.payload or "null", media_type="application/json")
+    if not BLOBS.exists(row.payload_ref):
+        raise HTTPException(status_code=410, detail="Payload blob is gone")
+    return StreamingResponse(BLOBS.iter_decoded(row.payload_ref, row.payload_encoding or "identity"),
+                             media_type="application/json")
+
+@app.post("/ml/train", status_code=202)
+def train_model(mode: str = Query("full", pattern="^(full|incremental)$")):
+    # Training runs on a background thread; poll /ml/train/status for the result.
+    state = TRAINING.start(mode, on_done=RUNTIME_MODEL.reload)
+    if state is None:
+        raise HTTPException(status_code=409, detail="Training already running")
+    return state
+
+@app.get("/ml/train/status")
+def train_status():
+    return TRAINING.state
+
+@app.get("/ml/models")
+def list_model_versions(limit: int = Query(20, ge=1, le=200), db: Session = Depends(get_db)):
+    rows = db.query(ModelVersion).order_by(ModelVersion.created_at.desc()).limit(limit).all()
+    return [
+        {
+            "id": r.id,
+            "created_at": r.created_at,
+            "mode": r.mode,
+            "rows_trained": r.rows_trained,
+            "holdout_rows": r.holdout_rows,
+            "holdout_mae": r.holdout_mae,
+            "baseline_mae": r.baseline_mae,
+            "watermark": r.watermark,
+            "promoted": r.promoted,
+        }
+        for r in rows
+    ]
+
+def ready_backlog():
+    # queued jobs that are due; served by the ix_jobs_queued_next_run partial index
+    with SessionLocal() as db:
+        now = datetime.utcnow()
+        n = db.execute(
+            select(func.count())
+            .select_from(JobModel)
+            .where(JobModel.status == "queued")
+            .where((JobModel.next_run_at == None) | (JobModel.next_run_at <= now))
+        ).scalar()
+    return {(): n}
+
+def pool_checkouts():
+    pools = {("sync",): engine.pool, ("async",): async_engine.sync_engine.pool}
+    return {k: p.checkedout() for k, p in pools.items() if hasattr(p, "checkedout")}
+
+Gauge("smartflow_ready_queue_length", "Job ids in the Redis ready set, per queue.",
+      lambda: {(q,): n for q, n in redis_queue.depths(rdb).items()}, ["queue"])
+Gauge("smartflow_ready_backlog", "Queued jobs that are due to run, per the database.", ready_backlog)
+Gauge("smartflow_db_pool_checked_out", "Database connections in use, per engine.", pool_checkouts, ["engine"])
+Gauge("smartflow_event_buffer", "Job events waiting to be flushed.", lambda: {(): EVENTS.pending()})
+
+@app.get("/metrics")
+def prometheus_metrics():
+    # Gauges are read here, at scrape time; everything else is kept up to date as it happens.
+    return Response(metrics.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/metrics/runtime")
-def runtime_metrics(db: Session = Depends(get_db)):
-    rows = db.query(JobModel).filter(JobModel.status == "completed").filter(JobModel.runtime_ms != None).all()
-    if not rows:
-        return {"count": 0}
-
-    # Guard against any rows that may still have null runtime_ms
-    runtimes = [r.runtime_ms for r in rows if r.runtime_ms is not None]
-    if not runtimes:
-        return {"count": 0}
-
-    avg = sum(runtimes) / len(runtimes)
-
-    by_type: dict[str, list[int]] = {}
-    for r in rows:
-        if r.runtime_ms is None:
-            continue
-        by_type.setdefault(r.type, []).append(r.runtime_ms)
-
-    by_type_avg = {t: (sum(v) / len(v)) for t, v in by_type.items()} if by_type else {}
-
-    return {"count": len(runtimes), "avg_runtime_ms": avg, "avg_by_type": by_type_avg}
+def runtime_metrics(hours: Optional[int] = Query(None, ge=1), db: Session = Depends(get_db)):
+    # Served from the runtime_rollups histograms, so the cost is O(types x buckets)
+    since = datetime.utcnow() - timedelta(hours=hours) if hours else None
+    return runtime_stats.runtime_summary(db, since)
+
+@app.post("/metrics/runtime/rebuild")
+def rebuild_runtime_metrics(db: Session = Depends(get_db)):
+    return {"rows": runtime_stats.rebuild_rollups(db)}
 
@@ -0,0 +1,69 @@
+import time
+from typing import Dict, Tuple
+
+from app.prometheus import Counter, CounterChild, Histogram, HistogramChild
+from app.prometheus import Gauge, render, serve  # noqa: F401 - used through this module by the API and scheduler
+
+HTTP_DURATION = Histogram("smartflow_http_request_duration_seconds", "API request latency by route.",
+                          ["method", "route"])
+HTTP_REQUESTS = Counter("smartflow_http_requests_total", "API requests by route and status code.",
+                        ["method", "route", "status"])
+PREDICTION_SECONDS = Histogram("smartflow_prediction_seconds", "Runtime model inference latency.", ["call"],
+                               buckets=(.00005, .0001, .00025, .0005, .001, .0025, .005, .01, .025, .05, .1))
+LEASE_CONFLICTS = Counter("smartflow_lease_conflicts_total",
+                          "409s from claiming or holding a job someone else has or that moved on.", ["op"])
+THROTTLED_CLAIMS = Counter("smartflow_throttled_claims_total", "Claims skipped by a type limit or open breaker.",
+                           ["type"])
+BREAKER_OPENS = Counter("smartflow_breaker_opens_total", "Times a type's failure rate paused its dispatch.", ["type"])
+SCHEDULER_TICK_SECONDS = Histogram("smartflow_scheduler_tick_seconds", "Duration of one scheduler pass.")
+RECOVERED_LEASES = Counter("smartflow_reconcile_recovered_total", "Expired leases taken back by reconcile.",
+                           ["outcome"])
+
+
+STREAMING_TYPES = (b"text/event-stream",)
+
+
+class MetricsMiddleware:
+    """
+    Times every request and labels it with the route template (not the raw
+    path, which would put job ids into labels). Plain ASGI, so it adds no
+    task or body copy per request the way BaseHTTPMiddleware does. Streams
+    (SSE) are counted but not timed: they last as long as the client stays.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self.children: Dict[tuple, Tuple[HistogramChild, Dict[int, CounterChild]]] = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        status = 500
+        streaming = False
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            nonlocal status, streaming
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                streaming = any(name == b"content-type" and value.startswith(STREAMING_TYPES)
+                                for name, value in message.get("headers", ()))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            key = (scope["method"], id(route))     # routes are not hashable, and live as long as the app
+            entry = self.children.get(key)
+            if entry is None:
+                path = getattr(route, "path", "unmatched")
+                entry = self.children.setdefault(key, (HTTP_DURATION.labels(scope["method"], path), {}))
+            duration, by_status = entry
+            if not streaming:
+                duration.observe(time.perf_counter() - start)
+            counter = by_status.get(status)
+            if counter is None:
+                path = getattr(route, "path", "unmatched")
+                counter = by_status.setdefault(status, HTTP_REQUESTS.labels(scope["method"], path, str(status)))
+            counter.inc()
@@ -0,0 +1,74 @@
+import numpy as np
+
+
+class CompiledRuntimeModel:
+    """
+    Array-only copy of the fitted Pipeline(ColumnTransformer, GradientBoostingRegressor)
+    built by app.ml.train. All trees are padded into (n_trees, n_nodes) arrays and
+    walked together, so a batch costs a few numpy ops per tree level.
+    """
+
+    def __init__(self, pipe):
+        pre = pipe.named_steps["pre"]
+        gbr = pipe.named_steps["model"]
+
+        encoder = pre.named_transformers_["type"]
+        self.type_index = {t: i for i, t in enumerate(encoder.categories_[0])}
+        self.n_types = len(self.type_index)
+
+        if gbr.init_ == "zero":
+            self.init = 0.0
+        else:
+            self.init = float(np.ravel(gbr.init_.constant_)[0])
+        self.learning_rate = float(gbr.learning_rate)
+
+        trees = [est.tree_ for est in gbr.estimators_[:, 0]]
+        n_nodes = max(t.node_count for t in trees)
+        shape = (len(trees), n_nodes)
+        self.left = np.full(shape, -1, dtype=np.intp)
+        self.right = np.full(shape, -1, dtype=np.intp)
+        self.feature = np.zeros(shape, dtype=np.intp)
+        self.threshold = np.zeros(shape, dtype=np.float64)
+        self.value = np.zeros(shape, dtype=np.float64)
+        for i, t in enumerate(trees):
+            n = t.node_count
+            self.left[i, :n] = t.children_left
+            self.right[i, :n] = t.children_right
+            self.feature[i, :n] = np.maximum(t.feature, 0)
+            self.threshold[i, :n] = t.threshold
+            self.value[i, :n] = t.value[:, 0, 0]
+        self.max_depth = max(t.max_depth for t in trees)
+        self.tree_idx = np.arange(len(trees))
+
+    def encode(self, rows) -> np.ndarray:
+        # rows: sequence of (job_type, priority, attempts, payload_size)
+        X = np.zeros((len(rows), self.n_types + 3), dtype=np.float64)
+        for i, (job_type, priority, attempts, size) in enumerate(rows):
+            j = self.type_index.get(job_type)
+            if j is not None:
+                X[i, j] = 1.0
+            X[i, self.n_types:] = (priority, attempts, size)
+        # sklearn trees compare float32 features against their thresholds
+        return X.astype(np.float32).astype(np.float64)
+
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        rows = np.arange(len(X))[:, None]
+        node = np.zeros((len(X), len(self.tree_idx)), dtype=np.intp)
+        for _ in range(self.max_depth):
+            left = self.left[self.tree_idx, node]
+            leaf = left == -1
+            go_left = X[rows, self.feature[self.tree_idx, node]] <= self.threshold[self.tree_idx, node]
+            step = np.where(go_left, left, self.right[self.tree_idx, node])
+            node = np.where(leaf, node, step)
+        return self.init + self.learning_rate * self.value[self.tree_idx, node].sum(axis=1)
+
+
+def compile_model(pipe):
+    """
+    Returns a CompiledRuntimeModel, or None when the pipeline does not have the
+    shape train() produces (the caller then falls back to pipe.predict).
+    """
+    try:
+        return CompiledRuntimeModel(pipe)
+    except (AttributeError, KeyError, TypeError, IndexError):
+        return None
@@ -1,6 +1,9 @@
 import json
 
-def payload_size(payload_str: str | None) -> int:
+def payload_size(payload_str: str | int | None) -> int:
+    # the serialized payload, or just its size when the payload was offloaded
+    if isinstance(payload_str, int):
+        return payload_str
     if not payload_str:
         return 0
     return len(payload_str)
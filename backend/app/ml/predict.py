@@ -1,21 +1,146 @@
 import os
-import joblib
-import pandas as pd
+import threading
+import time
+from functools import lru_cache
 
-from app.ml.features import make_features
+from app.metrics import PREDICTION_SECONDS
+from app.ml.features import payload_size
+
+# joblib, pandas and numpy are imported on first use: the API only needs them
+# once a model is loaded, and they dominate its import time otherwise.
 
 MODEL_PATH = os.getenv("MODEL_PATH", "app/ml/model.pkl")
+PREDICTION_CACHE_SIZE = int(os.getenv("PREDICTION_CACHE_SIZE", "4096"))
+MODEL_CHECK_SECONDS = float(os.getenv("MODEL_CHECK_SECONDS", "2"))
+
+PREDICT_ONE_SECONDS = PREDICTION_SECONDS.labels("one")
+PREDICT_MANY_SECONDS = PREDICTION_SECONDS.labels("many")
+
+def size_bucket(size: int) -> int:
+    # keep the top 4 significant bits, so buckets are 6.25-12.5% wide at any scale
+    shift = max(0, size.bit_length() - 4)
+    return (size >> shift) << shift
+
+
+class RuntimePredictor:
+    """
+    One loaded model version: the compiled array predictor (or the raw pipeline
+    if it could not be compiled) plus its own bounded LRU of predictions.
+    """
+
+    def __init__(self, model, mtime: float | None = None):
+        from app.ml.compiled import compile_model
+
+        self.model = model
+        self.mtime = mtime
+        self.compiled = compile_model(model)
+        self.cached = lru_cache(maxsize=PREDICTION_CACHE_SIZE)(self._predict_key)
+
+    def _predict_key(self, job_type: str, priority: int, attempts: int, size: int) -> int:
+        return self._predict_rows([(job_type, priority, attempts, size)])[0]
+
+    def _predict_rows(self, rows) -> list[int]:
+        if self.compiled is not None:
+            preds = self.compiled.predict(self.compiled.encode(rows))
+        else:
+            import pandas as pd
+
+            Xdf = pd.DataFrame(
+                [{"type": t, "priority": p, "attempts": a, "payload_size": s} for t, p, a, s in rows]
+            )
+            preds = self.model.predict(Xdf)
+        return [max(0, int(p)) for p in preds]
+
+    def predict_one(self, job_type: str, priority: int, attempts: int, payload_str: str | None) -> int:
+        return self.cached(job_type, priority, attempts, size_bucket(payload_size(payload_str)))
+
+    def predict_many(self, rows) -> list[int]:
+        # rows: iterable of (job_type, priority, attempts, payload_str). Sizes
+        # are only bucketed for the cache; uncached batches use the exact ones.
+        rows = [(t, p, a, payload_size(s)) for t, p, a, s in rows]
+        if len(rows) <= 8:
+            return [self.cached(t, p, a, size_bucket(size)) for t, p, a, size in rows]
+        return self._predict_rows(rows)
+
+
+class ModelService:
+    """
+    Holds the current RuntimePredictor and swaps it when MODEL_PATH changes on
+    disk. Requests read self.current once, so a swap never mixes two models
+    within one call.
+    """
+
+    def __init__(self, path: str = MODEL_PATH, check_seconds: float = MODEL_CHECK_SECONDS):
+        self.path = path
+        self.check_seconds = check_seconds
+        self.current: RuntimePredictor | None = None
+        self._next_check = 0.0
+        self._reload_lock = threading.Lock()
+        self._warming = False
+        self.warmed = threading.Event()     # set once warm_up() has finished, model or not
+
+    def _mtime(self) -> float | None:
+        try:
+            return os.stat(self.path).st_mtime
+        except OSError:
+            return None
+
+    def reload(self) -> bool:
+        import joblib
+
+        with self._reload_lock:
+            mtime = self._mtime()
+            if mtime is None:
+                self.current = None
+                return False
+            self.current = RuntimePredictor(joblib.load(self.path), mtime)
+            return True
+
+    def warm_up(self) -> threading.Thread:
+        """
+        Load the model (and the ML stack with it) in the background. Until it
+        is in, predictor() returns None rather than block a request on it.
+        """
+        def run():
+            try:
+                self.reload()
+            except Exception as exc:
+                print(f"Warning: could not load model {self.path}: {exc}", flush=True)
+            finally:
+                self._warming = False
+                self.warmed.set()
+
+        self._warming = True
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        return thread
+
+    def predictor(self) -> RuntimePredictor | None:
+        now = time.monotonic()
+        if now >= self._next_check:
+            self._next_check = now + self.check_seconds
+            current = self.current
+            mtime = self._mtime()
+            stale = mtime != (current.mtime if current else None)
+            if stale and not self._warming and not self._reload_lock.locked():
+                try:
+                    self.reload()
+                except Exception:
+                    # keep serving the previous model if the new file is half-written
+                    pass
+        return self.current
+
+    def predict_one(self, job_type: str, priority: int, attempts: int, payload_str: str | None) -> int | None:
+        predictor = self.predictor()
+        if predictor is None:
+            return None
+        with PREDICT_ONE_SECONDS.time():
+            return predictor.predict_one(job_type, priority, attempts, payload_str)
 
-def load_model():
-    if not os.path.exists(MODEL_PATH):
-        return None
-    return joblib.load(MODEL_PATH)
-
-def predict_runtime_ms(model, job_type: str, priority: int, attempts: int, payload_str: str | None) -> int | None:
-    if model is None:
-        return None
-    feats = make_features(job_type, priority, attempts, payload_str)
-    Xdf = pd.DataFrame([feats])
-    pred = model.predict(Xdf)[0]
-    # clamp to non-negative int
-    return max(0, int(pred))
\ No newline at end of file
+    def predict_many(self, rows) -> list[int | None]:
+        rows = list(rows)
+        predictor = self.predictor()
+        if predictor is None:
+            return [None] * len(rows)
+        with PREDICT_MANY_SECONDS.time():
+            return predictor.predict_many(rows)
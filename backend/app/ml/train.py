@@ -1,62 +1,252 @@
 import os
-import joblib
-import numpy as np
+import threading
+from datetime import datetime
+from uuid import uuid4
 
-from sklearn.compose import ColumnTransformer
-from sklearn.pipeline import Pipeline
-from sklearn.preprocessing import OneHotEncoder
-from sklearn.ensemble import GradientBoostingRegressor
+from sqlalchemy import func, select
 
 from app.db.database import SessionLocal
-from app.db.models import Job
-from app.ml.features import make_features
+from app.db.models import ModelVersion
+from app.retention import job_tables
 
 MODEL_PATH = os.getenv("MODEL_PATH", "app/ml/model.pkl")
+TRAIN_CHUNK_SIZE = int(os.getenv("TRAIN_CHUNK_SIZE", "5000"))
+HOLDOUT_FRACTION = 0.2
+MIN_TRAINING_ROWS = 10
+# trees added on top of the promoted model by an incremental run
+INCREMENTAL_ESTIMATORS = 20
+# Earlier promoted versions whose files are kept, for rollback, besides the
+# current one; rejected candidates are never written.
+MODEL_KEEP_VERSIONS = int(os.getenv("MODEL_KEEP_VERSIONS", "2"))
+
+FEATURES = ["type", "priority", "attempts", "payload_size"]
+
+def iter_training_rows(db, since: datetime | None = None, chunk_size: int = TRAIN_CHUNK_SIZE):
+    """
+    Yield lists of (type, priority, attempts, payload_size, runtime_ms, completed_at)
+    tuples straight off a server-side cursor, without building ORM objects or
+    pulling payload bodies (payload_size is stored, or computed in SQL for old rows). Archived jobs
+    are read after the live table, so a row archived mid-scan is seen at
+    least once.
+    """
+    for table in job_tables():
+        stmt = (
+            select(
+                table.type,
+                table.priority,
+                table.attempts,
+                func.coalesce(table.payload_size, func.length(table.payload), 0),
+                table.runtime_ms,
+                table.completed_at,
+            )
+            .where(table.status == "completed")
+            .where(table.runtime_ms != None)
+        )
+        if since is not None:
+            stmt = stmt.where(table.completed_at > since)
+
+        result = db.execute(stmt.execution_options(stream_results=True, yield_per=chunk_size))
+        for chunk in result.partitions(chunk_size):
+            yield chunk
+
+def load_training_frame(db, since: datetime | None = None):
+    import pandas as pd
+
+    frames = []
+    watermark = None
+    for chunk in iter_training_rows(db, since):
+        frame = pd.DataFrame(chunk, columns=FEATURES + ["runtime_ms", "completed_at"])
+        frames.append(frame)
+        chunk_max = frame["completed_at"].max()
+        if watermark is None or chunk_max > watermark:
+            watermark = chunk_max
+    if not frames:
+        return pd.DataFrame(columns=FEATURES + ["runtime_ms", "completed_at"]), None
+    return pd.concat(frames, ignore_index=True), watermark
+
+def split_holdout(df, seed: int = 0):
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    mask = rng.random(len(df)) < HOLDOUT_FRACTION
+    if mask.all() or not mask.any():
+        # too few rows for a random split; hold out the last one
+        mask = np.zeros(len(df), dtype=bool)
+        mask[-1] = True
+    return df[~mask], df[mask]
+
+def mae(model, df) -> float | None:
+    if model is None or df.empty:
+        return None
+    import numpy as np
+
+    pred = np.maximum(model.predict(df[FEATURES]), 0)
+    return float(np.mean(np.abs(pred - df["runtime_ms"].to_numpy())))
+
+def fit_full(df):
+    # scikit-learn is only imported by a training run, never by the API at startup
+    from sklearn.compose import ColumnTransformer
+    from sklearn.ensemble import GradientBoostingRegressor
+    from sklearn.pipeline import Pipeline
+    from sklearn.preprocessing import OneHotEncoder
+
+    pre = ColumnTransformer(
+        transformers=[
+            ("type", OneHotEncoder(handle_unknown="ignore"), ["type"]),
+            ("num", "passthrough", ["priority", "attempts", "payload_size"]),
+        ]
+    )
+
+    model = GradientBoostingRegressor()
+    pipe = Pipeline(steps=[("pre", pre), ("model", model)])
+
+    pipe.fit(df[FEATURES], df["runtime_ms"].to_numpy())
+    return pipe
+
+def fit_incremental(base, df):
+    # Keep the fitted encoder (the feature layout must not change) and grow
+    # extra boosting stages on the residuals of the new rows.
+    import joblib
+
+    pipe = joblib.load(base.path)
+    gbr = pipe.named_steps["model"]
+    gbr.set_params(warm_start=True, n_estimators=gbr.n_estimators + INCREMENTAL_ESTIMATORS)
+    gbr.fit(pipe.named_steps["pre"].transform(df[FEATURES]), df["runtime_ms"].to_numpy())
+    return pipe
+
+def current_version(db):
+    return (
+        db.query(ModelVersion)
+        .filter(ModelVersion.promoted == True)
+        .order_by(ModelVersion.created_at.desc())
+        .first()
+    )
+
+def prune_versions(db, keep: int = MODEL_KEEP_VERSIONS) -> int:
+    """
+    Delete the files of all but the current version and the `keep` newest
+    before it. Their rows stay, with an empty path.
+    """
+    old = (
+        db.query(ModelVersion)
+        .filter(ModelVersion.promoted == False)
+        .filter(ModelVersion.path != "")
+        .order_by(ModelVersion.created_at.desc())
+        .offset(keep)
+        .all()
+    )
+    for version in old:
+        try:
+            os.remove(version.path)
+        except OSError:
+            pass
+        version.path = ""
+    db.commit()
+    return len(old)
+
+def train(mode: str = "full") -> dict:
+    import joblib
 
-def train():
     db = SessionLocal()
     try:
-        rows = (
-            db.query(Job)
-            .filter(Job.status == "completed")
-            .filter(Job.runtime_ms != None)
-            .all()
-        )
+        base = current_version(db)
+        if mode == "incremental" and (base is None or not os.path.exists(base.path)):
+            mode = "full"
 
-        if len(rows) < 10:
-            print(f"Not enough training data: {len(rows)} completed jobs with runtime_ms. Need at least 10.")
-            return
-
-        X = []
-        y = []
-        for r in rows:
-            feats = make_features(r.type, r.priority, r.attempts, r.payload)
-            X.append(feats)
-            y.append(r.runtime_ms)
-
-        # Build arrays
-        # We'll use dicts -> convert via simple list of dicts
-        # Pipeline handles encoding for "type"
-        import pandas as pd
-        Xdf = pd.DataFrame(X)
-        yarr = np.array(y)
-
-        pre = ColumnTransformer(
-            transformers=[
-                ("type", OneHotEncoder(handle_unknown="ignore"), ["type"]),
-                ("num", "passthrough", ["priority", "attempts", "payload_size"]),
-            ]
-        )
+        since = base.watermark if mode == "incremental" else None
+        df, watermark = load_training_frame(db, since)
+
+        if len(df) < MIN_TRAINING_ROWS:
+            msg = f"Not enough training data: {len(df)} completed jobs with runtime_ms. Need at least {MIN_TRAINING_ROWS}."
+            print(msg)
+            return {"status": "skipped", "mode": mode, "rows": len(df), "detail": msg}
+
+        train_df, holdout_df = split_holdout(df)
+        current = joblib.load(base.path) if base is not None and os.path.exists(base.path) else None
+
+        pipe = fit_incremental(base, train_df) if mode == "incremental" else fit_full(train_df)
 
-        model = GradientBoostingRegressor()
-        pipe = Pipeline(steps=[("pre", pre), ("model", model)])
+        candidate_mae = mae(pipe, holdout_df)
+        baseline_mae = mae(current, holdout_df)
+        promote = baseline_mae is None or candidate_mae < baseline_mae
 
-        pipe.fit(Xdf, yarr)
+        version_id = str(uuid4())
+        version_path = ""   # no file: rejected, or pruned later
+        if promote:
+            version_path = os.path.join(os.path.dirname(MODEL_PATH) or ".", f"model-{version_id}.pkl")
+            joblib.dump(pipe, version_path)
+            # write then rename, so ModelService never loads a half-written file
+            tmp_path = f"{MODEL_PATH}.tmp"
+            joblib.dump(pipe, tmp_path)
+            os.replace(tmp_path, MODEL_PATH)
+            db.query(ModelVersion).filter(ModelVersion.promoted == True).update({ModelVersion.promoted: False})
 
-        joblib.dump(pipe, MODEL_PATH)
-        print(f"Saved model to {MODEL_PATH}. Trained on {len(rows)} rows.")
+        if mode == "incremental" and base.watermark is not None:
+            watermark = max(watermark, base.watermark) if watermark is not None else base.watermark
+
+        db.add(ModelVersion(
+            id=version_id,
+            mode=mode,
+            path=version_path,
+            rows_trained=len(train_df),
+            holdout_rows=len(holdout_df),
+            holdout_mae=candidate_mae,
+            baseline_mae=baseline_mae,
+            watermark=watermark,
+            promoted=promote,
+        ))
+        db.commit()
+        prune_versions(db)
+
+        print(f"Trained model {version_id} ({mode}) on {len(train_df)} rows; holdout MAE {candidate_mae:.1f} vs {baseline_mae}. Promoted: {promote}")
+        return {
+            "status": "promoted" if promote else "rejected",
+            "version": version_id,
+            "mode": mode,
+            "rows": len(train_df),
+            "holdout_mae": candidate_mae,
+            "baseline_mae": baseline_mae,
+        }
     finally:
         db.close()
 
+
+class TrainingRunner:
+    """
+    Runs train() on a background thread, one run at a time, and keeps the state
+    of the latest run for the status endpoint.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.state: dict = {"status": "idle"}
+
+    def start(self, mode: str = "full", on_done=None) -> dict | None:
+        with self._lock:
+            if self.state.get("status") == "running":
+                return None
+            self.state = {
+                "run_id": str(uuid4()),
+                "status": "running",
+                "mode": mode,
+                "started_at": datetime.utcnow(),
+            }
+            state = dict(self.state)
+        threading.Thread(target=self._run, args=(state["run_id"], mode, on_done), daemon=True).start()
+        return state
+
+    def _run(self, run_id: str, mode: str, on_done):
+        try:
+            result = train(mode)
+            if on_done is not None and result.get("status") == "promoted":
+                on_done()
+            update = {"status": "finished", "result": result}
+        except Exception as exc:
+            update = {"status": "failed", "error": str(exc)}
+        with self._lock:
+            self.state = {**self.state, **update, "finished_at": datetime.utcnow()}
+
+
 if __name__ == "__main__":
-    train()
\ No newline at end of file
+    import sys
+    train(sys.argv[1] if len(sys.argv) > 1 else "full")
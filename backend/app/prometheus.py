@@ -0,0 +1,209 @@
+import threading
+import time
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import get_ident
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+# Prometheus text exposition without a client library. Every metric keeps one
+# cell per thread and a thread only ever writes its own cell, so recording is
+# a dict lookup and a few float adds: no lock, and nothing allocated once a
+# label set and thread have been seen. A scrape sums the cells.
+#
+# Standard library only: the worker (worker/metrics.py) records through this
+# module too. The API's own metrics and middleware are in app.metrics.
+
+LATENCY_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+REGISTRY: List["Metric"] = []
+
+
+def escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def label_str(names: Tuple[str, ...], values: Tuple[str, ...], le: Optional[str] = None) -> str:
+    pairs = [f'{n}="{escape(v)}"' for n, v in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Child:
+    __slots__ = ("size", "cells")
+
+    def __init__(self, size: int):
+        self.size = size
+        self.cells: Dict[int, List[float]] = {}
+
+    def cell(self) -> List[float]:
+        cell = self.cells.get(get_ident())
+        if cell is None:
+            cell = self.cells.setdefault(get_ident(), [0.0] * self.size)
+        return cell
+
+    def totals(self) -> List[float]:
+        out = [0.0] * self.size
+        for cell in list(self.cells.values()):
+            for i, v in enumerate(cell):
+                out[i] += v
+        return out
+
+
+class CounterChild(Child):
+    __slots__ = ()
+
+    def __init__(self):
+        super().__init__(1)
+
+    def inc(self, amount: float = 1):
+        self.cell()[0] += amount
+
+
+class HistogramChild(Child):
+    __slots__ = ("bounds",)
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        # one slot per bucket, then +Inf, then the sum
+        super().__init__(len(bounds) + 2)
+        self.bounds = bounds
+
+    def observe(self, value: float):
+        cell = self.cell()
+        cell[bisect_left(self.bounds, value)] += 1
+        cell[-1] += value
+
+    def time(self) -> "Timer":
+        return Timer(self)
+
+
+class Timer:
+    __slots__ = ("child", "start")
+
+    def __init__(self, child: HistogramChild):
+        self.child = child
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.child.observe(time.perf_counter() - self.start)
+
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.children: Dict[Tuple[str, ...], Child] = {}
+        if not self.labelnames and self.kind != "gauge":
+            self.labels()   # a metric without labels reads 0 before its first event
+        REGISTRY.append(self)
+
+    def new_child(self) -> Child:
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        # callers on hot paths keep the child instead of looking it up each time
+        child = self.children.get(values)
+        if child is None:
+            child = self.children.setdefault(values, self.new_child())
+        return child
+
+    def samples(self) -> Iterable[str]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        lines.extend(self.samples())
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def new_child(self) -> CounterChild:
+        return CounterChild()
+
+    def inc(self, amount: float = 1):
+        self.labels().inc(amount)
+
+    def samples(self):
+        for values, child in list(self.children.items()):
+            yield f"{self.name}{label_str(self.labelnames, values)} {child.totals()[0]}"
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.bounds = tuple(sorted(buckets))
+        super().__init__(name, help, labelnames)
+
+    def new_child(self) -> HistogramChild:
+        return HistogramChild(self.bounds)
+
+    def observe(self, value: float):
+        self.labels().observe(value)
+
+    def time(self) -> Timer:
+        return self.labels().time()
+
+    def samples(self):
+        for values, child in list(self.children.items()):
+            totals = child.totals()
+            running = 0.0
+            for bound, n in zip(self.bounds + (float("inf"),), totals):
+                running += n
+                le = "+Inf" if bound == float("inf") else repr(float(bound))
+                yield f"{self.name}_bucket{label_str(self.labelnames, values, le)} {running}"
+            yield f"{self.name}_count{label_str(self.labelnames, values)} {running}"
+            yield f"{self.name}_sum{label_str(self.labelnames, values)} {totals[-1]}"
+
+
+class Gauge(Metric):
+    """A value read at scrape time from `fn`, which returns {label values: value}."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, fn: Callable[[], Dict[Tuple[str, ...], Optional[float]]],
+                 labelnames: Iterable[str] = ()):
+        super().__init__(name, help, labelnames)
+        self.fn = fn
+
+    def samples(self):
+        try:
+            values = self.fn()
+        except Exception:
+            return
+        for key, value in values.items():
+            if value is not None:
+                yield f"{self.name}{label_str(self.labelnames, key)} {float(value)}"
+
+
+def render(registry: Iterable[Metric] = REGISTRY) -> str:
+    return "\n".join(m.render() for m in registry) + "\n"
+
+
+class ScrapeHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def serve(port: int, host: str = "0.0.0.0") -> ThreadingHTTPServer:
+    """Serve the registry from a daemon thread, for processes without the API (scheduler, worker)."""
+    server = ThreadingHTTPServer((host, port), ScrapeHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
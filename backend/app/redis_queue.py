@@ -0,0 +1,99 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from app import shards
+from app.scheduler.policies import CURRENT_POLICY, ReadyJob
+
+READY_KEY = "smartflow:ready"
+QUEUES_KEY = "smartflow:queues"     # set: queues that have had a ready set on this Redis
+DEFAULT_QUEUE = "default"
+
+
+def ready_key(queue: str) -> str:
+    # the default queue keeps the original key, so existing sets and workers carry on
+    return READY_KEY if queue == DEFAULT_QUEUE else f"{READY_KEY}:{queue}"
+
+
+def ready_job(job_id: str, job_type: str, priority: int, ready_at: Optional[datetime] = None,
+              predicted_runtime_ms: Optional[int] = None, queue: str = DEFAULT_QUEUE) -> ReadyJob:
+    ts = (ready_at or datetime.utcnow()).timestamp()
+    return ReadyJob(job_id, job_type, priority, ts, predicted_runtime_ms, queue)
+
+
+def by_queue(jobs: Iterable[ReadyJob]) -> Dict[str, List[ReadyJob]]:
+    out: Dict[str, List[ReadyJob]] = {}
+    for j in jobs:
+        out.setdefault(j.queue, []).append(j)
+    return out
+
+
+def enqueue(rdb, job: ReadyJob, policy=None):
+    enqueue_many(rdb, [job], policy)
+
+
+def enqueue_many(rdb, jobs: Iterable[ReadyJob], policy=None) -> int:
+    # the dispatch policy decides each job's score; members are deduplicated.
+    # One pipeline per shard, whatever the number of queues.
+    groups = by_queue(jobs)
+    pipes = {}
+    for queue, batch in groups.items():
+        client = shards.client(rdb, queue)
+        pipe = pipes.get(id(client))
+        if pipe is None:
+            pipe = pipes[id(client)] = client.pipeline(transaction=False)
+        (policy or CURRENT_POLICY).enqueue_many(pipe, ready_key(queue), batch)
+        pipe.sadd(QUEUES_KEY, queue)
+    for pipe in pipes.values():
+        pipe.execute()
+    return sum(len(batch) for batch in groups.values())
+
+
+async def enqueue_many_async(ardb, jobs: Iterable[ReadyJob], policy=None) -> int:
+    # policies issue their commands on the pipeline; one round-trip per shard runs them
+    groups = by_queue(jobs)
+    pipes = {}
+    for queue, batch in groups.items():
+        client = shards.async_client(ardb, queue)
+        pipe = pipes.get(id(client))
+        if pipe is None:
+            pipe = pipes[id(client)] = client.pipeline(transaction=False)
+        (policy or CURRENT_POLICY).enqueue_many(pipe, ready_key(queue), batch)
+        pipe.sadd(QUEUES_KEY, queue)
+    for pipe in pipes.values():
+        await pipe.execute()
+    return sum(len(batch) for batch in groups.values())
+
+
+def discard(rdb, job_id: str, queue: str = DEFAULT_QUEUE):
+    shards.client(rdb, queue).zrem(ready_key(queue), job_id)
+
+
+async def discard_async(ardb, job_id: str, queue: str = DEFAULT_QUEUE):
+    await shards.async_client(ardb, queue).zrem(ready_key(queue), job_id)
+
+
+def pop_ready(rdb, timeout: float = 5, queue: str = DEFAULT_QUEUE) -> Optional[str]:
+    # BZPOPMIN parks the connection server-side, so idle workers send nothing
+    item = shards.client(rdb, queue).bzpopmin(ready_key(queue), timeout=timeout)
+    if not item:
+        return None
+    _key, job_id, _score = item
+    return job_id
+
+
+def depth(rdb, queue: str = DEFAULT_QUEUE) -> int:
+    return shards.client(rdb, queue).zcard(ready_key(queue))
+
+
+def depths(rdb) -> Dict[str, int]:
+    """Ready set length of every known queue, over all shards."""
+    out = {}
+    for client in shards.clients(rdb):
+        queues = sorted(client.smembers(QUEUES_KEY))
+        pipe = client.pipeline(transaction=False)
+        for queue in queues:
+            pipe.zcard(ready_key(queue))
+        out.update(zip(queues, pipe.execute()))
+    if DEFAULT_QUEUE not in out:
+        out[DEFAULT_QUEUE] = depth(rdb)
+    return out
@@ -0,0 +1,124 @@
+import os
+import time
+from datetime import datetime, timedelta
+from itertools import islice
+from typing import Callable, Optional
+
+from sqlalchemy import delete, insert, literal, select
+from sqlalchemy.orm import Session
+
+from app.blobs import BLOBS, BlobStore
+from app.db.models import ArchivedJob, Job, JobColumns, JobDependency
+
+# Terminal jobs older than this leave the hot table (0 disables archival).
+JOB_RETENTION_DAYS = float(os.getenv("JOB_RETENTION_DAYS", "7"))
+# Rows moved per transaction; each batch holds its row locks only this long.
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", "1000"))
+# Blobs no job row references are removed once unused this long, which is
+# also how long a PUT /blobs upload has to be used by a job (0 disables).
+BLOB_GC_GRACE_HOURS = float(os.getenv("BLOB_GC_GRACE_HOURS", "24"))
+# Blobs checked against the job tables per query.
+BLOB_GC_BATCH_SIZE = int(os.getenv("BLOB_GC_BATCH_SIZE", "500"))
+
+TERMINAL_STATUSES = ("completed", "dead")
+
+JOB_COLUMNS = [c.name for c in Job.__table__.columns]
+
+
+def archive_batch(db: Session, before: datetime, limit: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+    Move up to `limit` completed/dead jobs last updated before `before` into
+    jobs_archive: INSERT ... SELECT then DELETE, in one short transaction.
+    Returns the number of rows moved.
+    """
+    ids = db.execute(
+        select(Job.id)
+        .where(Job.status.in_(TERMINAL_STATUSES))
+        .where(Job.updated_at < before)
+        .order_by(Job.updated_at.asc())
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+    ).scalars().all()
+    if not ids:
+        db.rollback()
+        return 0
+
+    now = datetime.utcnow()
+    columns = [getattr(Job, c) for c in JOB_COLUMNS]
+    db.execute(
+        insert(ArchivedJob).from_select(
+            JOB_COLUMNS + ["archived_at"],
+            select(*columns, literal(now)).where(Job.id.in_(ids)),
+        )
+    )
+    db.execute(delete(Job).where(Job.id.in_(ids)))
+    # edges only matter while the child is blocked, which a terminal job never is again
+    db.execute(delete(JobDependency).where(JobDependency.child_id.in_(ids) | JobDependency.parent_id.in_(ids)))
+    db.commit()
+    return len(ids)
+
+
+def archive_terminal_jobs(db: Session, now: datetime, retention_days: float = JOB_RETENTION_DAYS,
+                          batch_size: int = ARCHIVE_BATCH_SIZE, max_batches: int = 100,
+                          between_batches: Optional[Callable[[], None]] = None) -> int:
+    """
+    Archive in batches until nothing is left or `max_batches` ran. Returns
+    rows moved. `between_batches` runs before each batch and may raise to stop.
+    """
+    if retention_days <= 0:
+        return 0
+    before = now - timedelta(days=retention_days)
+    moved = 0
+    for _ in range(max_batches):
+        if between_batches:
+            between_batches()
+        n = archive_batch(db, before, batch_size)
+        moved += n
+        if n < batch_size:
+            break
+    return moved
+
+
+def referenced_blobs(db: Session, refs: list[str]) -> set[str]:
+    """The refs among `refs` that a live or archived job still points at."""
+    found = set()
+    for table in (Job, ArchivedJob):
+        found.update(db.execute(select(table.payload_ref).where(table.payload_ref.in_(refs))).scalars())
+    return found
+
+
+def collect_blobs(db: Session, store: BlobStore = BLOBS, after: str = "",
+                  grace_hours: float = BLOB_GC_GRACE_HOURS, batch_size: int = BLOB_GC_BATCH_SIZE,
+                  max_batches: int = 100, between_batches: Optional[Callable[[], None]] = None) -> tuple[int, str]:
+    """
+    Remove blobs that no job in jobs or jobs_archive references and that
+    nobody wrote or reused within the grace period: payloads of jobs deleted
+    from both tables, and uploads never passed as a payload_ref. Walks the
+    store in digest order from `after`, up to `max_batches` batches, running
+    `between_batches` before each like archive_terminal_jobs. Returns (blobs
+    removed, where to resume; "" once the walk reached the end).
+    """
+    if grace_hours <= 0:
+        return 0, ""
+    cutoff = time.time() - grace_hours * 3600
+    removed = 0 if after else store.remove_stale_tmp(cutoff)
+    refs = store.iter_refs(after)
+    for _ in range(max_batches):
+        if between_batches:
+            between_batches()
+        seen = list(islice(refs, batch_size))
+        if not seen:
+            return removed, ""
+        after = seen[-1][0]
+        old = [ref for ref, mtime in seen if mtime < cutoff]
+        if old:
+            unused = set(old) - referenced_blobs(db, old)
+            db.rollback()
+            # checked again at removal: a request may have reused the blob since
+            removed += sum(store.remove_unused(ref, cutoff) for ref in unused)
+    return removed, after
+
+
+def job_tables(include_archive: bool = True) -> list[type[JobColumns]]:
+    """Tables to read completed-job history from (training, rollup rebuilds)."""
+    return [Job, ArchivedJob] if include_archive else [Job]
@@ -0,0 +1,102 @@
+import json
+import os
+import random
+import time
+from typing import Dict, NamedTuple, Optional, Tuple
+
+# How long a failed job waits before its next attempt. A policy comes from
+# the job (retry_policy column), else its type (set with PUT
+# /retry-policies/{type}), else DEFAULT_POLICY. Every kind is jittered:
+# without it, jobs that failed together during an outage all come back in
+# the same second and hit the recovering dependency at once.
+POLICIES_KEY = "smartflow:retry_policies"      # hash: type -> policy JSON
+
+KINDS = ("exponential", "fixed", "schedule")
+# share of each delay that is randomized; exponential defaults to full jitter
+RETRY_JITTER = float(os.getenv("RETRY_JITTER", "0.2"))
+# how long an API process reuses the per-type policies it read; a PUT on
+# another process takes effect here within this many seconds
+POLICY_CACHE_SECONDS = float(os.getenv("RETRY_POLICY_CACHE_SECONDS", "5"))
+
+
+class RetryPolicy(NamedTuple):
+    kind: str = "schedule"
+    delays: Tuple[float, ...] = (10, 30, 90, 300)  # schedule: per attempt, the last one repeats; fixed: [0]
+    base: float = 10                               # exponential: first delay ...
+    factor: float = 2                              # ... times factor per further attempt ...
+    max_delay: float = 3600                        # ... up to this
+    jitter: float = RETRY_JITTER                   # 0: exact delays; 1: uniform in (0, delay]
+
+    def ceiling(self, attempt: int) -> float:
+        # attempt is 1-based after the failure has been counted
+        if self.kind == "exponential":
+            return min(self.max_delay, self.base * self.factor ** max(0, attempt - 1))
+        if self.kind == "fixed":
+            return self.delays[0]
+        return self.delays[min(max(attempt, 1), len(self.delays)) - 1]
+
+    def delay(self, attempt: int, rng: random.Random = random) -> float:
+        return self.ceiling(attempt) * (1 - self.jitter * rng.random())
+
+    def to_json(self) -> str:
+        return json.dumps(self._asdict())
+
+
+DEFAULT_POLICY = RetryPolicy()
+
+
+def make_policy(kind: str = "schedule", delays=None, base: Optional[float] = None, factor: Optional[float] = None,
+                max_delay: Optional[float] = None, jitter: Optional[float] = None) -> RetryPolicy:
+    if kind not in KINDS:
+        raise ValueError(f"Unknown retry policy {kind!r}, expected one of {', '.join(KINDS)}")
+    if kind in ("fixed", "schedule") and not delays:
+        raise ValueError(f"A {kind} retry policy needs delays")
+    if delays and min(delays) < 0:
+        raise ValueError("Retry delays cannot be negative")
+    fields = dict(kind=kind, delays=tuple(delays) if delays else DEFAULT_POLICY.delays, base=base,
+                  factor=factor, max_delay=max_delay,
+                  jitter=(1.0 if kind == "exponential" else RETRY_JITTER) if jitter is None else jitter)
+    return RetryPolicy(**{k: v for k, v in fields.items() if v is not None})
+
+
+def from_json(value: Optional[str]) -> Optional[RetryPolicy]:
+    if not value:
+        return None
+    fields = json.loads(value)
+    fields["delays"] = tuple(fields["delays"])
+    return RetryPolicy(**fields)
+
+
+def type_policies(rdb) -> Dict[str, RetryPolicy]:
+    return {t: from_json(v) for t, v in rdb.hgetall(POLICIES_KEY).items()}
+
+
+async def type_policies_async(ardb) -> Dict[str, RetryPolicy]:
+    return {t: from_json(v) for t, v in (await ardb.hgetall(POLICIES_KEY)).items()}
+
+
+_cached: Tuple[float, Dict[str, RetryPolicy]] = (0.0, {})
+
+
+async def cached_type_policies_async(ardb) -> Dict[str, RetryPolicy]:
+    """type_policies_async(), read from Redis at most every POLICY_CACHE_SECONDS."""
+    global _cached
+    expires, policies = _cached
+    if time.monotonic() >= expires:
+        policies = await type_policies_async(ardb)
+        _cached = (time.monotonic() + POLICY_CACHE_SECONDS, policies)
+    return policies
+
+
+def set_type_policy(rdb, job_type: str, policy: Optional[RetryPolicy]):
+    """Replace the policy of `job_type`; None reverts it to DEFAULT_POLICY."""
+    global _cached
+    if policy is None:
+        rdb.hdel(POLICIES_KEY, job_type)
+    else:
+        rdb.hset(POLICIES_KEY, job_type, policy.to_json())
+    _cached = (0.0, {})
+
+
+def policy_for(job_type: str, job_policy: Optional[str], by_type: Dict[str, RetryPolicy]) -> RetryPolicy:
+    return from_json(job_policy) or by_type.get(job_type) or DEFAULT_POLICY
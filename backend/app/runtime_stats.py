@@ -0,0 +1,170 @@
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from sqlalchemy import func, insert
+from sqlalchemy.orm import Session
+
+from app.db.models import RuntimeRollup
+from app.retention import job_tables
+
+# HDR-style log-linear buckets: values below 8ms get their own bucket, larger
+# values keep their top 4 significant bits (8 sub-buckets per power of two),
+# so any reported percentile is within 12.5% of the true value.
+SUB_BUCKET_BITS = 3
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+
+def bucket_index(value_ms: int) -> int:
+    if value_ms < SUB_BUCKETS:
+        return max(0, value_ms)
+    shift = value_ms.bit_length() - (SUB_BUCKET_BITS + 1)
+    return (shift + 1) * SUB_BUCKETS + ((value_ms >> shift) - SUB_BUCKETS)
+
+def bucket_bounds(index: int) -> tuple[int, int]:
+    if index < SUB_BUCKETS:
+        return index, index + 1
+    shift = index // SUB_BUCKETS - 1
+    low = (SUB_BUCKETS + index % SUB_BUCKETS) << shift
+    return low, low + (1 << shift)
+
+def window_start(ts: datetime) -> datetime:
+    return ts.replace(minute=0, second=0, microsecond=0)
+
+def _upsert(dialect_name: str, values: Dict[str, Any]):
+    if dialect_name == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+
+    stmt = dialect_insert(RuntimeRollup).values(**values)
+    t = RuntimeRollup.__table__.c
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[t.type, t.window_start, t.bucket],
+        set_={
+            "count": t.count + stmt.excluded.count,
+            "sum_runtime_ms": t.sum_runtime_ms + stmt.excluded.sum_runtime_ms,
+            "error_count": t.error_count + stmt.excluded.error_count,
+            "sum_error_ms": t.sum_error_ms + stmt.excluded.sum_error_ms,
+            "sum_abs_error_ms": t.sum_abs_error_ms + stmt.excluded.sum_abs_error_ms,
+        },
+    )
+    return stmt
+
+def completion_upsert(dialect_name: str, job_type: str, runtime_ms: int, predicted_ms: Optional[int], completed_at: datetime):
+    error = runtime_ms - predicted_ms if predicted_ms is not None else 0
+    return _upsert(dialect_name, {
+        "type": job_type,
+        "window_start": window_start(completed_at),
+        "bucket": bucket_index(runtime_ms),
+        "count": 1,
+        "sum_runtime_ms": runtime_ms,
+        "error_count": 1 if predicted_ms is not None else 0,
+        "sum_error_ms": error,
+        "sum_abs_error_ms": abs(error),
+    })
+
+def record_completion(db: Session, job_type: str, runtime_ms: int, predicted_ms: Optional[int], completed_at: datetime):
+    """Add one completed run to the rollups. Runs inside the caller's transaction."""
+    db.execute(completion_upsert(db.bind.dialect.name, job_type, runtime_ms, predicted_ms, completed_at))
+
+async def record_completion_async(db, job_type: str, runtime_ms: int, predicted_ms: Optional[int], completed_at: datetime):
+    await db.execute(completion_upsert(db.bind.dialect.name, job_type, runtime_ms, predicted_ms, completed_at))
+
+def _completed_runs(db: Session, chunk_size: int):
+    for table in job_tables():
+        yield from db.execute(
+            db.query(table.type, table.runtime_ms, table.predicted_runtime_ms, table.completed_at)
+            .filter(table.status == "completed")
+            .filter(table.runtime_ms != None)
+            .filter(table.completed_at != None)
+            .statement
+            .execution_options(stream_results=True, yield_per=chunk_size)
+        )
+
+def rebuild_rollups(db: Session, chunk_size: int = 5000) -> int:
+    """Recompute every rollup from the jobs and archive tables (backfill / repair)."""
+    acc: Dict[tuple, Dict[str, Any]] = {}
+    n = 0
+    for job_type, runtime_ms, predicted_ms, completed_at in _completed_runs(db, chunk_size):
+        key = (job_type, window_start(completed_at), bucket_index(runtime_ms))
+        agg = acc.setdefault(key, {
+            "type": key[0], "window_start": key[1], "bucket": key[2], "count": 0,
+            "sum_runtime_ms": 0, "error_count": 0, "sum_error_ms": 0, "sum_abs_error_ms": 0,
+        })
+        agg["count"] += 1
+        agg["sum_runtime_ms"] += runtime_ms
+        if predicted_ms is not None:
+            agg["error_count"] += 1
+            agg["sum_error_ms"] += runtime_ms - predicted_ms
+            agg["sum_abs_error_ms"] += abs(runtime_ms - predicted_ms)
+        n += 1
+
+    db.query(RuntimeRollup).delete()
+    if acc:
+        db.execute(insert(RuntimeRollup.__table__), list(acc.values()))
+    db.commit()
+    return n
+
+def _percentile(buckets: list[tuple[int, int]], total: int, q: float) -> float:
+    # buckets: sorted (bucket_index, count); report the bucket midpoint
+    rank = q * total
+    seen = 0
+    for index, count in buckets:
+        seen += count
+        if seen >= rank:
+            low, high = bucket_bounds(index)
+            return (low + high - 1) / 2
+    low, high = bucket_bounds(buckets[-1][0])
+    return (low + high - 1) / 2
+
+def runtime_summary(db: Session, since: Optional[datetime] = None) -> Dict[str, Any]:
+    query = db.query(
+        RuntimeRollup.type,
+        RuntimeRollup.bucket,
+        func.sum(RuntimeRollup.count),
+        func.sum(RuntimeRollup.sum_runtime_ms),
+        func.sum(RuntimeRollup.error_count),
+        func.sum(RuntimeRollup.sum_error_ms),
+        func.sum(RuntimeRollup.sum_abs_error_ms),
+    )
+    if since is not None:
+        query = query.filter(RuntimeRollup.window_start >= window_start(since))
+    rows = query.group_by(RuntimeRollup.type, RuntimeRollup.bucket).all()
+
+    per_type: Dict[str, Dict[str, Any]] = {}
+    for job_type, bucket, count, sum_rt, err_count, sum_err, sum_abs in rows:
+        agg = per_type.setdefault(job_type, {
+            "buckets": [], "count": 0, "sum_runtime_ms": 0,
+            "error_count": 0, "sum_error_ms": 0, "sum_abs_error_ms": 0,
+        })
+        agg["buckets"].append((bucket, int(count)))
+        agg["count"] += int(count)
+        agg["sum_runtime_ms"] += int(sum_rt)
+        agg["error_count"] += int(err_count)
+        agg["sum_error_ms"] += int(sum_err)
+        agg["sum_abs_error_ms"] += int(sum_abs)
+
+    total = sum(a["count"] for a in per_type.values())
+    if not total:
+        return {"count": 0}
+
+    by_type = {}
+    for job_type, agg in per_type.items():
+        buckets = sorted(agg["buckets"])
+        n = agg["count"]
+        ne = agg["error_count"]
+        by_type[job_type] = {
+            "count": n,
+            "avg_runtime_ms": agg["sum_runtime_ms"] / n,
+            "p50_runtime_ms": _percentile(buckets, n, 0.50),
+            "p95_runtime_ms": _percentile(buckets, n, 0.95),
+            "p99_runtime_ms": _percentile(buckets, n, 0.99),
+            "mean_error_ms": agg["sum_error_ms"] / ne if ne else None,
+            "mean_abs_error_ms": agg["sum_abs_error_ms"] / ne if ne else None,
+        }
+
+    return {
+        "count": total,
+        "avg_runtime_ms": sum(a["sum_runtime_ms"] for a in per_type.values()) / total,
+        "avg_by_type": {t: v["avg_runtime_ms"] for t, v in by_type.items()},
+        "by_type": by_type,
+    }
@@ -0,0 +1,15 @@
+import os
+
+import redis
+
+from app import metrics
+from app.scheduler.daemon import Scheduler
+
+# Prometheus scrape port for the scheduler process (0 disables)
+METRICS_PORT = int(os.getenv("SCHEDULER_METRICS_PORT", "9101"))
+
+if __name__ == "__main__":
+    rdb = redis.from_url(os.getenv("REDIS_URL", "redis://localhost:6379/0"), decode_responses=True)
+    if METRICS_PORT:
+        metrics.serve(METRICS_PORT)
+    Scheduler(rdb).run_forever()
@@ -0,0 +1,176 @@
+import heapq
+import os
+import time
+from datetime import datetime, timedelta
+
+from app.db.database import SessionLocal
+from app.db.models import Job
+from app.events import EVENT_RETENTION_DAYS, drop_events_before
+from app.metrics import SCHEDULER_TICK_SECONDS
+from app.retention import archive_terminal_jobs, collect_blobs
+from app.scheduler.leader import RedisLeaderLock
+from app.scheduler.reconcile import enqueue_all_ready, enqueue_due_retries, recover_expired_leases
+
+BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", "500"))
+# How often deadlines are reloaded from the database. Must be shorter than the
+# minimum lease (5s) so a fresh lease is always in the heap before it expires.
+REFRESH_SECONDS = float(os.getenv("SCHEDULER_REFRESH_SECONDS", "4"))
+# Full pass over every ready job, in case the Redis set was lost or flushed.
+RESYNC_SECONDS = float(os.getenv("SCHEDULER_RESYNC_SECONDS", "300"))
+# Each retry pass reaches this far back past the previous one. A retry row can
+# commit after a tick has passed its due time (near-zero jittered delays, clock
+# skew between API hosts and this one); re-pushing a job already in the ready
+# set is a no-op, so overlapping is free.
+RETRY_GRACE_SECONDS = float(os.getenv("SCHEDULER_RETRY_GRACE_SECONDS", "30"))
+LEADER_TTL_SECONDS = 10
+# The leader renews its lock this often, between batches as well as ticks,
+# so a long tick (a resync over a large backlog) cannot outlive the lock.
+LEADER_RENEW_SECONDS = LEADER_TTL_SECONDS / 3
+
+
+class LostLeadership(Exception):
+    """Another scheduler holds the lock now; the rest of the tick is dropped."""
+
+
+class Scheduler:
+    """
+    Keeps a min-heap of upcoming retry (next_run_at) and lease expiry
+    (lock_expires_at) deadlines and sleeps until the earliest one, then
+    recovers expired leases and promotes due retries in batches.
+    """
+
+    def __init__(self, rdb, session_factory=SessionLocal, batch_size: int = BATCH_SIZE,
+                 refresh_seconds: float = REFRESH_SECONDS, resync_seconds: float = RESYNC_SECONDS,
+                 retry_grace_seconds: float = RETRY_GRACE_SECONDS, lock: RedisLeaderLock | None = None):
+        self.rdb = rdb
+        self.lock = lock
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.refresh_seconds = refresh_seconds
+        self.resync_seconds = resync_seconds
+        self.retry_grace = timedelta(seconds=retry_grace_seconds)
+
+        self.deadlines: list[datetime] = []
+        self.promoted_until: datetime | None = None
+        self.next_refresh = 0.0
+        self.next_resync = 0.0
+        self.blob_cursor = ""      # where the blob GC walk resumes
+        self.next_renew = 0.0
+
+    def refresh(self, db, now: datetime):
+        # Only deadlines inside the next two refresh periods are loaded; later
+        # ones are picked up by a later refresh. Heartbeats move lease deadlines,
+        # so heap entries are only wake-up hints, never acted on blindly.
+        horizon = now + timedelta(seconds=self.refresh_seconds * 2)
+        self.deadlines = []
+        for column, status in ((Job.lock_expires_at, "running"), (Job.next_run_at, "queued")):
+            rows = (
+                db.query(column)
+                .filter(Job.status == status)
+                .filter(column != None)
+                .filter(column <= horizon)
+                .order_by(column.asc())
+                .limit(self.batch_size)
+                .all()
+            )
+            self.deadlines.extend(r[0] for r in rows)
+        heapq.heapify(self.deadlines)
+
+    def keep_leadership(self):
+        """Renew the leader lock if due; called between batches. Raises LostLeadership."""
+        if self.lock is None or time.monotonic() < self.next_renew:
+            return
+        if not self.lock.acquire_or_renew():
+            raise LostLeadership()
+        self.next_renew = time.monotonic() + LEADER_RENEW_SECONDS
+
+    def tick(self, db, now: datetime) -> dict:
+        recovered = deaded = 0
+        while True:
+            self.keep_leadership()
+            r, d = recover_expired_leases(db, now, self.batch_size, self.rdb)
+            recovered += r
+            deaded += d
+            if r + d < self.batch_size:
+                break
+
+        promoted = 0
+        pruned = archived = blobs_removed = 0
+        if self.promoted_until is None or time.monotonic() >= self.next_resync:
+            self.next_resync = time.monotonic() + self.resync_seconds
+            # event history past retention goes in whole partitions
+            pruned = drop_events_before(db.connection(), now - timedelta(days=EVENT_RETENTION_DAYS))
+            db.commit()
+            # old terminal jobs move to jobs_archive; a few batches per pass so
+            # lease recovery is never held up for long by a large backlog
+            archived = archive_terminal_jobs(db, now, max_batches=10, between_batches=self.keep_leadership)
+            # so do unreferenced payload blobs, walking on from where the last pass stopped
+            blobs_removed, self.blob_cursor = collect_blobs(db, after=self.blob_cursor, max_batches=10,
+                                                            between_batches=self.keep_leadership)
+            after_id = None
+            while True:
+                self.keep_leadership()
+                n, after_id = enqueue_all_ready(db, self.rdb, now, self.batch_size, after_id)
+                promoted += n
+                if n < self.batch_size:
+                    break
+        else:
+            after = (self.promoted_until - self.retry_grace, "")
+            while True:
+                self.keep_leadership()
+                n, after = enqueue_due_retries(db, self.rdb, after, now, self.batch_size)
+                promoted += n
+                if n < self.batch_size:
+                    break
+        self.promoted_until = now
+
+        while self.deadlines and self.deadlines[0] <= now:
+            heapq.heappop(self.deadlines)
+
+        return {"recovered_running": recovered, "deaded": deaded, "requeued": promoted,
+                "events_pruned": pruned, "archived": archived, "blobs_removed": blobs_removed}
+
+    def seconds_until_next(self, now: datetime) -> float:
+        wait = self.next_refresh - time.monotonic()
+        if self.deadlines:
+            wait = min(wait, (self.deadlines[0] - now).total_seconds())
+        return max(0.0, wait)
+
+    def run_once(self) -> dict:
+        db = self.session_factory()
+        try:
+            now = datetime.utcnow()
+            with SCHEDULER_TICK_SECONDS.time():
+                if time.monotonic() >= self.next_refresh:
+                    self.refresh(db, now)
+                    self.next_refresh = time.monotonic() + self.refresh_seconds
+                return self.tick(db, now)
+        finally:
+            db.close()
+
+    def run_forever(self):
+        lock = self.lock = self.lock or RedisLeaderLock(self.rdb, LEADER_TTL_SECONDS)
+        print(f"[scheduler] started (token={lock.token[:8]})", flush=True)
+        try:
+            while True:
+                if not lock.acquire_or_renew():
+                    # standby: try again before the current leader's lock could lapse
+                    self.promoted_until = None
+                    time.sleep(LEADER_RENEW_SECONDS)
+                    continue
+                self.next_renew = time.monotonic() + LEADER_RENEW_SECONDS
+
+                try:
+                    result = self.run_once()
+                except LostLeadership:
+                    print("[scheduler] lost the leader lock mid-tick; standing by", flush=True)
+                    self.promoted_until = None
+                    continue
+                if any(result.values()):
+                    print(f"[scheduler] {result}", flush=True)
+
+                # wake for the next deadline, but renew the lock in time
+                wait = min(self.seconds_until_next(datetime.utcnow()), self.next_renew - time.monotonic())
+                time.sleep(max(0.0, wait))
+        finally:
+            lock.release()
@@ -0,0 +1,46 @@
+from uuid import uuid4
+
+LEADER_KEY = "smartflow:scheduler:leader"
+
+# only the holder's token may extend or drop the lock
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class RedisLeaderLock:
+    """
+    Single-leader election on a Redis key with a TTL. The leader renews well
+    inside the TTL; if it dies, the key expires and a standby takes over.
+    """
+
+    def __init__(self, rdb, ttl_seconds: float = 10, key: str = LEADER_KEY):
+        self.rdb = rdb
+        self.key = key
+        self.ttl_ms = int(ttl_seconds * 1000)
+        self.token = str(uuid4())
+        self.held = False
+        self._renew = rdb.register_script(RENEW_SCRIPT)
+        self._release = rdb.register_script(RELEASE_SCRIPT)
+
+    def acquire_or_renew(self) -> bool:
+        if self.held:
+            self.held = bool(self._renew(keys=[self.key], args=[self.token, self.ttl_ms]))
+        if not self.held:
+            self.held = bool(self.rdb.set(self.key, self.token, nx=True, px=self.ttl_ms))
+        return self.held
+
+    def release(self):
+        if self.held:
+            self._release(keys=[self.key], args=[self.token])
+            self.held = False
@@ -0,0 +1,162 @@
+import json
+import os
+from typing import NamedTuple, Optional
+
+from sqlalchemy import nullslast
+
+# Scores sort ascending. Every policy keeps strict priority bands (higher
+# priority -> lower band) and only decides the order inside a band.
+PRIORITY_BAND = 10_000_000_000
+
+DISPATCH_POLICY = os.getenv("DISPATCH_POLICY", "fifo")
+# predicted runtime assumed for jobs the model could not score
+DEFAULT_PREDICTED_MS = int(os.getenv("DEFAULT_PREDICTED_MS", "5000"))
+# sjf: seconds of queue position given up per second of predicted runtime
+SJF_RUNTIME_WEIGHT = float(os.getenv("SJF_RUNTIME_WEIGHT", "10"))
+# fair: relative share per job type, e.g. '{"email": 2, "thumbnail": 1}'
+TYPE_WEIGHTS = json.loads(os.getenv("TYPE_WEIGHTS", "{}"))
+
+
+class ReadyJob(NamedTuple):
+    id: str
+    type: str
+    priority: int
+    ready_ts: float                 # when the job became ready (epoch or simulated seconds)
+    predicted_runtime_ms: Optional[int]
+    queue: str = "default"
+
+
+def band(priority: int) -> float:
+    return (10 - priority) * PRIORITY_BAND
+
+
+def predicted_seconds(job: ReadyJob) -> float:
+    ms = job.predicted_runtime_ms if job.predicted_runtime_ms is not None else DEFAULT_PREDICTED_MS
+    return ms / 1000
+
+
+class FifoPolicy:
+    """Priority first, then the order jobs became ready."""
+
+    name = "fifo"
+
+    def score(self, job: ReadyJob, head_tag: float = 0.0) -> float:
+        return band(job.priority) + job.ready_ts
+
+    def order_by(self, Job):
+        return [Job.priority.desc(), Job.created_at.asc()]
+
+    def enqueue_many(self, rdb, key: str, jobs: list[ReadyJob]) -> int:
+        if not jobs:
+            return 0
+        # NX keeps the original position when a job is pushed more than once
+        rdb.zadd(key, {j.id: self.score(j) for j in jobs}, nx=True)
+        return len(jobs)
+
+
+class ShortestJobPolicy(FifoPolicy):
+    """
+    Shortest predicted job first, with aging: the key is ready time plus the
+    predicted runtime scaled by SJF_RUNTIME_WEIGHT, so a long job is passed by
+    shorter ones only until it has waited that much longer than they have.
+    """
+
+    name = "sjf"
+
+    def __init__(self, runtime_weight: float = SJF_RUNTIME_WEIGHT):
+        self.runtime_weight = runtime_weight
+
+    def score(self, job: ReadyJob, head_tag: float = 0.0) -> float:
+        return band(job.priority) + job.ready_ts + predicted_seconds(job) * self.runtime_weight
+
+    def order_by(self, Job):
+        # SQL fallback when Redis is unavailable: no aging, just shortest first
+        return [Job.priority.desc(), nullslast(Job.predicted_runtime_ms.asc()), Job.created_at.asc()]
+
+
+FAIR_ENQUEUE_SCRIPT = """
+local band = tonumber(ARGV[1])
+-- virtual time never runs backwards, even when the queue drains
+local g = tonumber(redis.call('hget', KEYS[2], '__head') or '0')
+local head = redis.call('zrange', KEYS[1], 0, 0, 'WITHSCORES')
+if head[2] then
+    local s = tonumber(head[2])
+    local tag = s - math.floor(s / band) * band
+    if tag > g then
+        g = tag
+        redis.call('hset', KEYS[2], '__head', string.format('%.6f', g))
+    end
+end
+local added = 0
+for i = 2, #ARGV, 4 do
+    local id, t, cost, offset = ARGV[i], ARGV[i + 1], tonumber(ARGV[i + 2]), tonumber(ARGV[i + 3])
+    if not redis.call('zscore', KEYS[1], id) then
+        local v = tonumber(redis.call('hget', KEYS[2], t) or '0')
+        if v < g then v = g end
+        v = v + cost
+        redis.call('hset', KEYS[2], t, string.format('%.6f', v))
+        redis.call('zadd', KEYS[1], offset + v, id)
+        added = added + 1
+    end
+end
+return added
+"""
+
+
+class FairSharePolicy:
+    """
+    Weighted fair queueing across job types. Each type has a virtual clock that
+    advances by predicted_runtime / weight per job, and jobs are served in
+    order of the virtual finish time. A type that was idle restarts from the
+    head of the queue's clock, so it gets its share without a backlog of credit.
+    """
+
+    name = "fair"
+    VTIME_KEY = "smartflow:fair:vtime"
+
+    def __init__(self, weights: Optional[dict] = None):
+        self.weights = TYPE_WEIGHTS if weights is None else weights
+        self.vtime: dict[str, float] = {}   # local mode (simulator)
+        self.head = 0.0
+
+    def cost(self, job: ReadyJob) -> float:
+        return predicted_seconds(job) / float(self.weights.get(job.type, 1))
+
+    def score(self, job: ReadyJob, head_tag: float = 0.0) -> float:
+        self.head = max(self.head, head_tag)
+        v = max(self.vtime.get(job.type, 0.0), self.head) + self.cost(job)
+        self.vtime[job.type] = v
+        return band(job.priority) + v
+
+    def order_by(self, Job):
+        return [Job.priority.desc(), Job.created_at.asc()]
+
+    def enqueue_many(self, rdb, key: str, jobs: list[ReadyJob]) -> int:
+        if not jobs:
+            return 0
+        args = [PRIORITY_BAND]
+        for j in jobs:
+            args.extend((j.id, j.type, self.cost(j), band(j.priority)))
+        # runs atomically, so concurrent API processes share one set of clocks
+        return rdb.eval(FAIR_ENQUEUE_SCRIPT, 2, key, self.vtime_key(key), *args)
+
+    def vtime_key(self, key: str) -> str:
+        # clocks per queue, next to its ready set: smartflow:ready[:<queue>] -> smartflow:fair:vtime[:<queue>]
+        return self.VTIME_KEY + key.partition("smartflow:ready")[2]
+
+
+POLICIES = {
+    "fifo": FifoPolicy,
+    "sjf": ShortestJobPolicy,
+    "fair": FairSharePolicy,
+}
+
+
+def make_policy(name: str):
+    try:
+        return POLICIES[name]()
+    except KeyError:
+        raise ValueError(f"Unknown dispatch policy {name!r} (expected one of {', '.join(POLICIES)})")
+
+
+CURRENT_POLICY = make_policy(DISPATCH_POLICY)
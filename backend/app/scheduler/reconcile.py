@@ -0,0 +1,127 @@
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy import tuple_
+from sqlalchemy.orm import Session
+
+from app import job_updates, redis_queue, retry, type_limits
+from app.db.models import Job
+from app.events import EVENTS
+from app.metrics import RECOVERED_LEASES
+from app.scheduler.policies import CURRENT_POLICY
+from app.workflows import cancel_descendants
+
+def recover_expired_leases(db: Session, now: datetime, limit: int, rdb=None) -> tuple[int, int]:
+    """
+    Take back up to `limit` running jobs whose lease expired (worker died).
+    Returns (requeued for retry, marked dead). With `rdb`, retries follow
+    the per-type retry policies, the jobs' type limit slots are freed and the
+    new states are published to the job update stream.
+    """
+    stuck = (
+        db.query(Job)
+        .filter(Job.status == "running")
+        .filter(Job.lock_expires_at != None)
+        .filter(Job.lock_expires_at <= now)
+        .order_by(Job.lock_expires_at.asc())
+        .limit(limit)
+        .with_for_update(skip_locked=True)
+        .all()
+    )
+
+    by_type = retry.type_policies(rdb) if rdb is not None and stuck else {}
+    recovered = 0
+    deaded = 0
+    events = []
+    cancelled = []
+    slots = []
+    for job in stuck:
+        # count this as a failure attempt because worker died mid-run
+        job.attempts += 1
+        job.last_error = "Worker lease expired (worker likely crashed)"
+        worker_id = job.locked_by
+
+        # clear lock
+        job.locked_by = None
+        job.lock_expires_at = None
+
+        if job.attempts >= job.max_attempts:
+            job.status = "dead"
+            deaded += 1
+            if job.has_dependents:
+                cancelled.extend(cancel_descendants(db, job.id, now))
+        else:
+            delay = retry.policy_for(job.type, job.retry_policy, by_type).delay(job.attempts)
+            job.status = "queued"
+            job.next_run_at = now + timedelta(seconds=delay)
+            recovered += 1
+
+        job.touch()
+        events.append(dict(job_id=job.id, event="recover", status=job.status, worker_id=worker_id,
+                           attempt=job.attempts, error=job.last_error, ts=now))
+        slots.append((job.type, job.id))
+
+    db.commit()
+    RECOVERED_LEASES.labels("requeued").inc(recovered)
+    RECOVERED_LEASES.labels("dead").inc(deaded)
+    for event in events:
+        EVENTS.record(**event)
+    if rdb is not None and events:
+        type_limits.release_many(rdb, slots)
+        job_updates.publish_many(rdb, [
+            *(job_updates.delta(e["job_id"], e["status"], attempts=e["attempt"]) for e in events),
+            *(job_updates.delta(c, "dead") for c in cancelled),
+        ])
+    return recovered, deaded
+
+def _push(rdb, rows) -> int:
+    # Members are deduplicated, so re-pushing a job already in the set is a no-op
+    return redis_queue.enqueue_many(rdb, (
+        redis_queue.ready_job(r.id, r.type, r.priority, r.next_run_at or r.created_at, r.predicted_runtime_ms, r.queue)
+        for r in rows
+    ))
+
+def _ready_columns(db: Session):
+    return (
+        db.query(Job.id, Job.type, Job.queue, Job.priority, Job.next_run_at, Job.created_at, Job.predicted_runtime_ms)
+        .filter(Job.status == "queued")
+    )
+
+def enqueue_ready(db: Session, rdb, now: datetime, limit: int) -> int:
+    """Push the `limit` most urgent ready queued jobs into the Redis ready set."""
+    rows = (
+        _ready_columns(db)
+        .filter((Job.next_run_at == None) | (Job.next_run_at <= now))
+        .order_by(*CURRENT_POLICY.order_by(Job))
+        .limit(limit)
+        .all()
+    )
+    return _push(rdb, rows)
+
+def enqueue_due_retries(db: Session, rdb, after: tuple[datetime, str], now: datetime,
+                        limit: int) -> tuple[int, Optional[tuple[datetime, str]]]:
+    """
+    Push up to `limit` queued jobs whose retry is due by `now`, in
+    (next_run_at, id) order after the `after` key. Returns (pushed, key of the
+    last one) so callers can page forward; ids break ties on next_run_at.
+    """
+    rows = (
+        _ready_columns(db)
+        .filter(tuple_(Job.next_run_at, Job.id) > tuple_(*after))
+        .filter(Job.next_run_at <= now)
+        .order_by(Job.next_run_at.asc(), Job.id.asc())
+        .limit(limit)
+        .all()
+    )
+    return _push(rdb, rows), ((rows[-1].next_run_at, rows[-1].id) if rows else None)
+
+def enqueue_all_ready(db: Session, rdb, now: datetime, limit: int, after_id: Optional[str] = None) -> tuple[int, Optional[str]]:
+    """
+    One page of a full pass over every ready queued job, keyed on id. Returns
+    (pushed, last id) for the next page.
+    """
+    query = _ready_columns(db).filter((Job.next_run_at == None) | (Job.next_run_at <= now))
+    if after_id is not None:
+        query = query.filter(Job.id > after_id)
+    rows = query.order_by(Job.id.asc()).limit(limit).all()
+    return _push(rdb, rows), (rows[-1].id if rows else None)
@@ -0,0 +1,161 @@
+"""
+Discrete-event simulation of retries through a downstream outage.
+
+A burst of jobs is submitted at t=0 on top of a steady stream, and every
+attempt fails fast while the outage lasts. Each retry policy from app.retry
+(and optionally the circuit breaker from app.breaker) is replayed against N
+workers and the run reports how hard the retries hit the system: the
+busiest second of retries coming due (overall and once the outage is over),
+the largest ready backlog, the attempts made against the broken dependency,
+and job latency.
+
+    cd backend && python -m app.scheduler.simulate_retries
+    cd backend && python -m app.scheduler.simulate_retries --burst 50000 --outage 300 --workers 200
+"""
+import argparse
+import heapq
+import json
+import random
+from collections import deque
+
+from app import breaker
+from app.retry import DEFAULT_POLICY, RetryPolicy, make_policy
+
+SCENARIOS = {
+    # the fixed ladder every type used before retry policies existed
+    "ladder": (DEFAULT_POLICY._replace(jitter=0.0), False),
+    "ladder+jitter": (DEFAULT_POLICY, False),
+    "exponential": (make_policy("exponential", base=10, max_delay=300), False),
+    "exponential+breaker": (make_policy("exponential", base=10, max_delay=300), True),
+}
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def arrivals(burst: int, rate: float, duration: float, seed: int) -> list[float]:
+    rng = random.Random(seed)
+    times = [0.0] * burst
+    t = rng.expovariate(rate) if rate else duration
+    while t < duration:
+        times.append(t)
+        t += rng.expovariate(rate)
+    return times
+
+
+def simulate(policy: RetryPolicy, use_breaker: bool, jobs: list[float], workers: int, runtime_s: float,
+             fail_s: float, outage: tuple[float, float], max_attempts: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    events: list = [(t, 0, i) for i, t in enumerate(jobs)]     # (time, seq, job): job comes due
+    heapq.heapify(events)
+    seq = len(events)
+    ready: deque = deque()
+    busy: list = []                 # (finish time, job, ok)
+    attempts = [0] * len(jobs)
+    retries_per_second: dict[int, int] = {}
+    latencies: list[float] = []
+    dead = 0
+    peak_backlog = 0
+    outage_attempts = 0
+    window: deque = deque()         # (time, ok) of recent outcomes
+    window_fails = 0
+    paused_until = 0.0
+    opened = 0
+    width = breaker.BREAKER_WINDOW_SECONDS
+
+    now = 0.0
+    while events or ready or busy:
+        # dispatch while workers are free and the type is not paused
+        while ready and len(busy) < workers and now >= paused_until:
+            job = ready.popleft()
+            ok = not (outage[0] <= now < outage[1])
+            outage_attempts += not ok
+            heapq.heappush(busy, (now + (runtime_s if ok else fail_s), job, ok))
+        peak_backlog = max(peak_backlog, len(ready))
+
+        next_due = events[0][0] if events else float("inf")
+        next_done = busy[0][0] if busy else float("inf")
+        # a paused worker pool wakes up when the breaker closes
+        next_resume = paused_until if ready and len(busy) < workers and paused_until > now else float("inf")
+        now = min(next_due, next_done, next_resume)
+        if now == next_due:
+            _, _, job = heapq.heappop(events)
+            ready.append(job)
+            if attempts[job]:
+                retries_per_second[int(now)] = retries_per_second.get(int(now), 0) + 1
+        elif now == next_done:
+            _, job, ok = heapq.heappop(busy)
+            if ok:
+                latencies.append(now - jobs[job])
+            else:
+                attempts[job] += 1
+                if attempts[job] >= max_attempts:
+                    dead += 1
+                else:
+                    seq += 1
+                    heapq.heappush(events, (now + policy.delay(attempts[job], rng), seq, job))
+            if use_breaker:
+                window.append((now, ok))
+                window_fails += not ok
+                while window[0][0] <= now - width:
+                    window_fails -= not window.popleft()[1]
+                if (not ok and len(window) >= breaker.BREAKER_MIN_CALLS
+                        and window_fails >= breaker.BREAKER_FAILURE_RATE * len(window)):
+                    paused_until = now + breaker.BREAKER_OPEN_SECONDS
+                    window.clear()
+                    window_fails = 0
+                    opened += 1
+
+    latencies.sort()
+    after = [n for s, n in retries_per_second.items() if s >= outage[1]]
+    return {
+        "peak_retries_per_s": max(retries_per_second.values(), default=0),
+        "peak_retries_per_s_after_outage": max(after, default=0),
+        "peak_backlog": peak_backlog,
+        "outage_attempts": outage_attempts,
+        "breaker_opened": opened,
+        "completed": len(latencies),
+        "dead": dead,
+        "p50_latency_s": percentile(latencies, 0.50),
+        "p99_latency_s": percentile(latencies, 0.99),
+        "drained_at_s": now,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--burst", type=int, default=10000, help="jobs submitted at t=0")
+    parser.add_argument("--rate", type=float, default=20.0, help="steady arrivals per second")
+    parser.add_argument("--duration", type=float, default=600.0, help="seconds of steady arrivals")
+    parser.add_argument("--outage", type=float, default=120.0, help="seconds from t=0 that every attempt fails")
+    parser.add_argument("--workers", type=int, default=50)
+    parser.add_argument("--runtime", type=float, default=0.2, help="seconds per successful attempt")
+    parser.add_argument("--fail-time", type=float, default=0.05, help="seconds per failed attempt")
+    parser.add_argument("--max-attempts", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    jobs = arrivals(args.burst, args.rate, args.duration, args.seed)
+    results = {
+        name: simulate(policy, use_breaker, jobs, args.workers, args.runtime, args.fail_time,
+                       (0.0, args.outage), args.max_attempts, args.seed)
+        for name, (policy, use_breaker) in SCENARIOS.items()
+    }
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"{'scenario':<20} {'retries/s':>10} {'after':>6} {'backlog':>8} {'outage att':>10} "
+          f"{'dead':>5} {'p50 s':>7} {'p99 s':>7} {'drained':>8}")
+    for name, r in results.items():
+        print(f"{name:<20} {r['peak_retries_per_s']:10d} {r['peak_retries_per_s_after_outage']:6d} {r['peak_backlog']:8d} "
+              f"{r['outage_attempts']:10d} {r['dead']:5d} {r['p50_latency_s']:7.1f} {r['p99_latency_s']:7.1f} "
+              f"{r['drained_at_s']:8.1f}")
+
+
+if __name__ == "__main__":
+    main()
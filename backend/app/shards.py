@@ -0,0 +1,82 @@
+import hashlib
+import os
+from bisect import bisect
+from typing import Dict, List, Optional, Sequence
+
+import redis
+import redis.asyncio as aioredis
+
+# Ready sets can be spread over several Redis instances. REDIS_SHARDS is a
+# comma-separated list of URLs; each queue lives wholly on one of them, picked
+# by consistent hashing of the queue name, so adding a shard only moves the
+# queues that land on it. Unset, every queue stays on the main Redis
+# (REDIS_URL). Shared state (type limits, breakers, dedup keys, job updates)
+# always stays on the main Redis. worker/queues.py must hash the same way.
+REDIS_SHARDS = [u.strip() for u in os.getenv("REDIS_SHARDS", "").split(",") if u.strip()]
+VNODES = 160
+
+
+def hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """Consistent hashing with VNODES points per node, so queues spread evenly."""
+
+    def __init__(self, nodes: Sequence[str], vnodes: int = VNODES):
+        points = sorted((hash64(f"{node}#{i}"), node) for node in nodes for i in range(vnodes))
+        self.hashes = [h for h, _ in points]
+        self.nodes = [n for _, n in points]
+
+    def node(self, name: str) -> str:
+        return self.nodes[bisect(self.hashes, hash64(name)) % len(self.nodes)]
+
+
+RING: Optional[HashRing] = None
+_clients: Dict[str, redis.Redis] = {}
+_async_clients: Dict[str, aioredis.Redis] = {}
+
+
+def configure(urls: Sequence[str]):
+    global RING
+    RING = HashRing(urls) if urls else None
+    _clients.clear()
+    _async_clients.clear()
+
+
+configure(REDIS_SHARDS)
+
+
+def shard_url(queue: str) -> Optional[str]:
+    return RING.node(queue) if RING else None
+
+
+def connect(url: str) -> redis.Redis:
+    c = _clients.get(url)
+    if c is None:
+        c = _clients.setdefault(url, redis.from_url(url, decode_responses=True))
+    return c
+
+
+def client(rdb, queue: str):
+    """The Redis holding `queue`: `rdb` itself unless shards are configured."""
+    if RING is None:
+        return rdb
+    return connect(RING.node(queue))
+
+
+def async_client(ardb, queue: str):
+    if RING is None:
+        return ardb
+    url = RING.node(queue)
+    c = _async_clients.get(url)
+    if c is None:
+        c = _async_clients.setdefault(url, aioredis.from_url(url, decode_responses=True))
+    return c
+
+
+def clients(rdb) -> List:
+    """Every Redis that may hold ready sets."""
+    if RING is None:
+        return [rdb]
+    return [connect(url) for url in dict.fromkeys(RING.nodes)]
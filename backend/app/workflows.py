@@ -0,0 +1,144 @@
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import case, select, update
+from sqlalchemy.orm import Session
+
+from app.db.models import ArchivedJob, Job, JobDependency
+from app.retention import TERMINAL_STATUSES
+
+# ids per IN (...) list when walking wide DAGs
+CHUNK_SIZE = 1000
+
+Plan = Tuple[str, int, Optional[str], List[str]]
+
+
+def chunks(ids: Sequence[str], size: int = CHUNK_SIZE):
+    for i in range(0, len(ids), size):
+        yield ids[i:i + size]
+
+
+def parent_statuses(db: Session, parent_ids: Iterable[str]) -> Dict[str, str]:
+    """
+    Status of each existing parent; unknown ids are left out. Live parents
+    are flagged has_dependents by an UPDATE, which also row-locks them until
+    the caller commits, so none can complete before the new edges exist.
+    """
+    ids = list(dict.fromkeys(parent_ids))
+    found: Dict[str, str] = {}
+    for chunk in chunks(ids):
+        found.update(db.execute(
+            update(Job)
+            .where(Job.id.in_(chunk))
+            .where(Job.status.notin_(TERMINAL_STATUSES))
+            .values(has_dependents=True)
+            .returning(Job.id, Job.status)
+            .execution_options(synchronize_session=False)
+        ).all())
+    for table in (Job, ArchivedJob):
+        missing = [p for p in ids if p not in found]
+        for chunk in chunks(missing):
+            found.update(db.execute(select(table.id, table.status).where(table.id.in_(chunk))).all())
+    return found
+
+
+def plan(nodes: Dict[str, List[str]], existing: Dict[str, str]) -> Dict[str, Plan]:
+    """
+    Initial state of new jobs. `nodes` maps each new job's key to its
+    depends_on, which may name other keys or existing job ids (`existing`
+    holds their statuses). Returns key -> (status, pending_parents,
+    last_error, parents still to wait for), in topological order.
+    Raises ValueError for unknown parents and cycles.
+    """
+    children = defaultdict(list)
+    indegree = {key: 0 for key in nodes}
+    for key, deps in nodes.items():
+        for dep in dict.fromkeys(deps):
+            if dep in nodes:
+                indegree[key] += 1
+                children[dep].append(key)
+            elif dep not in existing:
+                raise ValueError(f"Unknown parent job {dep}")
+
+    order = [key for key, n in indegree.items() if n == 0]
+    for key in order:
+        for child in children[key]:
+            indegree[child] -= 1
+            if indegree[child] == 0:
+                order.append(child)
+    if len(order) != len(nodes):
+        raise ValueError("depends_on contains a cycle")
+
+    out: Dict[str, Plan] = {}
+    for key in order:
+        deps = list(dict.fromkeys(nodes[key]))
+        status_of = {d: out[d][0] if d in nodes else existing[d] for d in deps}
+        failed = next((d for d in deps if status_of[d] == "dead"), None)
+        if failed is not None:
+            out[key] = ("dead", 0, f"Upstream job {failed} failed", [])
+            continue
+        waiting = [d for d in deps if status_of[d] != "completed"]
+        out[key] = ("blocked" if waiting else "queued", len(waiting), None, waiting)
+    return out
+
+
+def release_children_stmt(parent_id: str, now: datetime):
+    # One UPDATE over the parent's out-edges: every blocked child loses one
+    # pending parent, and the ones that reach zero become queued. SET
+    # expressions see the pre-update row, hence pending_parents == 1.
+    children = select(JobDependency.child_id).where(JobDependency.parent_id == parent_id)
+    return (
+        update(Job)
+        .where(Job.id.in_(children))
+        .where(Job.status == "blocked")
+        .values(
+            pending_parents=Job.pending_parents - 1,
+            status=case((Job.pending_parents == 1, "queued"), else_=Job.status),
+            updated_at=now,
+        )
+        .returning(Job.id, Job.type, Job.queue, Job.priority, Job.predicted_runtime_ms, Job.status)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def cancel_children_stmt(parent_ids: Sequence[str], root_id: str, now: datetime):
+    children = select(JobDependency.child_id).where(JobDependency.parent_id.in_(parent_ids))
+    return (
+        update(Job)
+        .where(Job.id.in_(children))
+        .where(Job.status == "blocked")
+        .values(status="dead", pending_parents=0, last_error=f"Upstream job {root_id} failed", updated_at=now)
+        .returning(Job.id)
+        .execution_options(synchronize_session=False)
+    )
+
+
+async def release_children_async(db, parent_id: str, now: datetime) -> list:
+    """Children of a just-completed job, after the decrement. Caller commits."""
+    return (await db.execute(release_children_stmt(parent_id, now))).all()
+
+
+def cancel_descendants(db: Session, root_id: str, now: datetime) -> List[str]:
+    """Mark every blocked descendant of a dead job dead, level by level. Caller commits."""
+    cancelled: List[str] = []
+    frontier = [root_id]
+    while frontier:
+        level: List[str] = []
+        for chunk in chunks(frontier):
+            level.extend(db.execute(cancel_children_stmt(chunk, root_id, now)).scalars().all())
+        cancelled.extend(level)
+        frontier = level
+    return cancelled
+
+
+async def cancel_descendants_async(db, root_id: str, now: datetime) -> List[str]:
+    cancelled: List[str] = []
+    frontier = [root_id]
+    while frontier:
+        level: List[str] = []
+        for chunk in chunks(frontier):
+            level.extend((await db.execute(cancel_children_stmt(chunk, root_id, now))).scalars().all())
+        cancelled.extend(level)
+        frontier = level
+    return cancelled
@@ -0,0 +1,118 @@
+"""
+Load test for the job lifecycle endpoints: N concurrent clients each loop
+claim -> complete (runtime reported in the same call), with a GET /jobs
+every few rounds, and the script reports requests/sec and p50/p99 latency
+per endpoint.
+
+By default the API runs in-process behind httpx's ASGI transport (SQLite and
+fakeredis); pass --api to load a running server instead, e.g. one started on
+the previous revision to get before/after numbers on the same database.
+
+    cd backend && python -m benchmarks.api_load --jobs 2000 --clients 32
+    cd backend && python -m benchmarks.api_load --api http://localhost:8000 --clients 64
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DB_FILE}")
+
+import httpx  # noqa: E402
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def in_process_client() -> httpx.AsyncClient:
+    import fakeredis
+
+    import app.main as api
+    from app.db.migrate import migrate
+
+    migrate()
+    server = fakeredis.FakeServer()
+    api.rdb = fakeredis.FakeRedis(server=server, decode_responses=True)
+    api.ardb = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://api")
+
+
+async def run(http: httpx.AsyncClient, n_jobs: int, clients: int, list_every: int) -> dict:
+    for start in range(0, n_jobs, 1000):
+        resp = await http.post("/jobs/batch", json=[{"type": "bench"} for _ in range(min(1000, n_jobs - start))])
+        resp.raise_for_status()
+
+    latencies: dict[str, list[float]] = {}
+    errors = 0
+
+    async def call(name: str, method: str, path: str, **kwargs):
+        nonlocal errors
+        t0 = time.perf_counter()
+        resp = await http.request(method, path, **kwargs)
+        latencies.setdefault(name, []).append(time.perf_counter() - t0)
+        if resp.status_code >= 400:
+            errors += 1
+        return resp
+
+    async def client(n: int):
+        rounds = 0
+        while True:
+            resp = await call("claim", "POST", "/jobs/claim", json={"worker_id": f"load-{n}"})
+            if resp.status_code != 200:
+                return
+            job_id = resp.json()["id"]
+            await call("complete", "POST", f"/jobs/{job_id}/complete",
+                       json={"worker_id": f"load-{n}", "runtime_ms": 100})
+            rounds += 1
+            if list_every and rounds % list_every == 0:
+                await call("list", "GET", "/jobs", params={"limit": 50})
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(clients)))
+    elapsed = time.perf_counter() - t0
+
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "elapsed_s": elapsed,
+        "requests": total,
+        "errors": errors,
+        "requests_per_s": total / elapsed,
+        "by_endpoint": {
+            name: {
+                "requests": len(v),
+                "p50_ms": percentile(sorted(v), 0.50) * 1000,
+                "p99_ms": percentile(sorted(v), 0.99) * 1000,
+            }
+            for name, v in latencies.items()
+        },
+    }
+
+
+async def main(args):
+    if args.api:
+        limits = httpx.Limits(max_connections=args.clients, max_keepalive_connections=args.clients)
+        http = httpx.AsyncClient(base_url=args.api, limits=limits, timeout=30)
+    else:
+        http = in_process_client()
+    async with http:
+        result = await run(http, args.jobs, args.clients, args.list_every)
+
+    print(f"{result['requests']} requests in {result['elapsed_s']:.2f}s "
+          f"({result['requests_per_s']:.1f} req/s, {result['errors']} errors)")
+    print(f"{'endpoint':<10} {'requests':>8} {'p50 ms':>8} {'p99 ms':>8}")
+    for name, r in result["by_endpoint"].items():
+        print(f"{name:<10} {r['requests']:8d} {r['p50_ms']:8.2f} {r['p99_ms']:8.2f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--api", help="base URL of a running API; omit to run in-process")
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--list-every", type=int, default=10, help="GET /jobs every N rounds per client (0 = never)")
+    asyncio.run(main(parser.parse_args()))
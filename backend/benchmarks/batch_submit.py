@@ -0,0 +1,53 @@
+"""
+Jobs/sec for POST /jobs versus POST /jobs/batch, in-process against SQLite
+and fakeredis.
+
+    cd backend && python -m benchmarks.batch_submit --jobs 5000
+"""
+import argparse
+import os
+import tempfile
+import time
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DB_FILE}")
+
+import fakeredis  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+
+import app.main as api  # noqa: E402
+from app.db.migrate import migrate  # noqa: E402
+
+migrate()
+
+
+def make_job(i: int):
+    return {"type": f"type-{i % 5}", "payload": {"n": i}, "priority": i % 10 + 1}
+
+
+def run(n_jobs: int, batch: int):
+    api.rdb = fakeredis.FakeRedis(decode_responses=True)
+    client = TestClient(api.app)
+
+    t0 = time.perf_counter()
+    for i in range(n_jobs):
+        client.post("/jobs", json=make_job(i)).raise_for_status()
+    single_s = time.perf_counter() - t0
+
+    t0 = time.perf_counter()
+    for i in range(0, n_jobs, batch):
+        items = [make_job(j) for j in range(i, min(i + batch, n_jobs))]
+        client.post("/jobs/batch", json=items).raise_for_status()
+    batch_s = time.perf_counter() - t0
+
+    print(f"POST /jobs:       {n_jobs / single_s:,.0f} jobs/s")
+    print(f"POST /jobs/batch: {n_jobs / batch_s:,.0f} jobs/s (batch={batch})")
+    print(f"speedup:          {single_s / batch_s:.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--batch", type=int, default=1000)
+    args = parser.parse_args()
+    run(args.jobs, args.batch)
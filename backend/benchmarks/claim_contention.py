@@ -0,0 +1,133 @@
+"""
+Claim correctness under contention: N concurrent claimers race over one pool
+of queued jobs, and every job must be claimed exactly once. Two modes run:
+
+  id    every claimer tries every job by id (POST /jobs/claim with job_id),
+        in its own shuffled order, so each job is fought over by all of them
+  next  claimers take the next ready job (no job_id), as a worker without
+        Redis does, until the pool is drained
+
+Exits non-zero if a job was claimed twice or never. The API runs in-process
+(SQLite, fakeredis) unless --api points at a running one; jobs go to a fresh
+queue there, so other work in that database is left alone.
+
+    cd backend && python -m benchmarks.claim_contention --jobs 500 --claimers 32
+    cd backend && python -m benchmarks.claim_contention --api http://localhost:8000
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter
+from uuid import uuid4
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DB_FILE}")
+
+import httpx  # noqa: E402
+
+
+def in_process_client() -> httpx.AsyncClient:
+    import fakeredis
+
+    import app.main as api
+    from app.db.migrate import migrate
+
+    migrate()
+    server = fakeredis.FakeServer()
+    api.rdb = fakeredis.FakeRedis(server=server, decode_responses=True)
+    api.ardb = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://api", timeout=None)
+
+
+async def submit(http: httpx.AsyncClient, n_jobs: int, queue: str) -> list[str]:
+    ids = []
+    for i in range(0, n_jobs, 1000):
+        resp = await http.post("/jobs/batch", json=[{"type": "contention", "queue": queue}
+                                                    for _ in range(min(1000, n_jobs - i))])
+        resp.raise_for_status()
+        ids.extend(resp.json()["ids"])
+    return ids
+
+
+async def claim_by_id(http: httpx.AsyncClient, worker_id: str, ids: list[str], claims: list):
+    for job_id in random.sample(ids, len(ids)):
+        resp = await http.post("/jobs/claim", json={"worker_id": worker_id, "job_id": job_id})
+        if resp.status_code == 200:
+            claims.append((resp.json()["id"], worker_id))
+        elif resp.status_code != 409:
+            raise RuntimeError(f"claim {job_id}: {resp.status_code} {resp.text}")
+
+
+async def claim_next(http: httpx.AsyncClient, worker_id: str, queue: str, claims: list):
+    # a 204 means no candidate was left when this claimer looked; the caller
+    # runs another round in case a lost race left some behind
+    while True:
+        resp = await http.post("/jobs/claim", json={"worker_id": worker_id, "queues": [queue]})
+        if resp.status_code == 204:
+            return
+        if resp.status_code != 200:
+            raise RuntimeError(f"claim: {resp.status_code} {resp.text}")
+        claims.append((resp.json()["id"], worker_id))
+
+
+async def run(http: httpx.AsyncClient, mode: str, n_jobs: int, claimers: int) -> dict:
+    queue = f"contention-{uuid4().hex[:8]}"
+    ids = await submit(http, n_jobs, queue)
+    claims: list = []
+    t0 = time.perf_counter()
+    rounds = 0
+    while True:
+        rounds += 1
+        before = len(claims)
+        if mode == "id":
+            await asyncio.gather(*(claim_by_id(http, f"c{i}", ids, claims) for i in range(claimers)))
+        else:
+            await asyncio.gather(*(claim_next(http, f"c{i}", queue, claims) for i in range(claimers)))
+        if mode == "id" or len(claims) == before or len(claims) >= n_jobs:
+            break
+    elapsed = time.perf_counter() - t0
+
+    counts = Counter(job_id for job_id, _ in claims)
+    return {
+        "mode": mode,
+        "claims": len(claims),
+        "duplicates": sorted(j for j, n in counts.items() if n > 1),
+        "missing": sorted(set(ids) - set(counts)),
+        "foreign": sorted(set(counts) - set(ids)),
+        "rounds": rounds,
+        "claims_per_s": len(claims) / elapsed if elapsed else 0.0,
+    }
+
+
+async def main(args) -> int:
+    http = httpx.AsyncClient(base_url=args.api, timeout=30) if args.api else in_process_client()
+    failed = False
+    async with http:
+        for mode in args.modes:
+            r = await run(http, mode, args.jobs, args.claimers)
+            ok = not (r["duplicates"] or r["missing"] or r["foreign"])
+            failed = failed or not ok
+            print(f"{mode:<5} claimers={args.claimers:<4} claimed {r['claims']}/{args.jobs} "
+                  f"in {r['rounds']} round(s), {r['claims_per_s']:8.1f} claims/s  "
+                  f"duplicates={len(r['duplicates'])} missing={len(r['missing'])} "
+                  f"foreign={len(r['foreign'])}  {'ok' if ok else 'FAIL'}")
+            for key in ("duplicates", "missing", "foreign"):
+                if r[key]:
+                    print(f"  {key}: {r[key][:10]}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=500)
+    parser.add_argument("--claimers", type=int, default=32)
+    parser.add_argument("--modes", nargs="+", choices=["id", "next"], default=["id", "next"])
+    parser.add_argument("--api", help="base URL of a running API instead of the in-process one")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    sys.exit(asyncio.run(main(args)))
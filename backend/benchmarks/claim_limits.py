@@ -0,0 +1,116 @@
+"""
+What per-type limits cost at claim time. N concurrent clients loop
+claim -> complete over jobs of three types, once per scenario:
+
+    off        TYPE_LIMITS=off and CIRCUIT_BREAKER=off, no Redis script on claim
+    unlimited  limits on, no type has a limit (one script call that finds none)
+    loose      every type has a concurrency cap and rate limit that never bind
+    throttled  type "a" is capped at 1 running job; its jobs are skipped and
+               the clients keep claiming "b" and "c"
+
+The API runs in-process with SQLite. fakeredis runs Lua through lupa and is
+much slower at it than Redis, so pass --redis to measure against a real one.
+
+    cd backend && python -m benchmarks.claim_limits --jobs 3000 --clients 16
+    cd backend && python -m benchmarks.claim_limits --redis redis://localhost:6379/15
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DB_FILE}")
+
+import fakeredis  # noqa: E402
+import httpx  # noqa: E402
+import redis  # noqa: E402
+import redis.asyncio as aioredis  # noqa: E402
+
+import app.main as api  # noqa: E402
+from app.db.migrate import migrate  # noqa: E402
+from app import breaker, type_limits  # noqa: E402
+
+migrate()
+
+TYPES = ("a", "b", "c")
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def run(http: httpx.AsyncClient, n_jobs: int, clients: int, hold: str | None = None) -> dict:
+    jobs = [{"type": TYPES[i % len(TYPES)]} for i in range(n_jobs)]
+    for start in range(0, n_jobs, 1000):
+        (await http.post("/jobs/batch", json=jobs[start:start + 1000])).raise_for_status()
+
+    latencies: list[float] = []
+    claimed: dict[str, int] = {}
+
+    async def client(n: int):
+        while True:
+            t0 = time.perf_counter()
+            resp = await http.post("/jobs/claim", json={"worker_id": f"bench-{n}"})
+            latencies.append(time.perf_counter() - t0)
+            if resp.status_code != 200:
+                return
+            job = resp.json()
+            claimed[job["type"]] = claimed.get(job["type"], 0) + 1
+            if job["type"] == hold:
+                continue    # keep its slot for the whole run
+            await http.post(f"/jobs/{job['id']}/complete", json={"worker_id": f"bench-{n}"})
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client(n) for n in range(clients)))
+    elapsed = time.perf_counter() - t0
+    latencies.sort()
+    return {
+        "claims": sum(claimed.values()),
+        "by_type": claimed,
+        "claims_per_s": sum(claimed.values()) / elapsed,
+        "p50_ms": percentile(latencies, 0.5) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+async def main(args):
+    if args.redis:
+        api.rdb = redis.from_url(args.redis, decode_responses=True)
+        api.ardb = aioredis.from_url(args.redis, decode_responses=True)
+        api.rdb.flushdb()
+    else:
+        server = fakeredis.FakeServer()
+        api.rdb = fakeredis.FakeRedis(server=server, decode_responses=True)
+        api.ardb = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+
+    scenarios = {
+        "off": (False, {}),
+        "unlimited": (True, {}),
+        "loose": (True, {t: dict(concurrency=10_000, rate=1_000_000.0) for t in TYPES}),
+        "throttled": (True, {"a": dict(concurrency=1)}),
+    }
+    results = {}
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://api") as http:
+        for name, (enabled, limits) in scenarios.items():
+            type_limits.TYPE_LIMITS = breaker.BREAKER = enabled
+            for t in TYPES:
+                type_limits.set_limit(api.rdb, t, **limits.get(t, {}))
+            results[name] = await run(http, args.jobs, args.clients, hold="a" if name == "throttled" else None)
+
+    base = results["off"]["claims_per_s"]
+    print(f"{'scenario':<10} {'claims':>7} {'claims/s':>9} {'vs off':>7} {'p50 ms':>7} {'p99 ms':>7}  by type")
+    for name, r in results.items():
+        print(f"{name:<10} {r['claims']:7d} {r['claims_per_s']:9.1f} {r['claims_per_s'] / base - 1:+7.1%} "
+              f"{r['p50_ms']:7.2f} {r['p99_ms']:7.2f}  {dict(sorted(r['by_type'].items()))}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=3000, help="jobs per scenario, spread over three types")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--redis", help="Redis URL to use instead of fakeredis (the db is flushed)")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,94 @@
+"""
+Wide fan-out / fan-in DAG: root -> N middle jobs -> sink. Submits the whole
+workflow through POST /workflows, then completes the root (one UPDATE
+releases N children) and every middle job (each decrements the sink's
+counter once; the last one makes it ready), timing each step. The API runs
+in-process with SQLite and fakeredis; completions go straight through the
+same functions complete_job uses, so HTTP overhead is left out.
+
+    cd backend && python -m benchmarks.dag_workflow --nodes 100000
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+from datetime import datetime
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DB_FILE}")
+
+import fakeredis  # noqa: E402
+import httpx  # noqa: E402
+from sqlalchemy import select, update  # noqa: E402
+
+import app.main as api  # noqa: E402
+from app.db.migrate import migrate  # noqa: E402
+from app import workflows  # noqa: E402
+from app.db.database import AsyncSessionLocal  # noqa: E402
+from app.db.models import Job  # noqa: E402
+
+migrate()
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+async def complete(job_id: str) -> list:
+    async with AsyncSessionLocal() as db:
+        now = datetime.utcnow()
+        await db.execute(update(Job).where(Job.id == job_id).values(status="completed", completed_at=now))
+        released = await workflows.release_children_async(db, job_id, now)
+        await db.commit()
+    return released
+
+
+async def run(width: int):
+    server = fakeredis.FakeServer()
+    api.rdb = fakeredis.FakeRedis(server=server, decode_responses=True)
+    api.ardb = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+
+    jobs = [{"key": "root", "type": "bench"}]
+    jobs += [{"key": f"m{i}", "type": "bench", "depends_on": ["root"]} for i in range(width)]
+    jobs += [{"key": "sink", "type": "bench", "depends_on": [f"m{i}" for i in range(width)]}]
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://api", timeout=None) as http:
+        t0 = time.perf_counter()
+        resp = await http.post("/workflows", json={"jobs": jobs})
+        resp.raise_for_status()
+        submit_s = time.perf_counter() - t0
+    ids = resp.json()["ids"]
+    print(f"submit   {len(jobs)} jobs, {2 * width} edges: {submit_s:.2f}s")
+
+    t0 = time.perf_counter()
+    released = await complete(ids["root"])
+    fan_out_s = time.perf_counter() - t0
+    ready = sum(1 for r in released if r.status == "queued")
+    print(f"fan-out  root released {ready} children in one statement: {fan_out_s * 1000:.1f} ms")
+
+    latencies = []
+    t0 = time.perf_counter()
+    for i in range(width):
+        t1 = time.perf_counter()
+        await complete(ids[f"m{i}"])
+        latencies.append(time.perf_counter() - t1)
+    fan_in_s = time.perf_counter() - t0
+    latencies.sort()
+    print(f"fan-in   {width} completions: {fan_in_s:.2f}s "
+          f"(p50 {percentile(latencies, 0.5) * 1000:.2f} ms, p99 {percentile(latencies, 0.99) * 1000:.2f} ms)")
+
+    async with AsyncSessionLocal() as db:
+        sink = (await db.execute(select(Job.status, Job.pending_parents).where(Job.id == ids["sink"]))).one()
+    print(f"sink     status={sink.status} pending_parents={sink.pending_parents}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--nodes", type=int, default=100_000, help="total jobs, including root and sink")
+    args = parser.parse_args()
+    asyncio.run(run(max(1, args.nodes - 2)))
+
+
+if __name__ == "__main__":
+    main()
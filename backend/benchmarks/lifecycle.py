@@ -0,0 +1,291 @@
+"""
+Full job lifecycle under a synthetic, seeded workload:
+
+    submit -> lease -> start -> telemetry -> complete | fail
+
+Jobs are generated from a workload spec (type mix, payload sizes, priority
+weights, failure rate and simulated work time per type; see WORKLOAD or pass
+--workload FILE.json) with a fixed seed, so two runs submit the same jobs.
+Workers pop ids from the Redis ready set like worker/worker.py does and walk
+each job through the API. Jobs get max_attempts=1 so a failure is final and
+no scheduler is needed for retries.
+
+Reported: throughput and p50/p99 latency per endpoint, queue latency
+(submitted -> leased) and end-to-end latency (submitted -> finished). --out
+writes them as JSON with the commit and arguments; --compare prints the
+change against an earlier file.
+
+By default the API runs in-process (SQLite, fakeredis, a temp blob dir).
+With --api and --redis it drives running services instead.
+
+    cd backend && python -m benchmarks.lifecycle --jobs 2000 --workers 16 --out before.json
+    cd backend && python -m benchmarks.lifecycle --jobs 2000 --workers 16 --compare before.json
+    cd backend && python -m benchmarks.lifecycle --api http://localhost:8000 --redis redis://localhost:6379/0
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+from datetime import datetime
+
+TMP_DIR = tempfile.mkdtemp()
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(TMP_DIR, 'bench.db')}")
+os.environ.setdefault("BLOB_DIR", os.path.join(TMP_DIR, "blobs"))
+
+import httpx  # noqa: E402
+
+from app.redis_queue import READY_KEY  # noqa: E402
+
+# weight: share of jobs; payload_bytes / work_ms: uniform [lo, hi]; fail_rate: share that fail
+WORKLOAD = {
+    "types": {
+        "email": {"weight": 6, "payload_bytes": [100, 2_000], "work_ms": [1, 5], "fail_rate": 0.05},
+        "thumbnail": {"weight": 3, "payload_bytes": [2_000, 20_000], "work_ms": [5, 20], "fail_rate": 0.02},
+        "report": {"weight": 1, "payload_bytes": [50_000, 200_000], "work_ms": [20, 80], "fail_rate": 0.10},
+    },
+    "priorities": {"1": 1, "5": 6, "10": 1},
+}
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def summarize(values: list[float]) -> dict:
+    values = sorted(values)
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 0.50) * 1000,
+        "p99_ms": percentile(values, 0.99) * 1000,
+        "max_ms": (values[-1] if values else 0.0) * 1000,
+    }
+
+
+def generate(workload: dict, n_jobs: int, seed: int) -> list[dict]:
+    """One plan per job: the request body, whether it fails and how long it works."""
+    rng = random.Random(seed)
+    types = list(workload["types"])
+    type_weights = [workload["types"][t]["weight"] for t in types]
+    priorities = [int(p) for p in workload["priorities"]]
+    priority_weights = list(workload["priorities"].values())
+    plans = []
+    for _ in range(n_jobs):
+        job_type = rng.choices(types, type_weights)[0]
+        spec = workload["types"][job_type]
+        size = rng.randint(*spec["payload_bytes"])
+        plans.append({
+            "request": {
+                "type": job_type,
+                "priority": rng.choices(priorities, priority_weights)[0],
+                "max_attempts": 1,
+                # random bytes, so the blob store cannot fold large payloads together
+                "payload": {"data": rng.randbytes(max(0, size - 12) // 2).hex()},
+            },
+            "fails": rng.random() < spec["fail_rate"],
+            "work_ms": rng.uniform(*spec["work_ms"]),
+        })
+    return plans
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies: dict[str, list[float]] = {}
+        self.errors: dict[str, int] = {}
+
+    async def call(self, http: httpx.AsyncClient, name: str, method: str, path: str, **kwargs) -> httpx.Response:
+        t0 = time.perf_counter()
+        resp = await http.request(method, path, **kwargs)
+        self.latencies.setdefault(name, []).append(time.perf_counter() - t0)
+        if resp.status_code >= 400:
+            self.errors[name] = self.errors.get(name, 0) + 1
+        return resp
+
+
+async def run(http: httpx.AsyncClient, ardb, plans: list[dict], workers: int, submit_batch: int,
+              time_scale: float) -> dict:
+    rec = Recorder()
+    plan_of: dict[str, dict] = {}
+    submitted_at: dict[str, float] = {}
+    queue_latency: list[float] = []
+    end_to_end: list[float] = []
+    outcomes = {"completed": 0, "dead": 0, "lost": 0}
+    finished = asyncio.Event()
+
+    def done(job_id: str, outcome: str):
+        outcomes[outcome] += 1
+        end_to_end.append(time.perf_counter() - submitted_at[job_id])
+        if sum(outcomes.values()) == len(plans):
+            finished.set()
+
+    async def submit():
+        for start in range(0, len(plans), submit_batch):
+            chunk = plans[start:start + submit_batch]
+            if submit_batch == 1:
+                resp = await rec.call(http, "submit", "POST", "/jobs", json=chunk[0]["request"])
+                ids = [resp.json()["id"]]
+            else:
+                resp = await rec.call(http, "submit_batch", "POST", "/jobs/batch", json=[p["request"] for p in chunk])
+                ids = resp.json()["ids"]
+            now = time.perf_counter()
+            for job_id, plan in zip(ids, chunk):
+                plan_of[job_id] = plan
+                submitted_at[job_id] = now
+
+    async def worker(n: int):
+        worker_id = f"bench-{n}"
+        while not finished.is_set():
+            item = await ardb.zpopmin(READY_KEY)
+            if not item:
+                await asyncio.sleep(0.005)
+                continue
+            job_id = item[0][0]
+            if job_id not in plan_of:
+                # popped before submit() recorded it; put it back
+                await ardb.zadd(READY_KEY, {job_id: item[0][1]})
+                await asyncio.sleep(0.001)
+                continue
+            plan = plan_of[job_id]
+
+            resp = await rec.call(http, "lease", "POST", f"/jobs/{job_id}/lease", json={"worker_id": worker_id})
+            if resp.status_code != 200:
+                continue
+            queue_latency.append(time.perf_counter() - submitted_at[job_id])
+            resp = await rec.call(http, "start", "POST", f"/jobs/{job_id}/start", json={"worker_id": worker_id})
+            if resp.status_code != 200:
+                done(job_id, "lost")
+                continue
+
+            if time_scale:
+                await asyncio.sleep(plan["work_ms"] * time_scale / 1000)
+            runtime_ms = int(plan["work_ms"])
+            await rec.call(http, "telemetry", "POST", f"/jobs/{job_id}/telemetry", json={"runtime_ms": runtime_ms})
+            if plan["fails"]:
+                resp = await rec.call(http, "fail", "POST", f"/jobs/{job_id}/fail",
+                                      json={"error": "synthetic failure", "worker_id": worker_id})
+                done(job_id, "dead" if resp.status_code == 200 else "lost")
+            else:
+                resp = await rec.call(http, "complete", "POST", f"/jobs/{job_id}/complete",
+                                      json={"worker_id": worker_id})
+                done(job_id, "completed" if resp.status_code == 200 else "lost")
+
+    t0 = time.perf_counter()
+    await asyncio.gather(submit(), *(worker(n) for n in range(workers)))
+    elapsed = time.perf_counter() - t0
+
+    return {
+        "summary": {
+            "jobs": len(plans),
+            **outcomes,
+            "elapsed_s": elapsed,
+            "jobs_per_s": len(plans) / elapsed,
+            "requests": sum(len(v) for v in rec.latencies.values()),
+            "errors": sum(rec.errors.values()),
+        },
+        "endpoints": {
+            name: {**summarize(v), "per_s": len(v) / elapsed, "errors": rec.errors.get(name, 0)}
+            for name, v in rec.latencies.items()
+        },
+        "queue_latency": summarize(queue_latency),
+        "end_to_end": summarize(end_to_end),
+    }
+
+
+def print_result(result: dict):
+    s = result["summary"]
+    print(f"{s['jobs']} jobs in {s['elapsed_s']:.2f}s ({s['jobs_per_s']:.1f} jobs/s): "
+          f"{s['completed']} completed, {s['dead']} failed, {s['lost']} lost, {s['errors']} request errors")
+    print(f"{'':<14} {'count':>7} {'per s':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7}")
+    for name, r in result["endpoints"].items():
+        print(f"{name:<14} {r['count']:7d} {r['per_s']:8.1f} {r['p50_ms']:8.2f} {r['p99_ms']:8.2f} {r['errors']:7d}")
+    for name in ("queue_latency", "end_to_end"):
+        r = result[name]
+        print(f"{name:<14} {r['count']:7d} {'':>8} {r['p50_ms']:8.2f} {r['p99_ms']:8.2f}")
+
+
+def compare(result: dict, baseline: dict):
+    print(f"\nvs {baseline['meta'].get('commit') or 'baseline'} ({baseline['meta']['timestamp']}):")
+    rows = [("jobs/s", baseline["summary"]["jobs_per_s"], result["summary"]["jobs_per_s"])]
+    for name in ("queue_latency", "end_to_end"):
+        rows.append((f"{name} p99 ms", baseline[name]["p99_ms"], result[name]["p99_ms"]))
+    for name, r in result["endpoints"].items():
+        if name in baseline["endpoints"]:
+            rows.append((f"{name} p50 ms", baseline["endpoints"][name]["p50_ms"], r["p50_ms"]))
+            rows.append((f"{name} p99 ms", baseline["endpoints"][name]["p99_ms"], r["p99_ms"]))
+    for label, before, after in rows:
+        change = (after / before - 1) if before else 0.0
+        print(f"  {label:<22} {before:10.2f} -> {after:10.2f}  {change:+7.1%}")
+
+
+async def main(args):
+    workload = WORKLOAD
+    if args.workload:
+        with open(args.workload) as f:
+            workload = json.load(f)
+    plans = generate(workload, args.jobs, args.seed)
+
+    if args.api:
+        import redis.asyncio as aioredis
+
+        limits = httpx.Limits(max_connections=args.workers + 1, max_keepalive_connections=args.workers + 1)
+        http = httpx.AsyncClient(base_url=args.api, limits=limits, timeout=30)
+        ardb = aioredis.from_url(args.redis, decode_responses=True)
+    else:
+        import fakeredis
+
+        import app.main as api
+        from app.db.migrate import migrate
+
+        migrate()
+        server = fakeredis.FakeServer()
+        api.rdb = fakeredis.FakeRedis(server=server, decode_responses=True)
+        api.ardb = ardb = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+        http = httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://api", timeout=None)
+
+    async with http:
+        result = await run(http, ardb, plans, args.workers, args.submit_batch, args.time_scale)
+
+    result["meta"] = {
+        "commit": git_commit(),
+        "timestamp": datetime.utcnow().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "target": args.api or "in-process",
+        "args": vars(args),
+        "workload": workload,
+    }
+    print_result(result)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(result, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(result, json.load(f))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=2000)
+    parser.add_argument("--workers", type=int, default=16, help="concurrent worker loops")
+    parser.add_argument("--submit-batch", type=int, default=100, help="jobs per POST /jobs/batch (1 = POST /jobs)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--workload", help="JSON file shaped like WORKLOAD")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="multiplier on simulated work (0 = none)")
+    parser.add_argument("--api", help="base URL of a running API; omit to run in-process")
+    parser.add_argument("--redis", default="redis://localhost:6379/0", help="Redis of the running API (with --api)")
+    parser.add_argument("--out", help="write results as JSON")
+    parser.add_argument("--compare", help="results JSON of an earlier run to compare against")
+    asyncio.run(main(parser.parse_args()))
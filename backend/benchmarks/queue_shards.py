@@ -0,0 +1,133 @@
+"""
+Dispatch throughput as ready sets are spread over more Redis shards.
+
+Jobs over --queues queues are enqueued through app.redis_queue with the ring
+built from the first k shards, then --consumers processes pop them the way
+workers do (worker/queues.py pop(): a non-blocking sweep of every shard,
+then a blocking pop) until every queue is empty. This is the Redis half of a claim, the part one hot key
+serializes; the database half is a primary-key UPDATE per job either way.
+
+By default every shard is an in-process fakeredis TCP server in its own
+process. Those are far slower than Redis, but each is single-threaded like
+Redis, so the scaling shape carries over. Pass --redis several times to use
+real instances (their databases are flushed). Scaling needs free cores for
+shards and consumers alike.
+
+    cd backend && python -m benchmarks.queue_shards --shards 1 2 4 --consumers 8
+    cd backend && python -m benchmarks.queue_shards --redis redis://localhost:6380/0 --redis redis://localhost:6381/0
+"""
+import argparse
+import multiprocessing as mp
+import os
+import socket
+import sys
+import time
+
+import redis
+
+from app import redis_queue, shards
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "worker"))
+
+from queues import QueueSet, pop  # noqa: E402
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve_fake(port: int):
+    from fakeredis import TcpFakeServer
+
+    TcpFakeServer(("127.0.0.1", port)).serve_forever()
+
+
+def wait_ready(url: str):
+    for _ in range(100):
+        try:
+            redis.from_url(url).ping()
+            return
+        except redis.ConnectionError:
+            time.sleep(0.05)
+    raise RuntimeError(f"{url} did not come up")
+
+
+def consume(urls: list[str], queues: list[str], timeout: float, start, done):
+    clients = {}
+    queue_set = QueueSet({q: 1.0 for q in queues}, None,
+                         lambda url: clients.setdefault(url, redis.from_url(url, decode_responses=True)),
+                         shard_urls=urls)
+    popped = 0
+    last = None
+    start.wait()
+    # the worker's own pop; the consumer stops after one pop that waited out
+    # the timeout empty-handed, which is not counted in the rate
+    while pop(queue_set, timeout):
+        popped += 1
+        last = time.perf_counter()
+    done.put((popped, last))
+
+
+def run(urls: list[str], n_jobs: int, n_queues: int, consumers: int, timeout: float) -> float:
+    for url in urls:
+        redis.from_url(url).flushdb()
+    shards.configure(urls)
+    queues = [f"q{i}" for i in range(n_queues)]
+    jobs = [redis_queue.ready_job(f"job-{i}", "bench", 5, queue=queues[i % n_queues]) for i in range(n_jobs)]
+    for i in range(0, n_jobs, 1000):
+        redis_queue.enqueue_many(None, jobs[i:i + 1000])
+
+    start = mp.Event()
+    done = mp.Queue()
+    procs = [mp.Process(target=consume, args=(urls, queues, timeout, start, done)) for _ in range(consumers)]
+    for p in procs:
+        p.start()
+    time.sleep(0.5)     # let every consumer connect first
+    t0 = time.perf_counter()
+    start.set()
+    results = [done.get() for _ in procs]
+    for p in procs:
+        p.join()
+    popped = sum(n for n, _ in results)
+    assert popped == n_jobs, (popped, n_jobs)
+    return n_jobs / (max(t for _, t in results if t is not None) - t0)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--redis", action="append", help="shard URL (repeat); default: start fakeredis servers")
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--jobs", type=int, default=20000)
+    parser.add_argument("--queues", type=int, default=32)
+    parser.add_argument("--consumers", type=int, default=8)
+    parser.add_argument("--timeout", type=float, default=1.0, help="blocking pop timeout, as the worker's POP_TIMEOUT")
+    args = parser.parse_args()
+
+    servers = []
+    urls = args.redis
+    if not urls:
+        ports = [free_port() for _ in range(max(args.shards))]
+        servers = [mp.Process(target=serve_fake, args=(port,), daemon=True) for port in ports]
+        for s in servers:
+            s.start()
+        urls = [f"redis://127.0.0.1:{port}/0" for port in ports]
+        for url in urls:
+            wait_ready(url)
+
+    try:
+        base = None
+        for k in args.shards:
+            if k > len(urls):
+                break
+            rate = run(urls[:k], args.jobs, args.queues, args.consumers, args.timeout)
+            base = base or rate
+            print(f"shards={k:<3} {rate:10,.0f} pops/s  x{rate / base:.2f}")
+    finally:
+        for s in servers:
+            s.terminate()
+
+
+if __name__ == "__main__":
+    main()
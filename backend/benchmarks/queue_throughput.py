@@ -0,0 +1,56 @@
+"""
+Redis dispatch throughput against fakeredis.
+
+    cd backend && python -m benchmarks.queue_throughput --jobs 100000
+"""
+import argparse
+import random
+import time
+from datetime import datetime, timedelta
+
+import fakeredis
+
+from app import redis_queue
+from app.scheduler.policies import make_policy
+
+
+def run(n_jobs: int, batch: int, policy_name: str):
+    policy = make_policy(policy_name)
+    rdb = fakeredis.FakeRedis(decode_responses=True)
+    base = datetime.utcnow()
+    jobs = [
+        redis_queue.ready_job(f"job-{i}", f"type-{i % 5}", random.randint(1, 10),
+                              base + timedelta(milliseconds=i), random.randint(10, 10000))
+        for i in range(n_jobs)
+    ]
+
+    t0 = time.perf_counter()
+    for i in range(0, n_jobs, batch):
+        redis_queue.enqueue_many(rdb, jobs[i:i + batch], policy)
+    enqueue_s = time.perf_counter() - t0
+
+    # duplicate pushes must not grow the set
+    redis_queue.enqueue_many(rdb, jobs[:batch], policy)
+    assert redis_queue.depth(rdb) == n_jobs
+
+    t0 = time.perf_counter()
+    popped = []
+    while True:
+        job_id = redis_queue.pop_ready(rdb, timeout=0.01)
+        if job_id is None:
+            break
+        popped.append(job_id)
+    pop_s = time.perf_counter() - t0
+
+    assert len(popped) == n_jobs
+    print(f"enqueue: {n_jobs / enqueue_s:,.0f} jobs/s (batch={batch}, policy={policy.name})")
+    print(f"pop:     {n_jobs / pop_s:,.0f} jobs/s ({pop_s / n_jobs * 1e6:.1f} us/job)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=20000)
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--policy", default="fifo")
+    args = parser.parse_args()
+    run(args.jobs, args.batch, args.policy)
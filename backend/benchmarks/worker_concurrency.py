@@ -0,0 +1,90 @@
+"""
+Async worker jobs/sec as the number of slots grows. The API runs in-process
+behind httpx's ASGI transport, with SQLite and a shared fakeredis server.
+
+A run ends once every job is accounted for (completed, failed, lost after
+the claim, or conflicted on claim) or at --timeout, whichever comes first;
+SQLite's single writer starts failing claims ("database is locked") at high
+slot counts, and those are reported rather than waited on forever.
+
+    cd backend && python -m benchmarks.worker_concurrency --jobs 400 --work-ms 50
+"""
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+DB_FILE = os.path.join(tempfile.mkdtemp(), "bench.db")
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{DB_FILE}")
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "..", "worker"))
+
+import fakeredis  # noqa: E402
+import httpx  # noqa: E402
+
+import app.main as api  # noqa: E402
+from app.db.database import async_engine  # noqa: E402
+from app.db.migrate import migrate  # noqa: E402
+from async_worker import AsyncWorker  # noqa: E402
+
+migrate()
+
+
+def settled(worker: AsyncWorker) -> int:
+    # errored claims are not counted: their ids went back to be popped again
+    return worker.completed + worker.failed + worker.lost + worker.conflicts
+
+
+async def run_once(n_jobs: int, concurrency: int, work_ms: int, timeout: float) -> dict:
+    server = fakeredis.FakeServer()
+    api.rdb = fakeredis.FakeRedis(server=server, decode_responses=True)
+    api.ardb = rdb = fakeredis.FakeAsyncRedis(server=server, decode_responses=True)
+
+    async def handler(job):
+        await asyncio.sleep(work_ms / 1000)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api.app), base_url="http://api") as http:
+        resp = await http.post("/jobs/batch", json=[{"type": "bench"} for _ in range(n_jobs)])
+        resp.raise_for_status()
+
+        worker = AsyncWorker(concurrency, "bench", api="", http=http, rdb=rdb,
+                             default_handler=handler, quiet=True)
+        t0 = time.perf_counter()
+        deadline = t0 + timeout
+        task = asyncio.create_task(worker.run())
+        while settled(worker) < n_jobs and time.perf_counter() < deadline:
+            await asyncio.sleep(0.01)
+        elapsed = time.perf_counter() - t0
+        worker.stop()
+        await task
+    # each level runs in its own event loop; pooled connections must not outlive this one
+    await async_engine.dispose()
+    return {
+        "rate": worker.completed / elapsed,
+        "timed_out": settled(worker) < n_jobs,
+        "completed": worker.completed,
+        "failed": worker.failed,
+        "lost": worker.lost,
+        "conflicts": worker.conflicts,
+        "claim_errors": worker.claim_errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--jobs", type=int, default=400)
+    parser.add_argument("--work-ms", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 4, 16, 64])
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds allowed per concurrency level")
+    args = parser.parse_args()
+
+    for c in args.concurrency:
+        r = asyncio.run(run_once(args.jobs, c, args.work_ms, args.timeout))
+        print(f"concurrency={c:<4} {r['rate']:8.1f} jobs/s  completed={r['completed']}/{args.jobs} "
+              f"failed={r['failed']} lost={r['lost']} conflicts={r['conflicts']} "
+              f"claim_errors={r['claim_errors']}{'  TIMED OUT' if r['timed_out'] else ''}")
+
+
+if __name__ == "__main__":
+    main()
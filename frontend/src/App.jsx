@@ -1,4 +1,7 @@
-import { useEffect, useState } from "react";
+import { useEffect, useRef, useState } from "react";
+
+const API = "http://127.0.0.1:8000";
+const LIMIT = 500;
 
 function App() {
   const [jobs, setJobs] = useState([]);
@@ -9,13 +12,41 @@ function App() {
   const [payload, setPayload] = useState("{}");
   const [priority, setPriority] = useState(5);
   const [maxAttempts, setMaxAttempts] = useState(3);
+  const streamRef = useRef(null);
+
+  // Apply one delta from /jobs/stream: update the job in place, or add it
+  // to the top if it is new.
+  const applyDelta = (delta) => {
+    setJobs((current) => {
+      const index = current.findIndex((j) => j.id === delta.id);
+      if (index === -1) {
+        return [delta, ...current].slice(0, LIMIT);
+      }
+      const next = current.slice();
+      next[index] = { ...current[index], ...delta };
+      return next;
+    });
+  };
+
+  const openStream = (cursor) => {
+    if (streamRef.current) {
+      streamRef.current.close();
+    }
+    const source = new EventSource(`${API}/jobs/stream?cursor=${encodeURIComponent(cursor || "$")}`);
+    source.addEventListener("job", (e) => applyDelta(JSON.parse(e.data)));
+    // the server could not replay everything since our cursor: reload
+    source.addEventListener("reset", () => fetchJobs());
+    streamRef.current = source;
+  };
 
   const fetchJobs = async () => {
     try {
       setLoading(true);
       setError("");
 
-      const res = await fetch("http://127.0.0.1:8000/jobs");
+      const res = await fetch(
+        `${API}/jobs?limit=${LIMIT}&fields=id,type,status,priority,attempts,runtime_ms,predicted_runtime_ms`
+      );
 
       if (!res.ok) {
         throw new Error(`Backend returned ${res.status}`);
@@ -28,6 +59,7 @@ function App() {
       }
 
       setJobs(data);
+      openStream(res.headers.get("X-Stream-Cursor"));
     } catch (err) {
       console.error("Failed to fetch jobs:", err);
       setError(err.message || "Failed to load jobs");
@@ -42,7 +74,7 @@ function App() {
     try {
       setError("");
 
-      await fetch("http://127.0.0.1:8000/jobs", {
+      await fetch(`${API}/jobs`, {
         method: "POST",
         headers: {
           "Content-Type": "application/json",
@@ -59,8 +91,6 @@ function App() {
       setPayload("{}");
       setPriority(5);
       setMaxAttempts(3);
-
-      fetchJobs();
     } catch (err) {
       console.error("Failed to create job:", err);
       setError(err.message || "Failed to create job");
@@ -68,10 +98,14 @@ function App() {
   };
 
   useEffect(() => {
+    // one full load, then only deltas over the stream
     fetchJobs();
 
-    const interval = setInterval(fetchJobs, 3000);
-    return () => clearInterval(interval);
+    return () => {
+      if (streamRef.current) {
+        streamRef.current.close();
+      }
+    };
   }, []);
 
   const total = jobs.length;
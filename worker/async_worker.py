@@ -0,0 +1,220 @@
+import argparse
+import asyncio
+import os
+import signal
+import time
+
+import httpx
+import redis.asyncio as aioredis
+
+import metrics
+from handlers import get_handler, run_async, simulate_async
+from queues import WORKER_QUEUES, QueueSet, parse_weights, pop_async
+from worker import API, HEARTBEAT_INTERVAL, LEASE_SECONDS, POP_TIMEOUT, REDIS_URL, WORKER_ID
+
+CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "4"))
+
+
+class AsyncWorker:
+    """
+    Runs up to `concurrency` jobs at once in one process. Every slot blocks on
+    the ready sets of the worker's queues, claims through the API and runs the
+    job's handler; all API calls share one keep-alive HTTP client.
+    """
+
+    def __init__(self, concurrency: int = CONCURRENCY, worker_id: str = WORKER_ID,
+                 api: str = API, http: httpx.AsyncClient | None = None, rdb=None,
+                 default_handler=simulate_async, quiet: bool = False, queues: dict[str, float] | None = None):
+        self.concurrency = concurrency
+        self.worker_id = worker_id
+        self.api = api
+        self.http = http
+        self.rdb = rdb
+        self.queues = queues or parse_weights(WORKER_QUEUES)
+        self.queue_set: QueueSet | None = None
+        self.default_handler = default_handler
+        self.quiet = quiet
+
+        self.held: dict[str, dict] = {}     # job id -> job, heartbeated while running
+        self.completed = 0
+        self.failed = 0
+        self.lost = 0           # claimed and run, but the API did not take the completion
+        self.conflicts = 0      # 409 on claim: someone else had it or it moved on
+        self.claim_errors = 0   # claim errored; the id went back to the ready set
+        self._stopping = asyncio.Event()
+
+    def log(self, msg: str):
+        if not self.quiet:
+            print(f"[worker {self.worker_id}] {msg}", flush=True)
+
+    async def post(self, path: str, **kwargs):
+        try:
+            return await self.http.post(f"{self.api}{path}", **kwargs)
+        except httpx.HTTPError as exc:
+            self.log(f"POST {path} failed: {exc}")
+            return None
+
+    def open_payload(self, job_id: str):
+        # async with worker.open_payload(id) as resp: async for chunk in resp.aiter_bytes()
+        return self.http.stream("GET", f"{self.api}/jobs/{job_id}/payload", timeout=30)
+
+    def stop(self):
+        """
+        Stop taking new jobs; running jobs are finished before run() returns.
+        Idle slots notice within POP_TIMEOUT: a pop is never cancelled, since
+        Redis may already have removed the id it would have returned.
+        """
+        if self._stopping.is_set():
+            return
+        self.log("draining")
+        self._stopping.set()
+
+    async def next_job(self):
+        """
+        Block on the ready sets of the worker's queues. Returns the popped
+        (client, key, job id, score), or None if nothing came or we are stopping.
+        """
+        if self._stopping.is_set():
+            return None
+        try:
+            popped = await pop_async(self.queue_set, POP_TIMEOUT, self._stopping)
+        except Exception as exc:
+            self.log(f"Redis pop failed: {exc}")
+            await asyncio.sleep(2)
+            return None
+        if popped is None:
+            metrics.IDLE_POLLS.inc()
+        elif self._stopping.is_set():
+            await self.put_back(popped)
+            return None
+        return popped
+
+    async def put_back(self, popped):
+        # return an id we popped but did not claim, at its old position
+        client, key, job_id, score = popped
+        try:
+            await client.zadd(key, {job_id: score}, nx=True)
+        except Exception as exc:
+            self.log(f"Could not put job {job_id} back: {exc}")
+
+    async def process(self, job: dict):
+        job_id = job["id"]
+        job["open_payload"] = lambda: self.open_payload(job_id)
+        handler = get_handler(job["type"], self.default_handler)
+        self.held[job_id] = job
+        start_time = time.monotonic()
+        try:
+            await run_async(handler, job)
+        except Exception as exc:
+            runtime_ms = int((time.monotonic() - start_time) * 1000)
+            metrics.JOBS_FAILED.inc()
+            metrics.JOB_SECONDS.observe(runtime_ms / 1000)
+            await self.post(f"/jobs/{job_id}/fail", json={
+                "error": str(exc) or type(exc).__name__, "worker_id": self.worker_id, "runtime_ms": runtime_ms,
+            })
+            self.failed += 1
+            self.log(f"Failed job {job_id} (will retry if attempts left)")
+            return
+        finally:
+            self.held.pop(job_id, None)
+
+        runtime_ms = int((time.monotonic() - start_time) * 1000)
+        metrics.JOB_SECONDS.observe(runtime_ms / 1000)
+        r = await self.post(f"/jobs/{job_id}/complete", json={"worker_id": self.worker_id, "runtime_ms": runtime_ms})
+        if r is not None and r.status_code == 200:
+            self.completed += 1
+            metrics.JOBS_COMPLETED.inc()
+            self.log(f"Completed job {job_id}")
+        else:
+            self.lost += 1
+            self.log(f"Could not complete job {job_id}: {r.text if r is not None else 'no response'}")
+
+    async def heartbeat(self):
+        # one batched request renews every lease this process holds
+        while True:
+            await asyncio.sleep(HEARTBEAT_INTERVAL)
+            job_ids = list(self.held)
+            if not job_ids:
+                continue
+            resp = await self.post(
+                "/jobs/heartbeat",
+                json={"worker_id": self.worker_id, "lease_seconds": LEASE_SECONDS, "job_ids": job_ids},
+            )
+            if resp is not None and resp.status_code == 200:
+                for job_id in resp.json().get("lost", []):
+                    self.log(f"Lost lease on job {job_id}")
+
+    async def slot(self, n: int):
+        while not self._stopping.is_set():
+            popped = await self.next_job()
+            if popped is None:
+                continue
+            job_id = popped[2]
+
+            claim_start = time.perf_counter()
+            resp = await self.post(
+                "/jobs/claim",
+                json={"worker_id": self.worker_id, "lease_seconds": LEASE_SECONDS, "job_id": job_id},
+            )
+            metrics.CLAIM_SECONDS.observe(time.perf_counter() - claim_start)
+            if resp is not None and resp.status_code == 409:
+                # stale entry: the job was claimed, finished or rescheduled meanwhile
+                metrics.CLAIM_CONFLICTS.inc()
+                self.conflicts += 1
+                continue
+            if resp is None or resp.status_code != 200:
+                self.claim_errors += 1
+                if resp is not None:
+                    self.log(f"claim failed: {resp.status_code} {resp.text}")
+                # still queued, so it must not stay out of the ready set
+                await self.put_back(popped)
+                await asyncio.sleep(2)
+                continue
+
+            job = resp.json()
+            self.log(f"Running job {job['id']} (type={job['type']})")
+            try:
+                await self.process(job)
+            except Exception as exc:
+                self.log(f"error: {exc}")
+
+    async def run(self):
+        own_http = self.http is None
+        own_redis = self.rdb is None
+        if own_http:
+            limits = httpx.Limits(max_connections=self.concurrency * 2, max_keepalive_connections=self.concurrency * 2)
+            self.http = httpx.AsyncClient(limits=limits, timeout=5)
+        if own_redis:
+            self.rdb = aioredis.from_url(REDIS_URL, decode_responses=True)
+        self.queue_set = QueueSet(self.queues, self.rdb, lambda url: aioredis.from_url(url, decode_responses=True))
+
+        self.log(f"started with {self.concurrency} slots")
+        heartbeat = asyncio.create_task(self.heartbeat())
+        try:
+            await asyncio.gather(*(self.slot(n) for n in range(self.concurrency)))
+        finally:
+            heartbeat.cancel()
+            if own_http:
+                await self.http.aclose()
+            if own_redis:
+                await self.rdb.aclose()
+            for client in self.queue_set.clients:
+                await client.aclose()
+        self.log(f"stopped (completed={self.completed}, failed={self.failed})")
+
+
+async def main(concurrency: int):
+    worker = AsyncWorker(concurrency)
+    metrics.Gauge("smartflow_worker_jobs_running", "Jobs this worker is running now.", lambda: {(): len(worker.held)})
+    metrics.serve()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+    await worker.run()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=CONCURRENCY)
+    args = parser.parse_args()
+    asyncio.run(main(args.concurrency))
@@ -0,0 +1,50 @@
+import asyncio
+import inspect
+import random
+import time
+
+# job["type"] -> handler. A handler takes the claimed job dict and returns
+# normally on success or raises on failure. It may be sync or async.
+#
+# Payloads over the inline limit are not part of the claimed job: then
+# job["payload"] is None, job["payload_ref"] is set, and job["open_payload"]()
+# streams the bytes (a file-like object in worker.py, an httpx streaming
+# context manager in async_worker.py) so a handler never has to hold them all.
+HANDLERS = {}
+
+
+def register(job_type: str):
+    def decorator(fn):
+        HANDLERS[job_type] = fn
+        return fn
+    return decorator
+
+
+def simulate(job):
+    """Default handler: ~5s of fake work with a 30% failure rate."""
+    time.sleep(5)
+    if random.random() < 0.3:
+        raise RuntimeError("Simulated failure during execution")
+
+
+async def simulate_async(job):
+    await asyncio.sleep(5)
+    if random.random() < 0.3:
+        raise RuntimeError("Simulated failure during execution")
+
+
+def get_handler(job_type: str, default=simulate):
+    return HANDLERS.get(job_type, default)
+
+
+def run_sync(handler, job):
+    if inspect.iscoroutinefunction(handler):
+        return asyncio.run(handler(job))
+    return handler(job)
+
+
+async def run_async(handler, job):
+    if inspect.iscoroutinefunction(handler):
+        return await handler(job)
+    # keep blocking handlers off the event loop
+    return await asyncio.to_thread(handler, job)
@@ -0,0 +1,37 @@
+import os
+import sys
+
+# Prometheus scrape port (0 disables). Several workers on one host need
+# distinct ports; a worker that cannot bind keeps running without metrics.
+METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9102"))
+
+# The metric types and the exposition format are the API's (app/prometheus.py,
+# standard library only), so a worker needs the backend tree next to it but
+# none of the API's dependencies.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend"))
+
+from app.prometheus import Counter, Gauge, Histogram, render  # noqa: E402, F401
+from app.prometheus import serve as serve_registry  # noqa: E402
+
+
+def serve(port: int = METRICS_PORT, host: str = "0.0.0.0"):
+    if not port:
+        return None
+    try:
+        return serve_registry(port, host)
+    except OSError as exc:
+        print(f"[worker] metrics disabled, cannot bind port {port}: {exc}", file=sys.stderr, flush=True)
+        return None
+
+
+JOB_BUCKETS = (.05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+API_BUCKETS = (.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5)
+
+JOBS_COMPLETED = Counter("smartflow_worker_jobs_completed_total", "Jobs this worker completed.")
+JOBS_FAILED = Counter("smartflow_worker_jobs_failed_total", "Jobs whose handler raised.")
+JOB_SECONDS = Histogram("smartflow_worker_job_seconds", "Handler run time per job.", buckets=JOB_BUCKETS)
+CLAIM_SECONDS = Histogram("smartflow_worker_claim_seconds", "Latency of POST /jobs/claim.",
+                          buckets=API_BUCKETS)
+CLAIM_CONFLICTS = Counter("smartflow_worker_claim_conflicts_total",
+                          "Claims answered 409: the id was stale or its type at a limit.")
+IDLE_POLLS = Counter("smartflow_worker_idle_polls_total", "Ready-set pops that timed out with no job.")
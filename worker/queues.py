@@ -0,0 +1,142 @@
+import hashlib
+import os
+import random
+from bisect import bisect
+
+# Queues this worker takes jobs from, with relative weights:
+# WORKER_QUEUES="default=3,reports=1". When several have jobs waiting, each
+# pop picks one with probability proportional to its weight; an empty queue
+# never holds the worker up while another has work.
+WORKER_QUEUES = os.getenv("WORKER_QUEUES", "default")
+# Same as the API's REDIS_SHARDS; the hashing below must match app/shards.py.
+REDIS_SHARDS = [u.strip() for u in os.getenv("REDIS_SHARDS", "").split(",") if u.strip()]
+VNODES = 160
+# With queues on several shards no single BZPOPMIN covers them all, so once a
+# sweep finds every shard empty each one is blocked on this long in turn.
+SHARD_BLOCK_SECONDS = float(os.getenv("WORKER_SHARD_BLOCK_SECONDS", "0.2"))
+
+READY_KEY = "smartflow:ready"
+DEFAULT_QUEUE = "default"
+
+
+def ready_key(queue: str) -> str:
+    return READY_KEY if queue == DEFAULT_QUEUE else f"{READY_KEY}:{queue}"
+
+
+def parse_weights(spec: str) -> dict[str, float]:
+    weights = {}
+    for part in spec.split(","):
+        name, _, weight = part.strip().partition("=")
+        if name:
+            weights[name] = float(weight or 1)
+            if weights[name] <= 0:
+                raise ValueError(f"Queue weight must be positive: {part.strip()!r}")
+    return weights
+
+
+def hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+def shard_of(queue: str, urls: list[str]) -> str | None:
+    if not urls:
+        return None
+    points = sorted((hash64(f"{url}#{i}"), url) for url in urls for i in range(VNODES))
+    i = bisect([h for h, _ in points], hash64(queue)) % len(points)
+    return points[i][1]
+
+
+class QueueSet:
+    """
+    The worker's queues grouped by the Redis that holds them. `connect(url)`
+    opens a client for a shard; without shards every queue is on `default`.
+    """
+
+    def __init__(self, weights: dict[str, float], default, connect, shard_urls: list[str] = REDIS_SHARDS):
+        self.weights = weights
+        self.shards: dict[str, object] = {}     # queue -> client
+        opened = {}
+        for queue in weights:
+            url = shard_of(queue, shard_urls)
+            if url is None:
+                self.shards[queue] = default
+            else:
+                if url not in opened:
+                    opened[url] = connect(url)
+                self.shards[queue] = opened[url]
+        self.clients = list(opened.values())    # the ones opened here, for the caller to close
+
+    def order(self) -> list[tuple[object, list[str]]]:
+        """
+        One weighted draw of the queues without replacement, as (client, ready
+        keys) in the order to try. BZPOPMIN takes the first non-empty key, so
+        the drawn order is what gives each queue its share.
+        """
+        # Efraimidis-Spirakis: sort by u ** (1 / weight)
+        drawn = sorted(self.weights, key=lambda q: random.random() ** (1 / self.weights[q]), reverse=True)
+        groups: dict[int, tuple[object, list[str]]] = {}
+        for queue in drawn:
+            client = self.shards[queue]
+            groups.setdefault(id(client), (client, []))[1].append(ready_key(queue))
+        return list(groups.values())
+
+
+def _popped(client, item):
+    # (client, key, job id, score): enough to put the id back if it is not claimed
+    if not item:
+        return None
+    key, job_id, score = item
+    return client, key, job_id, float(score)
+
+
+def _swept(client, item):
+    # ZMPOP replies [key, [[id, score]]]
+    if not item:
+        return None
+    key, ((job_id, score),) = item
+    return client, key, job_id, float(score)
+
+
+def pop(queues: QueueSet, timeout: float):
+    """
+    Take the next job id from the worker's queues. With queues on several
+    shards each is swept first with a non-blocking ZMPOP (Redis 7), in the
+    drawn order, so an empty shard never holds the worker up while another
+    has work; only when all are empty does it block briefly on each in turn.
+    One shard needs no sweep: a single BZPOPMIN covers every key.
+    Returns (client, key, job id, score), or None if nothing came.
+    """
+    groups = queues.order()
+    if len(groups) == 1:
+        client, keys = groups[0]
+        return _popped(client, client.bzpopmin(keys, timeout=timeout))
+    for client, keys in groups:
+        popped = _swept(client, client.zmpop(len(keys), keys, min=True))
+        if popped:
+            return popped
+    block = min(timeout, SHARD_BLOCK_SECONDS)
+    for client, keys in groups:
+        popped = _popped(client, client.bzpopmin(keys, timeout=block))
+        if popped:
+            return popped
+    return None
+
+
+async def pop_async(queues: QueueSet, timeout: float, stopping=None):
+    """pop() for redis.asyncio clients; stops before blocking once `stopping` is set."""
+    groups = queues.order()
+    if len(groups) == 1:
+        client, keys = groups[0]
+        return _popped(client, await client.bzpopmin(keys, timeout=timeout))
+    for client, keys in groups:
+        popped = _swept(client, await client.zmpop(len(keys), keys, min=True))
+        if popped:
+            return popped
+    block = min(timeout, SHARD_BLOCK_SECONDS)
+    for client, keys in groups:
+        if stopping is not None and stopping.is_set():
+            return None
+        popped = _popped(client, await client.bzpopmin(keys, timeout=block))
+        if popped:
+            return popped
+    return None
@@ -1,11 +1,24 @@
 import os
+import threading
 import time
+import redis
 import requests
-import random
 import uuid
 
+import metrics
+from handlers import get_handler, run_sync
+from queues import WORKER_QUEUES, QueueSet, parse_weights, pop
+
 API = "http://127.0.0.1:8000"
 WORKER_ID = os.getenv("WORKER_ID", str(uuid.uuid4())[:8])
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+POP_TIMEOUT = 5
+# short leases are fine: running jobs are heartbeated every third of a lease
+LEASE_SECONDS = int(os.getenv("LEASE_SECONDS", "15"))
+HEARTBEAT_INTERVAL = LEASE_SECONDS / 3
+
+# one keep-alive connection pool for every API call
+HTTP = requests.Session()
 
 
 def safe_post(url: str, **kwargs):
@@ -16,7 +29,7 @@ def safe_post(url: str, **kwargs):
     try:
         # Provide a default timeout if caller didn't pass one
         kwargs.setdefault("timeout", 5)
-        return requests.post(url, **kwargs)
+        return HTTP.post(url, **kwargs)
     except Exception as exc:
         print(f"[worker] POST {url} failed: {exc}", flush=True)
         return None
@@ -24,109 +37,139 @@ def safe_post(url: str, **kwargs):
 def safe_get(url: str, **kwargs):
     try:
         kwargs.setdefault("timeout", 5)
-        return requests.get(url, **kwargs)
+        return HTTP.get(url, **kwargs)
     except Exception as exc:
         print(f"[worker] GET {url} failed: {exc}", flush=True)
         return None
 
-def reconcile():
-    resp = safe_post(f"{API}/system/reconcile")
-    if resp is None:
-        return
-    if resp.status_code != 200:
-        print(f"[worker] reconcile failed: {resp.status_code} {resp.text}", flush=True)
+def open_payload(job_id: str):
+    """
+    Stream the job's payload (JSON bytes) as a file-like object, for jobs
+    whose payload was offloaded. Read it in chunks and close it when done.
+    """
+    resp = HTTP.get(f"{API}/jobs/{job_id}/payload", stream=True, timeout=30)
+    resp.raise_for_status()
+    resp.raw.decode_content = True
+    return resp.raw
+
+def heartbeat_loop(job_id: str, done: threading.Event):
+    while not done.wait(HEARTBEAT_INTERVAL):
+        resp = safe_post(
+            f"{API}/jobs/{job_id}/heartbeat",
+            json={"worker_id": WORKER_ID, "lease_seconds": LEASE_SECONDS}
+        )
+        if resp is not None and resp.status_code in (404, 409):
+            print(f"[worker] Lost lease on job {job_id}: {resp.text}", flush=True)
+            return
+
+def next_job(queues: QueueSet):
+    """
+    Wait on the ready sets of the worker's queues until a job id arrives.
+    Returns (client, key, job id, score), or None if the pop timed out or
+    Redis is unreachable.
+    """
+    try:
+        popped = pop(queues, POP_TIMEOUT)
+    except Exception as exc:
+        print(f"[worker] Redis pop failed: {exc}", flush=True)
+        time.sleep(2)
+        return None
+    if popped is None:
+        metrics.IDLE_POLLS.inc()
+    return popped
+
+def put_back(popped):
+    # return an id we popped but did not claim, at its old position
+    client, key, job_id, score = popped
+    try:
+        client.zadd(key, {job_id: score}, nx=True)
+    except Exception as exc:
+        print(f"[worker] Could not put job {job_id} back: {exc}", flush=True)
+
 
 def main():
     print("Worker started. Watching for queued jobs...", flush=True)
+    rdb = redis.from_url(REDIS_URL, decode_responses=True)
+    queues = QueueSet(parse_weights(WORKER_QUEUES), rdb, lambda url: redis.from_url(url, decode_responses=True))
+    metrics.serve()
 
     while True:
         try:
-            resp = safe_get(f"{API}/jobs")
-            if resp is None:
-                print("[worker] Could not fetch jobs", flush=True)
-                time.sleep(2)
+            popped = next_job(queues)
+            if popped is None:
+                # idle; retries and lease recovery are the scheduler daemon's job
                 continue
+            job_id = popped[2]
 
-            try:
-                jobs = resp.json()
-            except Exception as exc:
-                print(f"[worker] Invalid /jobs response: {exc}", flush=True)
-                time.sleep(2)
+            claim_start = time.perf_counter()
+            resp = safe_post(
+                f"{API}/jobs/claim",
+                json={"worker_id": WORKER_ID, "lease_seconds": LEASE_SECONDS, "job_id": job_id}
+            )
+            metrics.CLAIM_SECONDS.observe(time.perf_counter() - claim_start)
+            if resp is not None and resp.status_code == 409:
+                # stale entry: the job was claimed, finished or rescheduled meanwhile
+                metrics.CLAIM_CONFLICTS.inc()
                 continue
 
-            queued = [j for j in jobs if j.get("status") == "queued"]
-
-            if not queued:
-                reconcile()
+            if resp is None or resp.status_code != 200:
+                if resp is None:
+                    print("[worker] Could not claim a job", flush=True)
+                else:
+                    print(f"[worker] claim failed: {resp.status_code} {resp.text}", flush=True)
+                # still queued, so it must not stay out of the ready set
+                put_back(popped)
                 time.sleep(2)
                 continue
 
-            job = queued[0]
-            job_id = job["id"]
-
-            # lease
-            lease_resp = safe_post(
-                f"{API}/jobs/{job_id}/lease",
-                json={"worker_id": WORKER_ID, "lease_seconds": 30}
-            )
-            if lease_resp is None or lease_resp.status_code != 200:
-                print(f"[worker] Could not lease job {job_id}: {lease_resp.text if lease_resp else 'no response'}", flush=True)
+            try:
+                job = resp.json()
+            except Exception as exc:
+                print(f"[worker] Invalid /jobs/claim response: {exc}", flush=True)
+                time.sleep(2)
                 continue
 
-            # start
-            r = safe_post(f"{API}/jobs/{job_id}/start")
-            if r is None or r.status_code != 200:
-                print(f"Could not start job {job_id}: {r.text if r else 'no response'}", flush=True)
-                time.sleep(1)
-                continue
+            job_id = job["id"]
+            job["open_payload"] = lambda job_id=job_id: open_payload(job_id)
 
             print(f"Running job {job_id} (type={job['type']})", flush=True)
-            
-            # START TIMER HERE
-            start_time = time.time()
-          
-            time.sleep(3)
 
-            # simulate work
-            time.sleep(2)
+            done = threading.Event()
+            threading.Thread(target=heartbeat_loop, args=(job_id, done), daemon=True).start()
 
-            # fail some jobs intentionally
-            should_fail = random.random() < 0.3  # 30% failure rate
-            if should_fail:
+            start_time = time.time()
+            try:
+                run_sync(get_handler(job["type"]), job)
+            except Exception as exc:
+                done.set()
                 runtime_ms = int((time.time() - start_time) * 1000)
+                metrics.JOBS_FAILED.inc()
+                metrics.JOB_SECONDS.observe(runtime_ms / 1000)
                 safe_post(
-                    f"{API}/jobs/{job_id}/telemetry",
-                    json={"runtime_ms": runtime_ms, "note": "failed-run"}
+                    f"{API}/jobs/{job_id}/fail",
+                    json={"error": str(exc) or type(exc).__name__, "worker_id": WORKER_ID, "runtime_ms": runtime_ms}
                 )
-
-                err = "Simulated failure during execution"
-                safe_post(f"{API}/jobs/{job_id}/fail", json={"error": err})
                 print(f"Failed job {job_id} (will retry if attempts left)", flush=True)
-                
-                reconcile()
                 continue
 
+            done.set()
             runtime_ms = int((time.time() - start_time) * 1000)
+            metrics.JOB_SECONDS.observe(runtime_ms / 1000)
 
-            safe_post(
-                f"{API}/jobs/{job_id}/telemetry",
-                json={"runtime_ms": runtime_ms, "note": "success-run"}
+            # mark job as completed, reporting its runtime in the same call
+            r = safe_post(
+                f"{API}/jobs/{job_id}/complete",
+                json={"worker_id": WORKER_ID, "runtime_ms": runtime_ms}
             )
-
-
-            # mark job as completed
-            r = safe_post(f"{API}/jobs/{job_id}/complete")
             if r is not None and r.status_code == 200:
+                metrics.JOBS_COMPLETED.inc()
                 print(f"Completed job {job_id}", flush=True)
             else:
                 print(f"Could not complete job {job_id}: {r.text if r else 'no response'}", flush=True)
 
-            reconcile()
-
         except Exception as e:
             print("Worker error:", e, flush=True)
-
-        time.sleep(1)
+            time.sleep(1)
 
 if __name__ == "__main__":
     main()
\ No newline at end of file